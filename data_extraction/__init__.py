@@ -1,4 +1,15 @@
-from .interfaces import TextExtractorInterface
+from .async_text_extraction import (
+    AsyncApacheTikaTextExtractor,
+    create_async_apache_tika_text_extraction,
+)
+from .file_probe import (
+    PROBE_HEADER_SIZE,
+    FileProbe,
+    ProbingWriter,
+    get_type_hint,
+    identify_header,
+)
+from .interfaces import AsyncTextExtractorInterface, TextExtractorInterface
 from .text_extraction import (
     ApacheTikaTextExtractor,
     UnsupportedFileTypeError,
@@ -6,8 +17,16 @@ from .text_extraction import (
 )
 
 __all__ = [
+    "PROBE_HEADER_SIZE",
     "ApacheTikaTextExtractor",
+    "AsyncApacheTikaTextExtractor",
+    "AsyncTextExtractorInterface",
+    "FileProbe",
+    "ProbingWriter",
     "UnsupportedFileTypeError",
     "create_apache_tika_text_extraction",
+    "create_async_apache_tika_text_extraction",
+    "get_type_hint",
+    "identify_header",
     "TextExtractorInterface",
 ]
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Union
+
+import aiohttp
+
+from monitoring import log_tika_error, log_tika_request, log_tika_response
+
+from .file_probe import FileProbe, probe_file
+from .interfaces import AsyncTextExtractorInterface
+from .text_extraction import (
+    FileTypeChecker,
+    get_apache_tika_server_url,
+    get_tika_max_retries,
+)
+
+RETRYABLE_ERRORS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+)
+
+
+class AsyncApacheTikaTextExtractor(FileTypeChecker, AsyncTextExtractorInterface):
+    """
+    Apache Tika client running on an asyncio event loop. Many extractions can be
+    in flight at the same time without a thread for each one
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_retries: int = 5,
+        retry_base_delay: float = 2.0,
+        connection_pool_size: int = 10,
+        chunk_size: int = 8192,
+    ):
+        self._url = url
+        self._max_retries = max_retries
+        self._retry_base_delay = retry_base_delay
+        self._connection_pool_size = connection_pool_size
+        self._chunk_size = chunk_size
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        The session is created on first use so it is bound to the running loop
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._connection_pool_size)
+            timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _chunk_file_generator(self, filepath: str):
+        """
+        Yields file content in chunks for chunked transfer encoding. The file is
+        read in a thread, so the disk does not block the event loop
+        """
+        file = await asyncio.to_thread(open, filepath, "rb")
+        try:
+            while chunk := await asyncio.to_thread(file.read, self._chunk_size):
+                yield chunk
+        finally:
+            file.close()
+
+    def _return_file_content(self, filepath: str) -> str:
+        with open(filepath, "r") as file:
+            return file.read()
+
+    async def _try_extract_text(self, filepath: str, probe: FileProbe) -> str:
+        """
+        Extract text from file, retrying transient network errors without
+        blocking the event loop
+        """
+        if probe.is_txt():
+            return await asyncio.to_thread(self._return_file_content, filepath)
+
+        file_size = probe.size
+        content_type = probe.mime_type
+
+        last_exception = None
+        for attempt in range(self._max_retries):
+            try:
+                return await self._make_tika_request(filepath, file_size, content_type)
+            except RETRYABLE_ERRORS as e:
+                last_exception = e
+
+                if attempt < self._max_retries - 1:
+                    base_wait = self._retry_base_delay * (2**attempt)
+                    wait_time = base_wait + random.uniform(0, base_wait * 0.1)
+                    logging.warning(
+                        f"Transient error on attempt {attempt + 1}/{self._max_retries} "
+                        f"for {filepath}: {type(e).__name__}. Retrying in {wait_time:.1f}s..."
+                    )
+                    await asyncio.sleep(wait_time)
+                else:
+                    logging.error(
+                        f"Failed after {self._max_retries} attempts for {filepath}: {type(e).__name__}"
+                    )
+
+        raise last_exception
+
+    async def _make_tika_request(
+        self, filepath: str, file_size: int, content_type: str
+    ) -> str:
+        """Make the actual HTTP request to Tika"""
+        log_tika_request(filepath, file_size, content_type, self._url)
+        start_time = time.time()
+        headers = {
+            "Content-Type": content_type,
+            "Accept": "text/plain",
+        }
+        try:
+            async with self._get_session().put(
+                f"{self._url}/tika",
+                data=self._chunk_file_generator(filepath),
+                headers=headers,
+            ) as response:
+                duration_ms = (time.time() - start_time) * 1000
+                if response.status != 200:
+                    body = await response.text(errors="replace")
+                    error_msg = (
+                        f"Tika returned HTTP {response.status} for {filepath}. "
+                        f"Response: {body[:500]}"
+                    )
+                    log_tika_error(
+                        filepath,
+                        f"HTTPError{response.status}",
+                        error_msg,
+                        duration_ms,
+                        file_size=file_size,
+                        status_code=response.status,
+                    )
+                    raise aiohttp.ClientResponseError(
+                        response.request_info,
+                        response.history,
+                        status=response.status,
+                        message=error_msg,
+                    )
+
+                text = await response.text(encoding="UTF-8")
+                log_tika_response(filepath, duration_ms, len(text), response.status)
+                return text
+        except aiohttp.ClientResponseError:
+            raise
+        except Exception as e:
+            duration_ms = (time.time() - start_time) * 1000
+            log_tika_error(
+                filepath, type(e).__name__, str(e), duration_ms, file_size=file_size
+            )
+            raise
+
+    async def extract_text(
+        self, filepath: str, probe: Union[FileProbe, None] = None
+    ) -> str:
+        logging.debug(f"Extracting text from {filepath}")
+        self.check_file_exists(filepath)
+        if probe is None:
+            # libmagic reads the file, so it runs in a thread
+            probe = await asyncio.to_thread(probe_file, filepath)
+        self.check_file_type_supported(filepath, probe)
+        return await self._try_extract_text(filepath, probe)
+
+
+def create_async_apache_tika_text_extraction() -> AsyncTextExtractorInterface:
+    return AsyncApacheTikaTextExtractor(
+        get_apache_tika_server_url(),
+        max_retries=get_tika_max_retries(),
+        retry_base_delay=float(os.environ.get("TIKA_RETRY_BASE_DELAY", "2.0")),
+        connection_pool_size=int(os.environ.get("TIKA_CONNECTION_POOL_SIZE", "10")),
+        chunk_size=int(os.environ.get("TIKA_CHUNK_SIZE", "8192")),
+    )
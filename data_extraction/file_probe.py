@@ -0,0 +1,162 @@
+import mimetypes
+import os
+from typing import Iterable, Union
+
+import magic
+
+PDF_TYPES = ("application/pdf",)
+DOC_TYPES = (
+    "application/msword",
+    "application/vnd.oasis.opendocument.text",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+)
+TXT_TYPES = ("text/plain",)
+ZIP_TYPES = ("application/zip",)
+
+# libmagic may need more than the header to tell apart a .docx/.odt from a plain
+# ZIP archive, or a .doc from other OLE files, so these results are confirmed
+# with a full read of the file unless the hints agree with them
+AMBIGUOUS_TYPES = (
+    "application/zip",
+    "application/x-ole-storage",
+)
+
+# Fallback results of libmagic, which the rest of the file may contradict (e.g.
+# text with binary data after the header), so they are always confirmed with a
+# full read of the file
+GENERIC_TYPES = ("text/plain", "application/octet-stream")
+
+# Generic Content-Type values some uploaders set, which say nothing about the file
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream")
+
+PROBE_HEADER_SIZE = 64 * 1024
+
+
+class FileProbe:
+    """
+    File type and size of a downloaded gazette file, identified once and reused
+    by every check made on the file afterwards
+    """
+
+    __slots__ = ("path", "mime_type", "size")
+
+    def __init__(self, path: str, mime_type: str, size: int):
+        self.path = path
+        self.mime_type = mime_type
+        self.size = size
+
+    @classmethod
+    def from_file(cls, path: str) -> "FileProbe":
+        return cls(path, magic.from_file(path, mime=True), os.path.getsize(path))
+
+    def is_pdf(self) -> bool:
+        return self.mime_type in PDF_TYPES
+
+    def is_doc(self) -> bool:
+        return self.mime_type in DOC_TYPES
+
+    def is_txt(self) -> bool:
+        return self.mime_type in TXT_TYPES
+
+    def is_zip(self) -> bool:
+        return self.mime_type in ZIP_TYPES
+
+    def is_supported(self) -> bool:
+        return self.is_pdf() or self.is_doc() or self.is_txt()
+
+
+class ProbingWriter:
+    """
+    Wraps the destination file of a download, keeping a copy of the first bytes
+    written so the file type can be identified without reading the file again.
+
+    Seeking is delegated to the destination, so downloads writing ranges out of
+    order (like boto3 multipart downloads) keep working.
+    """
+
+    def __init__(
+        self,
+        destination,
+        file_key: str = "",
+        header_size: int = PROBE_HEADER_SIZE,
+    ):
+        self._destination = destination
+        self._header = bytearray(header_size)
+        self._position = 0
+        self.size = 0
+        self.extension_hint = get_type_hint(file_key)
+        # Content-Type reported by the storage, set by clients that receive it
+        self.content_type_hint = None
+
+    def write(self, data: bytes) -> int:
+        start = self._position
+        end = start + len(data)
+        if start < len(self._header):
+            captured = min(end, len(self._header)) - start
+            self._header[start : start + captured] = data[:captured]
+        self._position = end
+        self.size = max(self.size, end)
+        return self._destination.write(data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        self._position = self._destination.seek(offset, whence)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return True
+
+    def flush(self) -> None:
+        self._destination.flush()
+
+    def probe(self, path: str) -> FileProbe:
+        """
+        Identifies the file written at path. Must be called after the download
+        finished and the destination was closed
+        """
+        header = bytes(self._header[: min(self.size, len(self._header))])
+        mime_type = identify_header(
+            header,
+            self.size,
+            {self.extension_hint, self.content_type_hint},
+        )
+        if mime_type is None:
+            mime_type = magic.from_file(path, mime=True)
+        return FileProbe(path, mime_type, self.size)
+
+
+def get_type_hint(file_key: str) -> Union[str, None]:
+    """
+    Mime type suggested by the extension of the file key
+    """
+    return mimetypes.guess_type(str(file_key))[0]
+
+
+def identify_header(
+    header: bytes, size: int, hints: Iterable[Union[str, None]] = ()
+) -> Union[str, None]:
+    """
+    Identifies a file of the given size from its first bytes. Returns None when
+    the header only gives a generic type, or is ambiguous and the hints (mime
+    types suggested by the file extension or the storage) do not agree with it,
+    so the whole file must be read
+    """
+    mime_type = magic.from_buffer(header, mime=True)
+    if size <= len(header):
+        return mime_type
+    if mime_type in GENERIC_TYPES:
+        return None
+    if mime_type not in AMBIGUOUS_TYPES:
+        return mime_type
+    hints = {hint for hint in hints if hint and hint not in GENERIC_CONTENT_TYPES}
+    return mime_type if mime_type in hints else None
+
+
+def probe_file(path: str, probe: Union[FileProbe, None] = None) -> FileProbe:
+    """
+    Returns the given probe, or identifies the file when none was computed during
+    the download
+    """
+    return probe if probe is not None else FileProbe.from_file(path)
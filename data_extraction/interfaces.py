@@ -1,11 +1,28 @@
 import abc
+from typing import Callable, Iterable, Optional
+
+from .file_probe import FileProbe
 
 
 class TextExtractorInterface(abc.ABC):
     @abc.abstractmethod
-    def extract_text(self, filepath: str) -> str:
+    def extract_text(self, filepath: str, probe: Optional[FileProbe] = None) -> str:
+        """
+        Extract the text from the given file. The probe computed while the file was
+        downloaded, when given, is used instead of identifying the file again
+        """
+
+    @abc.abstractmethod
+    def extract_text_from_stream(
+        self,
+        open_chunks: Callable[[], Iterable[bytes]],
+        probe: FileProbe,
+        source: str = "stream",
+    ) -> str:
         """
-        Extract the text from the given file
+        Extract the text from content that is not on disk. open_chunks returns the
+        content as an iterable of bytes and is called again when the extraction is
+        retried. source names the content in the logs
         """
 
     @abc.abstractmethod
@@ -13,3 +30,33 @@ class TextExtractorInterface(abc.ABC):
         """
         Check if the given file is a ZIP archive
         """
+
+    def with_read_timeout(self, seconds: float) -> "TextExtractorInterface":
+        """
+        Extractor sharing the connections of this one that waits at most seconds
+        for the text of each file. Extractors without a timeout return themselves
+        """
+        return self
+
+
+class AsyncTextExtractorInterface(abc.ABC):
+    @abc.abstractmethod
+    async def extract_text(
+        self, filepath: str, probe: Optional[FileProbe] = None
+    ) -> str:
+        """
+        Extract the text from the given file. The probe computed while the file was
+        downloaded, when given, is used instead of identifying the file again
+        """
+
+    @abc.abstractmethod
+    def is_zip(self, filepath: str) -> bool:
+        """
+        Check if the given file is a ZIP archive
+        """
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """
+        Release the connections held by the extractor
+        """
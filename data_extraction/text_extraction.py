@@ -1,16 +1,31 @@
-import gc
+import copy
 import logging
 import os
 import random
 import time
+from typing import Callable, Iterable, Iterator, Union
 
 import magic
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry as Urllib3Retry
 
-from monitoring import log_tika_error, log_tika_request, log_tika_response
-
+from monitoring import (
+    get_adaptive_limiter,
+    get_memory_governor,
+    log_tika_error,
+    log_tika_request,
+    log_tika_response,
+)
+
+from .file_probe import (
+    DOC_TYPES,
+    PDF_TYPES,
+    TXT_TYPES,
+    ZIP_TYPES,
+    FileProbe,
+    probe_file,
+)
 from .interfaces import TextExtractorInterface
 
 
@@ -20,7 +35,64 @@ class UnsupportedFileTypeError(Exception):
     pass
 
 
-class ApacheTikaTextExtractor(TextExtractorInterface):
+class FileTypeChecker:
+    """
+    File type checks shared by the text extractors
+    """
+
+    def check_file_exists(self, filepath: str):
+        if not os.path.exists(filepath):
+            raise Exception(f"File does not exists: {filepath}")
+
+    def check_file_type_supported(
+        self, filepath: str, probe: Union[FileProbe, None] = None
+    ) -> None:
+        probe = probe_file(filepath, probe)
+        if not probe.is_supported():
+            raise UnsupportedFileTypeError(f"Unsupported file type: {probe.mime_type}")
+
+    def is_pdf(self, filepath):
+        """
+        If the file type is pdf returns True. Otherwise,
+        returns False
+        """
+        return self.is_file_type(filepath, file_types=PDF_TYPES)
+
+    def is_doc(self, filepath):
+        """
+        If the file type is doc or similar returns True. Otherwise,
+        returns False
+        """
+        return self.is_file_type(filepath, DOC_TYPES)
+
+    def is_txt(self, filepath):
+        """
+        If the file type is txt returns True. Otherwise,
+        returns False
+        """
+        return self.is_file_type(filepath, file_types=TXT_TYPES)
+
+    def get_file_type(self, filepath):
+        """
+        Returns the file's type
+        """
+        return magic.from_file(filepath, mime=True)
+
+    def is_file_type(self, filepath, file_types):
+        """
+        Generic method to check if a identified file type matches a given list of types
+        """
+        return self.get_file_type(filepath) in file_types
+
+    def is_zip(self, filepath):
+        """
+        If the file type is zip returns True. Otherwise,
+        returns False
+        """
+        return self.is_file_type(filepath, file_types=ZIP_TYPES)
+
+
+class ApacheTikaTextExtractor(FileTypeChecker, TextExtractorInterface):
     def __init__(
         self,
         url: str,
@@ -28,12 +100,20 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
         retry_base_delay: float = 2.0,
         connection_pool_size: int = 10,
         chunk_size: int = 8192,
+        read_timeout: float = 300,
     ):
         self._url = url
+        self._read_timeout = read_timeout
         self._max_retries = max_retries
         self._retry_base_delay = retry_base_delay
         self._chunk_size = chunk_size
         self._session = self._create_session(connection_pool_size)
+        self._limiter = get_adaptive_limiter(
+            "tika",
+            maximum=connection_pool_size,
+            target_latency=60.0,
+            is_overload=is_tika_overload,
+        )
 
     def _create_session(self, pool_size: int) -> requests.Session:
         """
@@ -78,25 +158,47 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
         with open(filepath, "r") as file:
             return file.read()
 
-    def _try_extract_text(self, filepath: str) -> str:
+    def _try_extract_text(
+        self, filepath: str, probe: Union[FileProbe, None] = None
+    ) -> str:
         """
         Extract text from file using streaming when possible to prevent OOM.
         Implements retry logic for transient network errors.
         """
-        if self.is_txt(filepath):
+        probe = probe_file(filepath, probe)
+        if probe.is_txt():
             return self._return_file_content(filepath)
 
-        file_size = os.path.getsize(filepath)
-        content_type = self._get_file_type(filepath)
+        return self._send_to_tika(
+            filepath,
+            probe.size,
+            probe.mime_type,
+            lambda: self._chunk_file_generator(filepath),
+        )
 
+    def _send_to_tika(
+        self,
+        filepath: str,
+        file_size: int,
+        content_type: str,
+        open_chunks: Callable[[], Iterable[bytes]],
+    ) -> str:
+        """
+        Sends the content returned by open_chunks to Tika. open_chunks is called
+        again on every retry, so each attempt sends the whole content
+        """
         last_exception = None
         for attempt in range(self._max_retries):
-            start_time = time.time()
-
             try:
-                return self._make_tika_request(
-                    filepath, file_size, content_type, start_time, attempt=attempt
-                )
+                with self._limiter.slot():
+                    return self._make_tika_request(
+                        filepath,
+                        file_size,
+                        content_type,
+                        time.time(),
+                        attempt=attempt,
+                        data=iter(open_chunks()),
+                    )
             except (
                 requests.exceptions.ConnectionError,
                 requests.exceptions.Timeout,
@@ -133,8 +235,11 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
         content_type: str,
         start_time: float,
         attempt: int = 0,
+        data: Union[Iterator[bytes], None] = None,
     ) -> str:
         """Make the actual HTTP request to Tika"""
+        if data is None:
+            data = self._chunk_file_generator(filepath)
         log_tika_request(filepath, file_size, content_type, self._url)
         try:
             headers = {
@@ -146,10 +251,11 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
             # data incrementally and avoids buffering the whole file before parsing.
             response = self._session.put(
                 f"{self._url}/tika",
-                data=self._chunk_file_generator(filepath),
+                data=data,
                 headers=headers,
                 stream=False,
-                timeout=(30, 300),  # (connect timeout, read timeout) in seconds
+                # (connect timeout, read timeout) in seconds
+                timeout=(30, self._read_timeout),
             )
 
             duration_ms = (time.time() - start_time) * 1000
@@ -168,7 +274,7 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
                     file_size=file_size,
                     status_code=response.status_code,
                 )
-                raise requests.HTTPError(error_msg)
+                raise requests.HTTPError(error_msg, response=response)
 
             response.encoding = "UTF-8"
             text = response.text
@@ -179,7 +285,7 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
             # Explicit cleanup to free memory immediately
             response.close()
             del response
-            gc.collect()
+            get_memory_governor().maybe_collect()
 
             return text
         except requests.exceptions.ConnectionError as e:
@@ -188,7 +294,6 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
             log_tika_error(
                 filepath, "ConnectionError", error_msg, duration_ms, file_size=file_size
             )
-            gc.collect()
             raise
         except requests.exceptions.Timeout:
             duration_ms = (time.time() - start_time) * 1000
@@ -196,7 +301,6 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
             log_tika_error(
                 filepath, "TimeoutError", error_msg, duration_ms, file_size=file_size
             )
-            gc.collect()
             raise
         except requests.exceptions.ChunkedEncodingError as e:
             duration_ms = (time.time() - start_time) * 1000
@@ -208,11 +312,9 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
                 duration_ms,
                 file_size=file_size,
             )
-            gc.collect()
             raise
         except requests.HTTPError:
-            # Already logged above, just ensure cleanup
-            gc.collect()
+            # Already logged above
             raise
         except Exception as e:
             duration_ms = (time.time() - start_time) * 1000
@@ -223,88 +325,73 @@ class ApacheTikaTextExtractor(TextExtractorInterface):
             log_tika_error(
                 filepath, error_type, error_message, duration_ms, file_size=file_size
             )
-
-            # Ensure cleanup even on error
-            gc.collect()
             raise e
 
-    def extract_text(self, filepath: str) -> str:
+    def extract_text(self, filepath: str, probe: Union[FileProbe, None] = None) -> str:
         logging.debug(f"Extracting text from {filepath}")
         self.check_file_exists(filepath)
-        self.check_file_type_supported(filepath)
-        return self._try_extract_text(filepath)
-
-    def check_file_exists(self, filepath: str):
-        if not os.path.exists(filepath):
-            raise Exception(f"File does not exists: {filepath}")
-
-    def check_file_type_supported(self, filepath: str) -> None:
-        file_type = self.get_file_type(filepath)
-        if (
-            not self.is_doc(filepath)
-            and not self.is_pdf(filepath)
-            and not self.is_txt(filepath)
-        ):
-            raise UnsupportedFileTypeError(f"Unsupported file type: {file_type}")
-
-    def is_pdf(self, filepath):
-        """
-        If the file type is pdf returns True. Otherwise,
-        returns False
-        """
-        return self.is_file_type(filepath, file_types=["application/pdf"])
+        # Identify the file once when the caller did not probe it while downloading
+        probe = probe_file(filepath, probe)
+        self.check_file_type_supported(filepath, probe)
+        return self._try_extract_text(filepath, probe)
 
-    def is_doc(self, filepath):
-        """
-        If the file type is doc or similar returns True. Otherwise,
-        returns False
-        """
-        file_types = [
-            "application/msword",
-            "application/vnd.oasis.opendocument.text",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        ]
-        return self.is_file_type(filepath, file_types)
-
-    def is_txt(self, filepath):
-        """
-        If the file type is txt returns True. Otherwise,
-        returns False
-        """
-        return self.is_file_type(filepath, file_types=["text/plain"])
-
-    def get_file_type(self, filepath):
-        """
-        Returns the file's type
-        """
-        return magic.from_file(filepath, mime=True)
-
-    def is_file_type(self, filepath, file_types):
-        """
-        Generic method to check if a identified file type matches a given list of types
-        """
-        return self.get_file_type(filepath) in file_types
-
-    def is_zip(self, filepath):
-        """
-        If the file type is zip returns True. Otherwise,
-        returns False
-        """
-        return self.is_file_type(filepath, file_types=["application/zip"])
+    def extract_text_from_stream(
+        self,
+        open_chunks: Callable[[], Iterable[bytes]],
+        probe: FileProbe,
+        source: str = "stream",
+    ) -> str:
+        logging.debug(f"Extracting text from {source} (streaming)")
+        self.check_file_type_supported(source, probe)
+        if probe.is_txt():
+            return b"".join(open_chunks()).decode()
+        return self._send_to_tika(source, probe.size, probe.mime_type, open_chunks)
+
+    def with_read_timeout(self, seconds: float) -> "ApacheTikaTextExtractor":
+        extractor = copy.copy(self)
+        extractor._read_timeout = seconds
+        return extractor
+
+
+def is_tika_overload(error: Exception) -> bool:
+    """
+    Whether the error shows Tika is overloaded, rather than the file being bad
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(
+        error,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ),
+    )
 
 
 def get_apache_tika_server_url():
     return os.environ["APACHE_TIKA_SERVER"]
 
 
+def get_tika_max_retries() -> int:
+    """
+    Attempts of each Tika request. When failed gazettes are scheduled to run again
+    later (EXTRACTION_RETRY_ATTEMPTS), a request is attempted once unless
+    TIKA_MAX_RETRIES is set, so a failure is not retried both inline and later
+    """
+    scheduled = int(os.environ.get("EXTRACTION_RETRY_ATTEMPTS", "0")) > 0
+    return int(os.environ.get("TIKA_MAX_RETRIES", "1" if scheduled else "5"))
+
+
 def create_apache_tika_text_extraction() -> TextExtractorInterface:
     apache_tika_server_url = get_apache_tika_server_url()
 
     # Read configuration from environment with defaults
-    max_retries = int(os.environ.get("TIKA_MAX_RETRIES", "5"))
+    max_retries = get_tika_max_retries()
     retry_base_delay = float(os.environ.get("TIKA_RETRY_BASE_DELAY", "2.0"))
     connection_pool_size = int(os.environ.get("TIKA_CONNECTION_POOL_SIZE", "10"))
     chunk_size = int(os.environ.get("TIKA_CHUNK_SIZE", "8192"))
+    read_timeout = float(os.environ.get("TIKA_READ_TIMEOUT", "300"))
 
     return ApacheTikaTextExtractor(
         apache_tika_server_url,
@@ -312,4 +399,5 @@ def create_apache_tika_text_extraction() -> TextExtractorInterface:
         retry_base_delay=retry_base_delay,
         connection_pool_size=connection_pool_size,
         chunk_size=chunk_size,
+        read_timeout=read_timeout,
     )
@@ -1,8 +1,9 @@
 from .interfaces import DatabaseInterface
-from .postgresql import PostgreSQL, create_database_interface
+from .postgresql import PooledPostgreSQL, PostgreSQL, create_database_interface
 
 __all__ = [
     "create_database_interface",
     "DatabaseInterface",
+    "PooledPostgreSQL",
     "PostgreSQL",
 ]
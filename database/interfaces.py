@@ -1,5 +1,6 @@
 import abc
-from typing import Dict, Iterable, Tuple
+import time
+from typing import Dict, Iterable, List, Tuple
 
 
 class DatabaseInterface(abc.ABC):
@@ -32,8 +33,30 @@ class DatabaseInterface(abc.ABC):
         Update entries from the database
         """
 
+    @abc.abstractmethod
+    def update_many(self, command: str, data: Iterable[Tuple]) -> None:
+        """
+        Update entries from the database with a single statement, expanding the
+        VALUES placeholder in the command with all the rows in data
+        """
+
+    @abc.abstractmethod
+    def update_returning(self, command: str, data: Dict) -> List[Tuple]:
+        """
+        Update entries from the database, returning the rows produced by the
+        command (e.g. by a RETURNING clause) once the change is committed
+        """
+
     @abc.abstractmethod
     def delete(self, command: str, data: Dict) -> None:
         """
         Delete entries from the database
         """
+
+    def wait_for_notification(self, channel: str, timeout: float) -> bool:
+        """
+        Waits up to timeout seconds for a notification sent to channel, returning
+        whether one arrived. Databases without notifications just wait
+        """
+        time.sleep(timeout)
+        return False
@@ -1,8 +1,17 @@
 import logging
 import os
-from typing import Dict, Iterable, Tuple
+import select
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple, TypeVar
 
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+from psycopg2 import sql
 
 from .interfaces import DatabaseInterface
 
@@ -27,36 +36,211 @@ def get_database_port():
     return os.environ["POSTGRES_PORT"]
 
 
+def get_cursor_itersize():
+    return int(os.environ.get("POSTGRES_CURSOR_ITERSIZE", 2000))
+
+
+def get_pool_min_size():
+    return int(os.environ.get("POSTGRES_POOL_MIN_SIZE", 1))
+
+
+def get_pool_max_size():
+    return int(os.environ.get("POSTGRES_POOL_MAX_SIZE", 1))
+
+
+def get_pool_check_after():
+    return float(os.environ.get("POSTGRES_POOL_CHECK_AFTER_SECONDS", 30))
+
+
 def create_database_interface() -> DatabaseInterface:
-    return PostgreSQL(
+    connection_arguments = (
         get_database_host(),
         get_database_name(),
         get_database_user(),
         get_database_password(),
         get_database_port(),
     )
+    if get_pool_max_size() > 1:
+        return PooledPostgreSQL(
+            *connection_arguments,
+            cursor_itersize=get_cursor_itersize(),
+            min_size=get_pool_min_size(),
+            max_size=get_pool_max_size(),
+            check_after=get_pool_check_after(),
+        )
+    return PostgreSQL(*connection_arguments, cursor_itersize=get_cursor_itersize())
+
+
+# Errors meaning the connection was lost, after which it is replaced
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+T = TypeVar("T")
+
+
+def rollback(connection) -> None:
+    """
+    Rolls back the transaction of connection, if it is still open
+    """
+    if connection.closed:
+        return
+    try:
+        connection.rollback()
+    except CONNECTION_ERRORS:
+        pass
 
 
 class PostgreSQL(DatabaseInterface):
-    def __init__(self, host, database, user, password, port):
-        self._connection = psycopg2.connect(
+    """
+    Every call runs on a single connection, which is opened again when it is
+    found closed. Changes that fail because the connection was lost are run once
+    more on the new connection. Threads take turns on the connection, so the
+    statements of one are never committed or rolled back by another.
+
+    Notifications are received on a connection of their own, opened by the first
+    wait_for_notification() call.
+    """
+
+    _listener = None
+
+    def __init__(self, host, database, user, password, port, cursor_itersize=2000):
+        self._connection_arguments = dict(
             dbname=database, user=user, password=password, host=host, port=port
         )
+        self._cursor_itersize = cursor_itersize
+        self._lock = threading.RLock()
+        self._connection = self._connect()
+
+    def _connect(self):
+        return psycopg2.connect(**self._connection_arguments)
+
+    @contextmanager
+    def _checkout(self):
+        """
+        Lends the connection for the duration of the block, to one thread at a
+        time. A block failing in a transaction rolls it back, so the next calls
+        do not find it aborted
+        """
+        with self._lock:
+            if self._connection.closed:
+                logging.warning("Connection to PostgreSQL closed, reconnecting")
+                self._connection = self._connect()
+            try:
+                yield self._connection
+            except Exception:
+                rollback(self._connection)
+                raise
+
+    def _run_change(self, change: Callable[..., T], retry: bool = True) -> T:
+        """
+        Runs change with a cursor and commits it, running it again on a new
+        connection if the connection was lost. Changes that must not run twice
+        (e.g. claims) pass retry=False and leave it to the caller
+        """
+        attempts = 2 if retry else 1
+        for attempt in range(attempts):
+            with self._checkout() as connection:
+                try:
+                    with connection.cursor() as cursor:
+                        result = change(cursor)
+                        connection.commit()
+                        return result
+                except CONNECTION_ERRORS as e:
+                    # Errors like statement timeouts leave the connection open
+                    if attempt + 1 == attempts or not connection.closed:
+                        raise
+                    logging.warning(f"Lost connection to PostgreSQL, retrying: {e}")
+
+    def close(self) -> None:
+        self._close_listener()
+        self._connection.close()
+
+    def wait_for_notification(self, channel: str, timeout: float) -> bool:
+        """
+        LISTENs on channel and waits up to timeout seconds for a NOTIFY on it. A
+        lost listener connection is logged and opened again on the next call
+        """
+        try:
+            listener = self._get_listener(channel)
+            ready, _, _ = select.select([listener], [], [], timeout)
+            if not ready:
+                return False
+            listener.poll()
+            received = any(notify.channel == channel for notify in listener.notifies)
+            listener.notifies.clear()
+            return received
+        except CONNECTION_ERRORS + (OSError,) as e:
+            logging.warning(f"Lost PostgreSQL listener connection: {e}")
+            self._close_listener()
+            time.sleep(timeout)
+            return False
+
+    def _get_listener(self, channel: str):
+        if self._listener is None or self._listener.closed:
+            self._listener = self._connect()
+            self._listener.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+            )
+            self._listening = set()
+        if channel not in self._listening:
+            with self._listener.cursor() as cursor:
+                cursor.execute(sql.SQL("LISTEN {};").format(sql.Identifier(channel)))
+            self._listening.add(channel)
+        return self._listener
+
+    def _close_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
 
     def _commit_changes(self, command: str, data: Dict = {}) -> None:
-        with self._connection.cursor() as cursor:
-            logging.debug(f"Making change: {cursor.query}")
+        def change(cursor):
             cursor.execute(command, data)
-            self._connection.commit()
+            logging.debug(f"Making change: {cursor.query}")
+
+        self._run_change(change)
 
     def select(self, command: str) -> Iterable[Tuple]:
-        with self._connection.cursor() as cursor:
+        """
+        Streams the rows of the query from a server-side cursor, which fetches
+        cursor_itersize rows per round trip instead of loading the whole result
+        in memory. The cursor is declared WITH HOLD, so changes committed while
+        the rows are iterated do not close it. A cursor_itersize of 0 uses a
+        client-side cursor (e.g. behind a pooler in transaction mode).
+
+        The connection is only held for each round trip, so other threads and
+        the caller itself can make changes while the rows are iterated
+        """
+        with self._checkout() as connection:
+            cursor = self._open_select_cursor(connection)
             cursor.execute(command)
-            logging.debug(f"Starting query: {cursor.query}")
-            for entry in cursor:
-                logging.debug(entry)
-                yield entry
+            # Once committed, the cursor outlives the rollback of other calls
+            connection.commit()
+        logging.debug(f"Starting query: {cursor.query}")
+        try:
+            while True:
+                with self._checkout():
+                    rows = self._fetch_rows(cursor)
+                if not rows:
+                    break
+                for entry in rows:
+                    logging.debug(entry)
+                    yield entry
             logging.debug(f"Finished query: {cursor.query}")
+        finally:
+            with self._lock:
+                cursor.close()
+
+    def _fetch_rows(self, cursor) -> List[Tuple]:
+        if not self._cursor_itersize:
+            return cursor.fetchall()
+        return cursor.fetchmany(self._cursor_itersize)
+
+    def _open_select_cursor(self, connection):
+        if not self._cursor_itersize:
+            return connection.cursor()
+        cursor = connection.cursor(name=f"select_{uuid.uuid4().hex}", withhold=True)
+        cursor.itersize = self._cursor_itersize
+        return cursor
 
     def insert(self, command: str, data: Dict = {}):
         logging.debug("Inserting:")
@@ -68,6 +252,34 @@ class PostgreSQL(DatabaseInterface):
         self._commit_changes(command, data)
         logging.debug("Finished updating")
 
+    def update_many(self, command: str, data: Iterable[Tuple]):
+        """
+        Runs command once for all the rows in data, which fill its single
+        "VALUES %s" placeholder, and commits once
+        """
+        data = list(data)
+        if not data:
+            return
+        logging.debug(f"Updating {len(data)} rows:")
+        self._run_change(
+            lambda cursor: psycopg2.extras.execute_values(
+                cursor, command, data, page_size=len(data)
+            )
+        )
+        logging.debug("Finished updating")
+
+    def update_returning(self, command: str, data: Dict = {}) -> List[Tuple]:
+        def change(cursor):
+            cursor.execute(command, data)
+            return cursor.fetchall()
+
+        logging.debug("Updating:")
+        # Running a claim again after a lost connection could claim a second
+        # batch while the first one stays leased, so the caller claims again
+        rows = self._run_change(change, retry=False)
+        logging.debug(f"Finished updating, {len(rows)} rows returned")
+        return rows
+
     def delete(self, command: str, data: Dict = {}):
         logging.debug("Deleting:")
         self._commit_changes(command, data)
@@ -83,3 +295,103 @@ class PostgreSQL(DatabaseInterface):
         command = "UPDATE gazettes SET processed = true WHERE id = %(id)s"
         data = {"id": gazette_id}
         self.update(command, data)
+
+
+class PooledPostgreSQL(PostgreSQL):
+    """
+    Same as PostgreSQL, running each call on a connection borrowed from a pool of
+    min_size to max_size connections, so it can be used from several threads at
+    the same time. Callers wait for a free connection when all max_size are lent.
+
+    A connection idle for more than check_after seconds is checked with a trivial
+    query before being lent, and replaced when it was dropped. Connections are
+    returned to the pool with their transaction rolled back.
+    """
+
+    def __init__(
+        self,
+        host,
+        database,
+        user,
+        password,
+        port,
+        cursor_itersize=2000,
+        min_size=1,
+        max_size=10,
+        check_after=30.0,
+    ):
+        self._connection_arguments = dict(
+            dbname=database, user=user, password=password, host=host, port=port
+        )
+        self._cursor_itersize = cursor_itersize
+        self._check_after = check_after
+        # psycopg2 pools raise instead of waiting when all connections are lent
+        self._available = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            min_size, max_size, **self._connection_arguments
+        )
+
+    @contextmanager
+    def _checkout(self):
+        with self._available:
+            connection = self._get_healthy_connection()
+            try:
+                yield connection
+            finally:
+                self._release(connection)
+
+    def _get_healthy_connection(self):
+        while True:
+            connection = self._pool.getconn()
+            # Connections never lent were just opened by the pool
+            now = time.monotonic()
+            idle = now - self._last_used.get(id(connection), now)
+            if not connection.closed and (
+                idle < self._check_after or self._is_alive(connection)
+            ):
+                return connection
+            logging.warning("Discarding dropped PostgreSQL connection")
+            self._pool.putconn(connection, close=True)
+
+    def _is_alive(self, connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _release(self, connection) -> None:
+        if not connection.closed:
+            try:
+                status = connection.get_transaction_status()
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except CONNECTION_ERRORS:
+                pass
+        lost = bool(connection.closed)
+        if lost:
+            self._last_used.pop(id(connection), None)
+        else:
+            self._last_used[id(connection)] = time.monotonic()
+        self._pool.putconn(connection, close=lost)
+
+    def select(self, command: str) -> Iterable[Tuple]:
+        """
+        Same as PostgreSQL.select, holding a connection of the pool while the
+        rows are iterated
+        """
+        with self._checkout() as connection:
+            with self._open_select_cursor(connection) as cursor:
+                cursor.execute(command)
+                logging.debug(f"Starting query: {cursor.query}")
+                for entry in cursor:
+                    logging.debug(entry)
+                    yield entry
+                logging.debug(f"Finished query: {cursor.query}")
+
+    def close(self) -> None:
+        self._close_listener()
+        self._pool.closeall()
@@ -1,7 +1,15 @@
-from .interfaces import IndexInterface
+from .async_opensearch import AsyncOpenSearchInterface, create_async_index_interface
+from .bulk import BulkIndexer, BulkIndexError, create_bulk_indexer
+from .interfaces import AsyncIndexInterface, IndexInterface
 from .opensearch import OpenSearchInterface, create_index_interface
 
 __all__ = [
+    "AsyncIndexInterface",
+    "AsyncOpenSearchInterface",
+    "BulkIndexer",
+    "BulkIndexError",
+    "create_bulk_indexer",
+    "create_async_index_interface",
     "create_index_interface",
     "IndexInterface",
     "OpenSearchInterface",
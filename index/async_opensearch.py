@@ -0,0 +1,122 @@
+import asyncio
+import json
+import time
+from typing import Dict, List, Union
+
+import opensearchpy
+
+from monitoring import log_opensearch_error, log_opensearch_operation
+
+from .interfaces import AsyncIndexInterface
+from .opensearch import (
+    date_serializer,
+    get_opensearch_host,
+    get_opensearch_index,
+    get_opensearch_password,
+    get_opensearch_user,
+)
+
+
+class AsyncOpenSearchInterface(AsyncIndexInterface):
+    """
+    OpenSearch client running on an asyncio event loop
+    """
+
+    def __init__(
+        self,
+        hosts: List,
+        user: str,
+        password: str,
+        timeout: int = 60,
+        default_index: str = "",
+        connections_per_node: int = 10,
+    ):
+        self._search_engine = opensearchpy.AsyncOpenSearch(
+            hosts=hosts,
+            http_auth=(user, password),
+            timeout=timeout,
+            max_retries=3,
+            retry_on_timeout=True,
+            connections_per_node=connections_per_node,
+        )
+        self._timeout = timeout
+        self._default_index = default_index
+
+    def get_index_name(self, index_name: str) -> str:
+        if isinstance(index_name, str) and len(index_name) > 0:
+            return index_name
+        if self._default_index == "":
+            raise Exception("Index name not defined")
+        return self._default_index
+
+    async def close(self) -> None:
+        await self._search_engine.close()
+
+    async def document_exists(self, document_id: str, index: str = "") -> bool:
+        index = self.get_index_name(index)
+        return await self._search_engine.exists(
+            index=index, id=document_id, request_timeout=self._timeout
+        )
+
+    async def index_document(
+        self,
+        document: Dict,
+        document_id: Union[str, None] = None,
+        index: str = "",
+        refresh: bool = False,
+    ) -> None:
+        index = self.get_index_name(index)
+
+        start_time = time.time()
+        delay = 1.0
+
+        for attempt in range(4):  # 3 retries + 1 initial attempt
+            try:
+                await self._search_engine.index(
+                    index=index,
+                    body=document,
+                    id=document_id,
+                    refresh=refresh,
+                    request_timeout=self._timeout,
+                )
+                duration_ms = (time.time() - start_time) * 1000
+                document_size = len(json.dumps(document, default=date_serializer))
+                log_opensearch_operation(
+                    "index",
+                    index,
+                    duration_ms,
+                    document_id=document_id,
+                    success=True,
+                    document_size=document_size,
+                )
+                return
+            except Exception as e:
+                if attempt < 3:
+                    await asyncio.sleep(delay)
+                    delay *= 2.0
+                else:
+                    duration_ms = (time.time() - start_time) * 1000
+                    log_opensearch_error(
+                        "index",
+                        index,
+                        type(e).__name__,
+                        str(e),
+                        duration_ms,
+                        document_id=document_id,
+                    )
+                    raise
+
+
+def create_async_index_interface() -> AsyncIndexInterface:
+    hosts = get_opensearch_host()
+    if not isinstance(hosts, str) or len(hosts) == 0:
+        raise Exception("Missing index hosts")
+    default_index_name = get_opensearch_index()
+    if not isinstance(default_index_name, str) or len(default_index_name) == 0:
+        raise Exception("Invalid index name")
+    return AsyncOpenSearchInterface(
+        [hosts],
+        get_opensearch_user(),
+        get_opensearch_password(),
+        default_index=default_index_name,
+    )
@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Union
+
+from .interfaces import IndexInterface
+from .opensearch import date_serializer
+
+# Item statuses worth sending again: the cluster rejected the item because it was
+# overloaded (429) or a shard was temporarily unavailable
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Whether a failed bulk request is worth sending again: connection errors and
+    timeouts have no HTTP status, overloaded clusters answer with a retryable one
+    """
+    status = getattr(error, "status_code", None)
+    return not isinstance(status, int) or status in RETRYABLE_STATUSES
+
+
+class BulkIndexError(Exception):
+    """Raised when documents could not be indexed by the bulk indexer"""
+
+    def __init__(self, failures: List[Dict]):
+        self.failures = failures
+        summary = ", ".join(
+            f"{failure['id']} ({failure['status']})" for failure in failures[:10]
+        )
+        super().__init__(f"Failed to index {len(failures)} documents: {summary}")
+
+
+class BulkIndexer:
+    """
+    Buffers documents and sends them to the index with _bulk requests.
+
+    A request is sent when max_documents documents or max_bytes bytes are
+    buffered, and on flush(), which must be called at the end of each stage so
+    the next one sees the documents. Only the items that failed with a retryable
+    status are sent again; the others are reported by flush() with BulkIndexError.
+    Failed requests are sent again too, and their documents are kept buffered
+    when they still fail. Requests failing with a status that is not retryable
+    (e.g. 400 or 413) are not sent again: their documents are reported by
+    flush() as well. The requests are sent outside the lock, so other threads
+    keep adding documents meanwhile.
+    """
+
+    def __init__(
+        self,
+        index: IndexInterface,
+        max_documents: int = 500,
+        max_bytes: int = 10 * 1024 * 1024,
+        max_retries: int = 3,
+        retry_base_delay: float = 1.0,
+        refresh: bool = False,
+    ):
+        self._index = index
+        self._max_documents = max_documents
+        self._max_bytes = max_bytes
+        self._max_retries = max_retries
+        self._retry_base_delay = retry_base_delay
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._sent = threading.Condition(self._lock)
+        self._sending = 0
+        # Pairs of (document id, NDJSON lines of the item)
+        self._items = []
+        self._buffered_bytes = 0
+        self._failures = []
+
+    def __enter__(self) -> "BulkIndexer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+
+    def add(
+        self,
+        document: Dict,
+        document_id: Union[str, None] = None,
+        index: str = "",
+    ) -> None:
+        action = {"_id": document_id} if document_id is not None else {}
+        if index:
+            action["_index"] = index
+        lines = (
+            json.dumps({"index": action})
+            + "\n"
+            + json.dumps(document, default=date_serializer)
+            + "\n"
+        )
+        with self._lock:
+            self._items.append((document_id, lines))
+            self._buffered_bytes += len(lines.encode())
+            if (
+                len(self._items) < self._max_documents
+                and self._buffered_bytes < self._max_bytes
+            ):
+                return
+            items = self._take_buffered()
+        self._send_buffered(items)
+
+    def flush(self) -> None:
+        """
+        Sends the buffered documents, waiting for them to be indexed. Raises
+        BulkIndexError with every document that failed since the last flush
+        """
+        with self._lock:
+            items = self._take_buffered()
+        self._send_buffered(items)
+        with self._lock:
+            # Requests started by add() in other threads must be done as well
+            self._sent.wait_for(lambda: not self._sending)
+            failures, self._failures = self._failures, []
+        if failures:
+            raise BulkIndexError(failures)
+
+    def _take_buffered(self) -> List:
+        """
+        Takes the buffered items to be sent. Must be called holding the lock and
+        followed by _send_buffered()
+        """
+        items, self._items = self._items, []
+        self._buffered_bytes = 0
+        self._sending += 1
+        return items
+
+    def _restore_buffered(self, items: List) -> None:
+        with self._lock:
+            self._items[:0] = items
+            self._buffered_bytes += sum(len(lines.encode()) for _, lines in items)
+
+    def _send_buffered(self, items: List) -> None:
+        try:
+            for attempt in range(self._max_retries + 1):
+                if not items:
+                    return
+                if attempt > 0:
+                    delay = self._retry_base_delay * (2 ** (attempt - 1))
+                    time.sleep(delay + random.uniform(0, delay * 0.1))
+                last_attempt = attempt == self._max_retries
+                try:
+                    items = self._send(items, last_attempt=last_attempt)
+                except Exception as e:
+                    if not is_retryable_error(e):
+                        # Sending them again would fail the same way
+                        self._fail_request(items, e)
+                        return
+                    if last_attempt:
+                        # Kept for the next flush, so no document is lost
+                        self._restore_buffered(items)
+                        raise
+                    logging.warning(
+                        f"Retrying {len(items)} documents after a failed bulk "
+                        f"request: {e}"
+                    )
+        finally:
+            with self._lock:
+                self._sending -= 1
+                self._sent.notify_all()
+
+    def _fail_request(self, items: List, error: Exception) -> None:
+        logging.error(f"Bulk request of {len(items)} documents rejected: {error}")
+        with self._lock:
+            self._failures.extend(
+                {"id": document_id, "status": error.status_code, "error": str(error)}
+                for document_id, _ in items
+            )
+
+    def _send(self, items: List, last_attempt: bool) -> List:
+        """
+        Sends the items in one request and returns the ones to be sent again
+        """
+        response = self._index.bulk(
+            "".join(lines for _, lines in items), refresh=self._refresh
+        )
+        if not response.get("errors"):
+            return []
+
+        retry = []
+        failures = []
+        for item, result in zip(items, response["items"]):
+            result = next(iter(result.values()))
+            status = result.get("status", 500)
+            if status < 300:
+                continue
+            if status in RETRYABLE_STATUSES and not last_attempt:
+                retry.append(item)
+            else:
+                failures.append(
+                    {"id": item[0], "status": status, "error": result.get("error")}
+                )
+        if failures:
+            with self._lock:
+                self._failures.extend(failures)
+        if retry:
+            logging.warning(f"Retrying {len(retry)} documents rejected by the index")
+        return retry
+
+
+def create_bulk_indexer(index: IndexInterface, refresh: bool = False) -> BulkIndexer:
+    return BulkIndexer(
+        index,
+        max_documents=int(os.environ.get("INDEX_BULK_MAX_DOCUMENTS", "500")),
+        max_bytes=int(float(os.environ.get("INDEX_BULK_MAX_MB", "10")) * 1024 * 1024),
+        max_retries=int(os.environ.get("INDEX_BULK_MAX_RETRIES", "3")),
+        refresh=refresh,
+    )
@@ -27,6 +27,19 @@ class IndexInterface(abc.ABC):
         Upload document to the index
         """
 
+    @abc.abstractmethod
+    def bulk(self, body: str, index: str, refresh: bool) -> Dict:
+        """
+        Sends a _bulk request with the given NDJSON body and returns the response,
+        with the result of each item in the order they were sent
+        """
+
+    @abc.abstractmethod
+    def document_exists(self, document_id: str, index: str) -> bool:
+        """
+        Checks if a document with the given id is in the index
+        """
+
     @abc.abstractmethod
     def search(self, query: Dict, index: str) -> Dict:
         """
@@ -40,3 +53,29 @@ class IndexInterface(abc.ABC):
         """
         Searches the index with the provided query, with pagination
         """
+
+
+class AsyncIndexInterface(abc.ABC):
+    """
+    Asynchronous interface to abstract the interaction with the index system
+    """
+
+    @abc.abstractmethod
+    async def index_document(
+        self, document: Dict, document_id: str, index: str, refresh: bool
+    ) -> None:
+        """
+        Upload document to the index
+        """
+
+    @abc.abstractmethod
+    async def document_exists(self, document_id: str, index: str) -> bool:
+        """
+        Checks if a document with the given id is in the index
+        """
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """
+        Release the connections held by the index client
+        """
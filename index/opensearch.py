@@ -7,7 +7,11 @@ from typing import Dict, Iterable, List, Union
 
 import opensearchpy
 
-from monitoring import log_opensearch_error, log_opensearch_operation
+from monitoring import (
+    get_adaptive_limiter,
+    log_opensearch_error,
+    log_opensearch_operation,
+)
 
 from .interfaces import IndexInterface
 
@@ -56,6 +60,21 @@ def retry_with_exponential_backoff(
     return decorator
 
 
+def is_index_overload(error: Exception) -> bool:
+    """
+    Whether the error shows the cluster is overloaded (timeouts, refused
+    connections and rejected requests)
+    """
+    if isinstance(error, opensearchpy.ConnectionError):
+        return True
+    return isinstance(error, opensearchpy.TransportError) and error.status_code in (
+        429,
+        502,
+        503,
+        504,
+    )
+
+
 class OpenSearchInterface(IndexInterface):
     def __init__(
         self,
@@ -64,6 +83,7 @@ class OpenSearchInterface(IndexInterface):
         password: str,
         timeout: int = 60,
         default_index: str = "",
+        document_retries: int = 3,
     ):
         self._search_engine = opensearchpy.OpenSearch(
             hosts=hosts,
@@ -74,6 +94,13 @@ class OpenSearchInterface(IndexInterface):
         )
         self._timeout = timeout
         self._default_index = default_index
+        self._document_retries = document_retries
+        self._limiter = get_adaptive_limiter(
+            "index",
+            maximum=32,
+            target_latency=5.0,
+            is_overload=is_index_overload,
+        )
 
     def index_exists(self, index_name: str) -> bool:
         return self._search_engine.indices.exists(index=index_name)
@@ -106,7 +133,7 @@ class OpenSearchInterface(IndexInterface):
     )
     def refresh_index(self, index_name: str = "") -> None:
         index_name = self.get_index_name(index_name)
-        if self.index_exists(index_name):
+        if not self.index_exists(index_name):
             return
         self._search_engine.indices.refresh(
             index=index_name,
@@ -124,15 +151,16 @@ class OpenSearchInterface(IndexInterface):
         start_time = time.time()
         delay = 1.0
 
-        for attempt in range(4):  # 3 retries + 1 initial attempt
+        for attempt in range(self._document_retries + 1):
             try:
-                self._search_engine.index(
-                    index=index,
-                    body=document,
-                    id=document_id,
-                    refresh=refresh,
-                    request_timeout=self._timeout,
-                )
+                with self._limiter.slot():
+                    self._search_engine.index(
+                        index=index,
+                        body=document,
+                        id=document_id,
+                        refresh=refresh,
+                        request_timeout=self._timeout,
+                    )
                 duration_ms = (time.time() - start_time) * 1000
 
                 # Log operação bem-sucedida
@@ -147,7 +175,7 @@ class OpenSearchInterface(IndexInterface):
                 )
                 return
             except Exception as e:
-                if attempt < 3:  # Still have retries left
+                if attempt < self._document_retries:  # Still have retries left
                     time.sleep(delay)
                     delay *= 2.0
                 else:  # Last attempt failed
@@ -174,14 +202,66 @@ class OpenSearchInterface(IndexInterface):
                     )
                     raise
 
-    def search(self, query: Dict, index: str = "") -> Dict:
+    def bulk(self, body: str, index: str = "", refresh: bool = False) -> Dict:
+        """
+        Sends a _bulk request. Items without "_index" go to the given index (or the
+        default one). Failures of single items are reported in the response, not
+        raised
+        """
         index = self.get_index_name(index)
 
         start_time = time.time()
         try:
-            result = self._search_engine.search(
-                index=index, body=query, request_timeout=60
+            with self._limiter.slot() as slot:
+                response = self._search_engine.bulk(
+                    body=body,
+                    index=index,
+                    refresh=refresh,
+                    request_timeout=self._timeout,
+                )
+                if response.get("errors") and any(
+                    next(iter(item.values())).get("status") == 429
+                    for item in response["items"]
+                ):
+                    slot.mark_overloaded()
+        except Exception as e:
+            duration_ms = (time.time() - start_time) * 1000
+            log_opensearch_error(
+                "bulk",
+                index,
+                type(e).__name__,
+                str(e),
+                duration_ms,
+                document_size=len(body),
+            )
+            raise
+
+        duration_ms = (time.time() - start_time) * 1000
+        log_opensearch_operation(
+            "bulk",
+            index,
+            duration_ms,
+            success=not response.get("errors", False),
+            document_size=len(body),
+        )
+        return response
+
+    def document_exists(self, document_id: str, index: str = "") -> bool:
+        index = self.get_index_name(index)
+        with self._limiter.slot():
+            return self._search_engine.exists(
+                index=index, id=document_id, request_timeout=self._timeout
             )
+
+    def search(self, query: Dict, index: str = "") -> Dict:
+        index = self.get_index_name(index)
+
+        start_time = time.time()
+        try:
+            with self._limiter.slot():
+                result = self._search_engine.search(
+                    index=index, body=query, request_timeout=60
+                )
             duration_ms = (time.time() - start_time) * 1000
 
             # Log operação bem-sucedida
@@ -260,4 +340,5 @@ def create_index_interface() -> IndexInterface:
         get_opensearch_user(),
         get_opensearch_password(),
         default_index=default_index_name,
+        document_retries=int(os.environ.get("INDEX_DOCUMENT_RETRIES", "3")),
     )
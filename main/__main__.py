@@ -1,25 +1,53 @@
 import argparse
+import asyncio
 import gc
 import logging
+import os
 import resource
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from os import environ
 
-from data_extraction import create_apache_tika_text_extraction
+from data_extraction import (
+    create_apache_tika_text_extraction,
+    create_async_apache_tika_text_extraction,
+)
 from database import create_database_interface
-from index import create_index_interface
-from monitoring import get_monitor, setup_structured_logging
-from storage import create_storage_interface
+from index import create_async_index_interface, create_index_interface
+from monitoring import get_memory_governor, get_monitor, setup_structured_logging
+from storage import create_async_storage_interface, create_storage_interface
 from tasks import run_task
+from tasks.utils import (
+    ShutdownTimeout,
+    SpillingChannel,
+    create_checkpoint_journal,
+    request_shutdown,
+    shutdown_cpu_pool,
+    shutdown_requested,
+    stop_on_shutdown,
+)
 
 
 def setup_memory_controls():
     """
     Configure memory limits and garbage collection to prevent memory overflow.
-    Set soft/hard memory limits (1.5 GB soft, 1.9 GB hard for 2GB container)
+
+    The memory governor follows the container cgroup limit, collecting garbage and
+    holding new work only when the process gets close to it. A hard address space
+    limit (RLIMIT_AS) is only set when MEMORY_RLIMIT_AS_MB is defined, since
+    memory mapped by the BERT model and thread stacks counts against it.
     """
-    soft_limit = int(1.5 * 1024 * 1024 * 1024)  # 1.5 GB
-    hard_limit = int(1.9 * 1024 * 1024 * 1024)  # 1.9 GB
-    resource.setrlimit(resource.RLIMIT_AS, (soft_limit, hard_limit))
+    governor = get_memory_governor()
+    logging.info(
+        f"Memory governor limit: {governor.limit_bytes / 1024 / 1024:.0f}MB "
+        f"(collect at {governor.high_watermark:.0%}, "
+        f"throttle at {governor.critical_watermark:.0%})"
+    )
+
+    if "MEMORY_RLIMIT_AS_MB" in environ:
+        limit = int(float(environ["MEMORY_RLIMIT_AS_MB"]) * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
 
     # More aggressive garbage collection
     gc.set_threshold(700, 10, 5)
@@ -38,10 +66,143 @@ def enable_debug_if_necessary():
         logging.debug("Debug enabled")
 
 
+def get_shutdown_grace_period():
+    """
+    Seconds the gazettes in flight have to finish after SIGTERM. Keep it below the
+    pod terminationGracePeriodSeconds, leaving time to flush the buffered writes
+    """
+    return float(environ.get("SHUTDOWN_GRACE_PERIOD", "25"))
+
+
+def handle_termination(signum, frame):
+    """
+    Stops taking new gazettes and arms the grace period timer. The pipeline then
+    finishes the gazettes in flight and flushes what is buffered
+    """
+    if shutdown_requested():
+        return
+    grace_period = get_shutdown_grace_period()
+    logging.warning(
+        f"{signal.Signals(signum).name} recebido: finalizando os diários em "
+        f"andamento em até {grace_period:.0f}s"
+    )
+    request_shutdown()
+    signal.signal(signal.SIGALRM, handle_grace_period_expired)
+    signal.setitimer(signal.ITIMER_REAL, grace_period)
+
+
+def handle_grace_period_expired(signum, frame):
+    raise ShutdownTimeout("Shutdown grace period expired")
+
+
+def install_shutdown_handler():
+    signal.signal(signal.SIGTERM, handle_termination)
+
+
 def get_execution_mode():
     return environ.get("EXECUTION_MODE", "DAILY")
 
 
+def get_extraction_engine():
+    return environ.get("EXTRACTION_ENGINE", "pool").lower()
+
+
+def create_gazette_ids_channel():
+    """
+    Channel handing the ids of the indexed gazettes to the themes as they are
+    indexed. Up to THEMES_CHANNEL_CAPACITY ids are kept in memory, the rest in
+    THEMES_SPILL_DIR (the system temporary directory by default)
+    """
+    return SpillingChannel(
+        int(environ.get("THEMES_CHANNEL_CAPACITY", "100000")),
+        spill_dir=environ.get("THEMES_SPILL_DIR") or None,
+    )
+
+
+def get_themes_batch_size():
+    return int(environ.get("THEMES_BATCH_SIZE", "1000"))
+
+
+def get_themes_batch_delay():
+    return float(environ.get("THEMES_BATCH_DELAY", "60"))
+
+
+def get_daemon_channel():
+    return environ.get("DAEMON_NOTIFY_CHANNEL", "new_gazettes")
+
+
+def use_daemon_notify_trigger():
+    return environ.get("DAEMON_CREATE_TRIGGER", "true").lower() == "true"
+
+
+def get_daemon_batch_size():
+    return int(environ.get("DAEMON_BATCH_SIZE", "50"))
+
+
+def get_daemon_poll_interval():
+    return float(environ.get("DAEMON_POLL_INTERVAL", "60"))
+
+
+def get_daemon_retry_interval():
+    return float(environ.get("DAEMON_RETRY_INTERVAL", "900"))
+
+
+def get_daemon_retry_attempts():
+    return int(environ.get("DAEMON_RETRY_ATTEMPTS", "3"))
+
+
+def get_daemon_lookback_hours():
+    return int(environ.get("DAEMON_LOOKBACK_HOURS", "24"))
+
+
+def use_dead_letters():
+    return environ.get("EXTRACTION_DEAD_LETTERS", "false").lower() == "true"
+
+
+async def extract_text_asynchronously(
+    gazettes, territories, database, journal=None, on_indexed=None
+):
+    """
+    Runs the text extraction on an event loop with the async clients, closing
+    their connections at the end
+    """
+    storage = create_async_storage_interface()
+    index = create_async_index_interface()
+    text_extractor = create_async_apache_tika_text_extraction()
+    try:
+        return await run_task(
+            "extract_text_from_gazettes_async",
+            gazettes,
+            territories,
+            database,
+            storage,
+            index,
+            text_extractor,
+            journal=journal,
+            on_indexed=on_indexed,
+        )
+    finally:
+        await asyncio.gather(storage.close(), index.close(), text_extractor.close())
+
+
+def extract_themes_from_gazettes(themes, gazette_ids_batches, index):
+    """
+    Extracts, reranks and tags the themed excerpts of each batch of gazettes
+    """
+    for gazette_ids in gazette_ids_batches:
+        # The gazettes are indexed without refresh, so the themed queries would
+        # miss the last ones indexed until the next periodic refresh
+        index.refresh_index()
+        for theme in themes:
+            themed_excerpt_ids = run_task(
+                "extract_themed_excerpts_from_gazettes", theme, gazette_ids, index
+            )
+            if not themed_excerpt_ids:
+                continue
+            run_task("embedding_rerank_excerpts", theme, themed_excerpt_ids, index)
+            run_task("tag_entities_in_excerpts", theme, themed_excerpt_ids, index)
+
+
 def gazette_texts_pipeline():
     execution_mode = get_execution_mode()
     database = create_database_interface()
@@ -53,26 +214,241 @@ def gazette_texts_pipeline():
 
     run_task("create_gazettes_index", index)
     territories = run_task("get_territories", database)
-    gazettes_to_be_processed = run_task(
-        "get_gazettes_to_be_processed", execution_mode, database
+    if execution_mode == "CLAIM":
+        run_task("create_gazette_leases_table", database)
+    if use_dead_letters() or execution_mode == "DEAD_LETTERS":
+        run_task("create_gazette_dead_letters_table", database)
+    gazettes_to_be_processed = stop_on_shutdown(
+        run_task("get_gazettes_to_be_processed", execution_mode, database),
+        "gazettes",
     )
+    # Lets a run killed before the end skip the gazettes it already finished
+    journal = create_checkpoint_journal(f"extraction-{execution_mode.lower()}")
+
+    for theme in themes:
+        run_task("create_themed_excerpts_index", theme, index)
+    # The themed excerpts are extracted from batches of the indexed gazettes
+    # while the extraction goes on, so the ids are never all held in memory
+    gazette_ids = create_gazette_ids_channel()
+    themes_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="themes")
+    themes_done = themes_executor.submit(
+        extract_themes_from_gazettes,
+        themes,
+        gazette_ids.batches(get_themes_batch_size(), get_themes_batch_delay()),
+        index,
+    )
+    themes_executor.shutdown(wait=False)
+
+    try:
+        if get_extraction_engine() == "async":
+            asyncio.run(
+                extract_text_asynchronously(
+                    gazettes_to_be_processed,
+                    territories,
+                    database,
+                    journal=journal,
+                    on_indexed=gazette_ids.put_many,
+                )
+            )
+        else:
+            run_task(
+                "extract_text_from_gazettes",
+                gazettes_to_be_processed,
+                territories,
+                database,
+                storage,
+                index,
+                text_extractor,
+                journal=journal,
+                on_indexed=gazette_ids.put_many,
+            )
+    except BaseException:
+        gazette_ids.abort()
+        raise
+
+    if shutdown_requested() and journal is not None:
+        # The next run resumes from the journal and extracts the themed excerpts
+        # of the gazettes finished here
+        gazette_ids.abort()
+        logging.info(
+            "Extração interrompida: excertos temáticos ficam para a próxima execução"
+        )
+        wait_for_interrupted_themes(themes_done)
+        return
+
+    gazette_ids.close()
+    themes_done.result()
+
+    # The themed excerpts of the resumed gazettes were extracted above, so the
+    # next run can start over
+    if journal is not None:
+        journal.finish()
+
+
+def wait_for_interrupted_themes(themes_done):
+    """
+    Waits for the themes batch in flight within the time left of the shutdown
+    grace period. The themes thread is not a daemon, so once the timer is cleared
+    the interpreter exit would wait for it without any bound
+    """
+    remaining, _ = signal.getitimer(signal.ITIMER_REAL)
+    finished, _ = wait([themes_done], timeout=remaining or None)
+    if not finished:
+        raise ShutdownTimeout("Themes still running after the grace period")
+
+
+def wait_for_new_gazettes(database, channel, timeout):
+    """
+    Waits until a new gazette is notified on channel or timeout seconds passed,
+    returning earlier when the shutdown is requested
+    """
+    expires = time.monotonic() + timeout
+    while not shutdown_requested():
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            return False
+        # Short waits, so SIGTERM is noticed within a second
+        if database.wait_for_notification(channel, min(1.0, remaining)):
+            return True
+    return False
+
+
+def daemon_pipeline():
+    """
+    Processa continuamente os diários novos em micro-lotes, à medida que os
+    raspadores os inserem. As conexões com o banco, o Tika e o OpenSearch e o
+    modelo BERT ficam abertos entre os lotes.
+
+    Os diários novos são avisados pelo gatilho de INSERT (LISTEN/NOTIFY) ou,
+    sem ele, encontrados consultando o banco a cada DAEMON_POLL_INTERVAL
+    segundos. Cada consulta pega os diários com id acima do último já visto;
+    os que falharam são reprocessados a cada DAEMON_RETRY_INTERVAL segundos.
+    """
+    if get_extraction_engine() == "async":
+        # The async clients live in a single event loop, closed after each run
+        raise ValueError("O pipeline daemon não suporta EXTRACTION_ENGINE=async.")
+
+    database = create_database_interface()
+    storage = create_storage_interface()
+    index = create_index_interface()
+    text_extractor = create_apache_tika_text_extraction()
+
+    themes = run_task("get_themes")
+    run_task("create_gazettes_index", index)
+    for theme in themes:
+        run_task("create_themed_excerpts_index", theme, index)
+    territories = run_task("get_territories", database)
+    if use_dead_letters():
+        run_task("create_gazette_dead_letters_table", database)
+
+    channel = get_daemon_channel()
+    if use_daemon_notify_trigger():
+        try:
+            run_task("create_gazette_notify_trigger", database, channel)
+        except Exception as e:
+            logging.warning(
+                f"Não foi possível criar o gatilho de notificação, consultando "
+                f"o banco a cada {get_daemon_poll_interval():.0f}s: {e}"
+            )
+
+    def process_batch(gazettes):
+        process_gazettes_batch(
+            gazettes, themes, territories, database, storage, index, text_extractor
+        )
+
+    start_id = run_task(
+        "get_gazette_id_watermark", database, get_daemon_lookback_hours()
+    )
+    follow_new_gazettes(database, start_id, process_batch)
+
+
+def process_gazettes_batch(
+    gazettes, themes, territories, database, storage, index, text_extractor
+):
+    """
+    Extracts the text of a micro-batch of gazettes and then their themed
+    excerpts. The themes refresh the gazettes index first, as the last gazettes
+    of the batch were indexed only milliseconds before
+    """
     indexed_gazette_ids = run_task(
         "extract_text_from_gazettes",
-        gazettes_to_be_processed,
+        gazettes,
         territories,
         database,
         storage,
         index,
         text_extractor,
     )
+    if indexed_gazette_ids:
+        extract_themes_from_gazettes(themes, [indexed_gazette_ids], index)
 
-    for theme in themes:
-        run_task("create_themed_excerpts_index", theme, index)
-        themed_excerpt_ids = run_task(
-            "extract_themed_excerpts_from_gazettes", theme, indexed_gazette_ids, index
+
+def follow_new_gazettes(database, start_id, process_batch):
+    """
+    Processes the gazettes with ids above start_id in batches as they are
+    inserted, until the shutdown is requested. Every DAEMON_RETRY_INTERVAL
+    seconds, the gazettes left unprocessed below the last id seen (those that
+    failed) are processed again, up to DAEMON_RETRY_ATTEMPTS times each
+    """
+    channel = get_daemon_channel()
+    last_id = start_id
+    retried_at = time.monotonic()
+    # Retries of each gazette still unprocessed, by id
+    attempts = {}
+    logging.info(f"Aguardando diários novos (id acima de {last_id}, canal {channel})")
+    while not shutdown_requested():
+        if time.monotonic() - retried_at >= get_daemon_retry_interval():
+            retry_unprocessed_gazettes(
+                database, start_id, last_id, process_batch, attempts
+            )
+            retried_at = time.monotonic()
+
+        gazettes = run_task(
+            "get_new_gazettes", database, last_id, get_daemon_batch_size()
+        )
+        if not gazettes:
+            wait_for_new_gazettes(database, channel, get_daemon_poll_interval())
+            continue
+
+        # Gazettes failing in the batch stay unprocessed and are retried later
+        last_id = gazettes[-1]["id"]
+        logging.info(f"Processando {len(gazettes)} diários novos")
+        process_batch(gazettes)
+
+
+def retry_unprocessed_gazettes(database, after_id, up_to_id, process_batch, attempts):
+    """
+    Processes again the gazettes left unprocessed in the ids range, except the
+    dead letters and the ones already retried DAEMON_RETRY_ATTEMPTS times, such
+    as missing or corrupt files. attempts keeps the retries by id, and only the
+    gazettes still unprocessed are kept in it after a whole pass
+    """
+    max_attempts = get_daemon_retry_attempts()
+    listed = {}
+    while not shutdown_requested():
+        gazettes = run_task(
+            "get_new_gazettes",
+            database,
+            after_id,
+            get_daemon_batch_size(),
+            up_to_id=up_to_id,
+            skip_dead_letters=use_dead_letters(),
         )
-        run_task("embedding_rerank_excerpts", theme, themed_excerpt_ids, index)
-        run_task("tag_entities_in_excerpts", theme, themed_excerpt_ids, index)
+        if not gazettes:
+            attempts.clear()
+            attempts.update(listed)
+            return
+        after_id = gazettes[-1]["id"]
+        retried = []
+        for gazette in gazettes:
+            gazette_attempts = attempts.get(gazette["id"], 0)
+            if gazette_attempts < max_attempts:
+                gazette_attempts += 1
+                retried.append(gazette)
+            listed[gazette["id"]] = gazette_attempts
+        if retried:
+            logging.info(f"Reprocessando {len(retried)} diários que falharam")
+            process_batch(retried)
 
 
 def embedding_rerank_pipeline():
@@ -113,6 +489,8 @@ def execute_pipeline(pipeline):
     logging.info(f"Pipeline: {pipeline or 'gazette_texts'}")
     logging.info(f"Modo de execução: {get_execution_mode()}")
 
+    install_shutdown_handler()
+    timed_out = False
     try:
         if not pipeline or pipeline == "gazette_texts":
             gazette_texts_pipeline()
@@ -120,14 +498,31 @@ def execute_pipeline(pipeline):
             aggregates_pipeline()
         elif pipeline == "embedding_rerank":
             embedding_rerank_pipeline()
+        elif pipeline == "daemon":
+            daemon_pipeline()
         else:
             raise ValueError("Pipeline inválido.")
+    except ShutdownTimeout:
+        # The buffered writes were flushed on the way here
+        logging.error(
+            "Prazo de desligamento esgotado: diários em andamento abandonados"
+        )
+        timed_out = True
     finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        shutdown_cpu_pool()
+
         # Imprime estatísticas de conexão ao finalizar
         monitor = get_monitor()
         monitor.print_summary()
         logging.info("=== Pipeline finalizado ===")
 
+    if timed_out:
+        # Worker threads still busy with abandoned gazettes would hold the exit
+        # until the pod is killed
+        logging.shutdown()
+        os._exit(1)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -2,6 +2,8 @@
 Módulo de monitoramento e logging estruturado para o projeto querido-diario-data-processing
 """
 
+from .limiter import AdaptiveLimiter, NoLimiter, get_adaptive_limiter
+from .memory import MemoryGovernor, get_memory_governor
 from .structured_logging import (
     ConnectionMonitor,
     get_monitor,
@@ -26,4 +28,9 @@ __all__ = [
     "get_monitor",
     "monitor_tika_call",
     "monitor_opensearch_call",
+    "MemoryGovernor",
+    "get_memory_governor",
+    "AdaptiveLimiter",
+    "NoLimiter",
+    "get_adaptive_limiter",
 ]
@@ -0,0 +1,193 @@
+"""
+Controle adaptativo de concorrência (AIMD) para os backends
+
+Cada backend (Apache Tika, armazenamento, OpenSearch) tem um limite de chamadas
+simultâneas. O limite sobe de um em um enquanto o p95 da latência fica dentro do
+alvo e cai pela metade em erros de sobrecarga (timeouts, conexões recusadas,
+HTTP 429/5xx), de modo que a vazão acompanha a capacidade do cluster.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+OverloadCheck = Callable[[Exception], bool]
+
+
+class LimiterSlot:
+    """
+    Vaga ocupada por uma chamada. mark_overloaded() registra uma sobrecarga que
+    não virou exceção (por exemplo, itens de um _bulk rejeitados com 429)
+    """
+
+    __slots__ = ("overloaded",)
+
+    def __init__(self):
+        self.overloaded = False
+
+    def mark_overloaded(self) -> None:
+        self.overloaded = True
+
+
+class AdaptiveLimiter:
+    """
+    Limita as chamadas simultâneas a um backend, ajustando o limite por AIMD.
+
+    - A cada window chamadas bem-sucedidas, o limite sobe um se o p95 da latência
+      ficou até target_latency segundos e as vagas chegaram a ser todas usadas, ou
+      desce um se o p95 passou do alvo.
+    - Uma chamada que falha com erro de sobrecarga (is_overload) multiplica o
+      limite por decrease_factor, no máximo uma vez por janela, para que uma
+      rajada de erros não derrube o limite até o mínimo.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 1,
+        minimum: int = 1,
+        maximum: int = 64,
+        target_latency: float = 5.0,
+        window: int = 20,
+        decrease_factor: float = 0.5,
+        is_overload: Optional[OverloadCheck] = None,
+    ):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self._target_latency = target_latency
+        self._window = max(1, window)
+        self._decrease_factor = decrease_factor
+        self._is_overload = is_overload or (lambda error: True)
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._saturated = False
+        self._samples: List[float] = []
+        self._calls_since_decrease = self._window
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            if self._in_flight >= self.limit:
+                self._saturated = True
+
+    def release(self, latency: float, overloaded: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._calls_since_decrease += 1
+            if overloaded:
+                self._on_overload()
+            else:
+                self._samples.append(latency)
+                if len(self._samples) >= self._window:
+                    self._on_window()
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[LimiterSlot]:
+        """
+        Ocupa uma vaga durante a chamada, registrando sua latência e se ela
+        falhou por sobrecarga
+        """
+        self.acquire()
+        slot = LimiterSlot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except Exception as e:
+            slot.overloaded = slot.overloaded or self._is_overload(e)
+            raise
+        finally:
+            self.release(time.monotonic() - started, slot.overloaded)
+
+    def _on_overload(self) -> None:
+        self._samples.clear()
+        if self._calls_since_decrease < self._window:
+            return
+        self._calls_since_decrease = 0
+        limit = max(self.minimum, math.floor(self.limit * self._decrease_factor))
+        if limit != self.limit:
+            logging.warning(
+                f"{self.name} overloaded, concurrency limit {self.limit} -> {limit}"
+            )
+            self.limit = limit
+
+    def _on_window(self) -> None:
+        samples = sorted(self._samples)
+        self._samples.clear()
+        p95 = samples[math.ceil(len(samples) * 0.95) - 1]
+        if p95 > self._target_latency:
+            limit = max(self.minimum, self.limit - 1)
+        elif self._saturated:
+            limit = min(self.maximum, self.limit + 1)
+        else:
+            limit = self.limit
+        self._saturated = False
+        if limit != self.limit:
+            logging.info(
+                f"{self.name} p95 latency {p95:.2f}s, "
+                f"concurrency limit {self.limit} -> {limit}"
+            )
+            self.limit = limit
+
+
+class NoLimiter:
+    """
+    Usado quando o controle adaptativo está desligado: não limita nada
+    """
+
+    name = "unlimited"
+
+    @contextmanager
+    def slot(self) -> Iterator[LimiterSlot]:
+        yield LimiterSlot()
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def adaptive_concurrency_enabled() -> bool:
+    return os.environ.get("ADAPTIVE_CONCURRENCY", "false").lower() == "true"
+
+
+def get_adaptive_limiter(
+    name: str,
+    maximum: int,
+    target_latency: float,
+    is_overload: Optional[OverloadCheck] = None,
+):
+    """
+    Retorna o limitador global do backend name, configurado por
+    ADAPTIVE_<NAME>_INITIAL, ADAPTIVE_<NAME>_MAX e ADAPTIVE_<NAME>_TARGET_P95
+    (segundos). Com ADAPTIVE_CONCURRENCY desligado retorna um NoLimiter
+    """
+    if not adaptive_concurrency_enabled():
+        return NoLimiter()
+
+    prefix = f"ADAPTIVE_{name.upper()}"
+    with _limiters_lock:
+        if name not in _limiters:
+            maximum = int(os.environ.get(f"{prefix}_MAX", maximum))
+            _limiters[name] = AdaptiveLimiter(
+                name,
+                initial=int(os.environ.get(f"{prefix}_INITIAL", min(4, maximum))),
+                maximum=maximum,
+                target_latency=float(
+                    os.environ.get(f"{prefix}_TARGET_P95", target_latency)
+                ),
+                window=int(os.environ.get("ADAPTIVE_WINDOW", "20")),
+                is_overload=is_overload,
+            )
+        return _limiters[name]
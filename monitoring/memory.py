@@ -0,0 +1,182 @@
+"""
+Controle de memória baseado no limite do container
+
+Lê o limite de memória do cgroup (v2 ou v1), amostra o RSS do processo e só
+executa coletas de lixo ou segura a entrada de novos documentos quando o uso se
+aproxima de marcas configuráveis.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+CGROUP_V2_MEMORY_LIMIT = "/sys/fs/cgroup/memory.max"
+CGROUP_V1_MEMORY_LIMIT = "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+
+# cgroup v1 reporta "sem limite" como um valor próximo de 2^63
+_UNLIMITED_THRESHOLD = 2**60
+
+
+def read_cgroup_memory_limit() -> Optional[int]:
+    """
+    Retorna o limite de memória do container em bytes, ou None quando não há limite
+    """
+    for path in (CGROUP_V2_MEMORY_LIMIT, CGROUP_V1_MEMORY_LIMIT):
+        try:
+            with open(path) as limit_file:
+                value = limit_file.read().strip()
+        except OSError:
+            continue
+        if value == "max":
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            continue
+        return limit if limit < _UNLIMITED_THRESHOLD else None
+    return None
+
+
+def get_physical_memory() -> int:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def get_memory_limit() -> int:
+    """
+    Limite usado pelo controle: MEMORY_LIMIT_MB, o limite do cgroup ou a memória
+    física da máquina, nesta ordem
+    """
+    if "MEMORY_LIMIT_MB" in os.environ:
+        return int(float(os.environ["MEMORY_LIMIT_MB"]) * 1024 * 1024)
+    return read_cgroup_memory_limit() or get_physical_memory()
+
+
+def read_process_rss() -> int:
+    """
+    Retorna o RSS atual do processo em bytes, ou 0 quando não é possível lê-lo
+    (por exemplo, fora do Linux)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemoryGovernor:
+    """
+    Decide quando coletar lixo e quando segurar a entrada de trabalho.
+
+    - Acima de high_watermark (fração do limite) uma coleta completa é feita, no
+      máximo uma vez a cada collect_interval segundos.
+    - Acima de critical_watermark a entrada de novos documentos espera até o uso
+      voltar para baixo da marca.
+    """
+
+    def __init__(
+        self,
+        limit_bytes: int,
+        high_watermark: float = 0.75,
+        critical_watermark: float = 0.9,
+        sample_interval: float = 0.5,
+        collect_interval: float = 5.0,
+    ):
+        self.limit_bytes = limit_bytes
+        self.high_watermark = high_watermark
+        self.critical_watermark = critical_watermark
+        self._sample_interval = sample_interval
+        self._collect_interval = collect_interval
+        self._lock = threading.Lock()
+        self._last_sample_time = 0.0
+        self._last_sample = 0
+        self._last_collect_time = 0.0
+        self.collections = 0
+        self.throttled_seconds = 0.0
+
+    def usage_bytes(self) -> int:
+        """
+        RSS do processo, reamostrado no máximo a cada sample_interval segundos
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sample_time >= self._sample_interval:
+                self._last_sample = read_process_rss()
+                self._last_sample_time = now
+            return self._last_sample
+
+    def usage_ratio(self) -> float:
+        return self.usage_bytes() / self.limit_bytes
+
+    def maybe_collect(self) -> bool:
+        """
+        Faz uma coleta completa apenas se o uso passou da marca alta
+        """
+        if self.usage_ratio() < self.high_watermark:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_collect_time < self._collect_interval:
+                return False
+            self._last_collect_time = now
+
+        gc.collect()
+        self.collections += 1
+        with self._lock:
+            # Força nova amostra após a coleta
+            self._last_sample_time = 0.0
+        return True
+
+    def should_throttle(self) -> bool:
+        return self.usage_ratio() >= self.critical_watermark
+
+    def wait_for_headroom(self, timeout: float = 60.0) -> None:
+        """
+        Bloqueia enquanto o uso estiver acima da marca crítica, até timeout
+        segundos, para que o trabalho em andamento libere memória
+        """
+        if not self.should_throttle():
+            return
+
+        started = time.monotonic()
+        logging.warning(
+            f"Memory usage at {self.usage_ratio():.0%} of "
+            f"{self.limit_bytes / 1024 / 1024:.0f}MB, holding new work"
+        )
+        while self.should_throttle() and time.monotonic() - started < timeout:
+            self.maybe_collect()
+            time.sleep(self._sample_interval)
+        self.throttled_seconds += time.monotonic() - started
+
+    def throttle(self, items: Iterable[T]) -> Iterator[T]:
+        """
+        Repassa os itens, esperando por memória livre antes de cada um
+        """
+        for item in items:
+            self.wait_for_headroom()
+            yield item
+
+
+_global_governor = None
+_global_governor_lock = threading.Lock()
+
+
+def get_memory_governor() -> MemoryGovernor:
+    """Retorna a instância global do controle de memória"""
+    global _global_governor
+    with _global_governor_lock:
+        if _global_governor is None:
+            _global_governor = MemoryGovernor(
+                get_memory_limit(),
+                high_watermark=float(os.environ.get("MEMORY_HIGH_WATERMARK", "0.75")),
+                critical_watermark=float(
+                    os.environ.get("MEMORY_CRITICAL_WATERMARK", "0.9")
+                ),
+            )
+        return _global_governor
@@ -1,12 +1,15 @@
 from dataclasses import dataclass
 from datetime import date, datetime
 
+from tasks.utils import RecordMapping
 
-@dataclass
-class GazetteSegment:
+
+@dataclass(slots=True, eq=False)
+class GazetteSegment(RecordMapping):
     """
     Dataclass to represent a gazette segment of a association
-    related to a city
+    related to a city. It is used like the gazette it comes from
+    (segment["field"], dict(segment)).
     """
 
     id: str
@@ -16,13 +16,13 @@ class ALAssociacaoMunicipiosSegmenter(AssociationSegmenter):
         re.MULTILINE | re.VERBOSE,
     )
 
-    def get_gazette_segments(self, gazette: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def get_gazette_segments(self, gazette: Dict[str, Any]) -> List[GazetteSegment]:
         """
-        Returns a list of dicts with the gazettes metadata
+        Returns a list of GazetteSegment with the gazettes metadata
         """
         territory_to_text_map = self.split_text_by_territory(gazette["source_text"])
         gazette_segments = [
-            self.build_segment(territory_slug, segment_text, gazette).__dict__
+            self.build_segment(territory_slug, segment_text, gazette)
             for territory_slug, segment_text in territory_to_text_map.items()
         ]
         return gazette_segments
@@ -1,7 +1,14 @@
+from .async_digital_ocean_spaces import (
+    AsyncDigitalOceanSpaces,
+    create_async_storage_interface,
+)
 from .digital_ocean_spaces import DigitalOceanSpaces, create_storage_interface
-from .interfaces import StorageInterface
+from .interfaces import AsyncStorageInterface, StorageInterface
 
 __all__ = [
+    "AsyncDigitalOceanSpaces",
+    "AsyncStorageInterface",
+    "create_async_storage_interface",
     "create_storage_interface",
     "DigitalOceanSpaces",
     "StorageInterface",
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Union
+from urllib.parse import quote
+
+import aiohttp
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from botocore.exceptions import ClientError
+
+from .digital_ocean_spaces import (
+    get_storage_access_key,
+    get_storage_access_secret,
+    get_storage_bucket,
+    get_storage_endpoint,
+    get_storage_region,
+)
+from .interfaces import AsyncStorageInterface
+
+USER_METADATA_PREFIX = "x-amz-meta-"
+
+# Bytes of the object body gathered before each write to the destination, which
+# runs in a thread so the disk does not block the event loop
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def create_async_storage_interface() -> AsyncStorageInterface:
+    """
+    Build an object to interact with the object storage from an event loop
+    """
+    return AsyncDigitalOceanSpaces(
+        get_storage_region(),
+        get_storage_endpoint(),
+        get_storage_access_key(),
+        get_storage_access_secret(),
+        get_storage_bucket(),
+        connection_pool_size=int(os.environ.get("STORAGE_CONNECTION_POOL_SIZE", "100")),
+    )
+
+
+class AsyncDigitalOceanSpaces(AsyncStorageInterface):
+    """
+    Cliente assíncrono para armazenamento de objetos S3-compatível.
+
+    As requisições são assinadas com o SigV4 do botocore e enviadas pelo aiohttp,
+    usando path-style (endpoint/bucket/key), compatível com Digital Ocean Spaces,
+    AWS S3 e Minio.
+    """
+
+    def __init__(
+        self,
+        region: str,
+        endpoint: str,
+        access_key: str,
+        access_secret: str,
+        bucket: str,
+        connection_pool_size: int = 100,
+        chunk_size: int = 64 * 1024,
+    ):
+        self._region = region
+        self._endpoint = (endpoint or f"https://s3.{region}.amazonaws.com").rstrip("/")
+        self._bucket = bucket
+        self._auth = S3SigV4Auth(Credentials(access_key, access_secret), "s3", region)
+        self._connection_pool_size = connection_pool_size
+        self._chunk_size = chunk_size
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        The session is created on first use so it is bound to the running loop
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._connection_pool_size)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _object_url(self, file_key: Union[str, Path]) -> str:
+        return f"{self._endpoint}/{self._bucket}/{quote(str(file_key), safe='/~')}"
+
+    def _signed_headers(
+        self, method: str, url: str, body: bytes = b"", headers: Dict = None
+    ) -> Dict[str, str]:
+        request = AWSRequest(method=method, url=url, data=body, headers=headers or {})
+        self._auth.add_auth(request)
+        return dict(request.headers.items())
+
+    async def _raise_for_status(
+        self, response: aiohttp.ClientResponse, operation: str
+    ) -> None:
+        """
+        Raises the same ClientError boto3 would, so callers handle both clients
+        the same way
+        """
+        if response.status < 300:
+            return
+        body = await response.text(errors="replace")
+        code = str(response.status)
+        message = response.reason or ""
+        if response.status != 404 and body:
+            try:
+                error = ET.fromstring(body)
+                code = error.findtext("Code", code)
+                message = error.findtext("Message", message)
+            except ET.ParseError:
+                pass
+        raise ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+    async def get_file(
+        self, file_to_be_downloaded: Union[str, Path], destination
+    ) -> None:
+        """
+        Stream the object into the destination file object chunk by chunk
+        """
+        logging.debug(f"Getting {file_to_be_downloaded} (async streaming)")
+        url = self._object_url(file_to_be_downloaded)
+        headers = self._signed_headers("GET", url)
+        async with self._get_session().get(url, headers=headers) as response:
+            await self._raise_for_status(response, "GetObject")
+            if hasattr(destination, "content_type_hint"):
+                # Lets a probing destination use the stored Content-Type as a hint
+                destination.content_type_hint = response.headers.get("Content-Type")
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(self._chunk_size):
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(destination.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(destination.write, bytes(buffer))
+
+    async def get_file_metadata(self, file_key: Union[str, Path]) -> Union[Dict, None]:
+        """
+        Read the object metadata with a HEAD request, without transferring the body.
+        Returns None when the object does not exist
+        """
+        logging.debug(f"Getting metadata of {file_key}")
+        url = self._object_url(file_key)
+        headers = self._signed_headers("HEAD", url)
+        async with self._get_session().head(url, headers=headers) as response:
+            if response.status == 404:
+                return None
+            await self._raise_for_status(response, "HeadObject")
+            return {
+                "size": int(response.headers.get("Content-Length", 0)),
+                "etag": response.headers.get("ETag", "").strip('"'),
+                "content_type": response.headers.get("Content-Type", ""),
+                "metadata": {
+                    name[len(USER_METADATA_PREFIX) :]: value
+                    for name, value in response.headers.items()
+                    if name.lower().startswith(USER_METADATA_PREFIX)
+                },
+            }
+
+    async def get_content(self, file_key: Union[str, Path]) -> str:
+        """
+        Read a text object from the storage
+        """
+        logging.debug(f"Reading {file_key}")
+        url = self._object_url(file_key)
+        headers = self._signed_headers("GET", url)
+        async with self._get_session().get(url, headers=headers) as response:
+            await self._raise_for_status(response, "GetObject")
+            return await response.text(encoding="UTF-8")
+
+    async def upload_content(
+        self,
+        file_key: str,
+        content_to_be_uploaded: Union[str, bytes],
+        permission: str = "public-read",
+        metadata: Union[Dict[str, str], None] = None,
+    ) -> None:
+        logging.debug(f"Uploading {file_key}")
+        if isinstance(content_to_be_uploaded, str):
+            content_to_be_uploaded = content_to_be_uploaded.encode()
+        url = self._object_url(file_key)
+        user_metadata = {
+            f"{USER_METADATA_PREFIX}{name}": value
+            for name, value in (metadata or {}).items()
+        }
+        headers = self._signed_headers(
+            "PUT", url, content_to_be_uploaded, user_metadata
+        )
+        async with self._get_session().put(
+            url, data=content_to_be_uploaded, headers=headers
+        ) as response:
+            await self._raise_for_status(response, "PutObject")
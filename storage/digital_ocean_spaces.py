@@ -2,12 +2,29 @@ import logging
 import os
 from io import BytesIO
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Dict, Tuple, Union
 
 import boto3
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+
+from monitoring import get_adaptive_limiter
 
 from .interfaces import StorageInterface
 
+# Error codes with which the storage asks clients to slow down
+OVERLOAD_ERROR_CODES = (
+    "SlowDown",
+    "ServiceUnavailable",
+    "InternalError",
+    "RequestTimeout",
+    "429",
+    "500",
+    "502",
+    "503",
+    "504",
+)
+
 
 def get_storage_region():
     return os.environ["STORAGE_REGION"]
@@ -29,6 +46,16 @@ def get_storage_bucket():
     return os.environ["STORAGE_BUCKET"]
 
 
+def is_storage_overload(error: Exception) -> bool:
+    """
+    Whether the error shows the storage is overloaded, rather than a missing or
+    forbidden object
+    """
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code", "") in OVERLOAD_ERROR_CODES
+    return isinstance(error, (HTTPClientError, BotocoreConnectionError))
+
+
 def create_storage_interface() -> StorageInterface:
     """
     Build an object to interact with the object storage
@@ -77,38 +104,96 @@ class DigitalOceanSpaces(StorageInterface):
             client_config["endpoint_url"] = self._endpoint
 
         self._client = self._session.client(**client_config)
+        self._limiter = get_adaptive_limiter(
+            "storage",
+            maximum=64,
+            target_latency=10.0,
+            is_overload=is_storage_overload,
+        )
 
     def get_file(self, file_to_be_downloaded: Union[str, Path], destination) -> None:
         """
         Download file using streaming to prevent loading entire file in memory (OOM prevention)
         """
         logging.debug(f"Getting {file_to_be_downloaded} (streaming)")
-        self._client.download_fileobj(
-            self._bucket, str(file_to_be_downloaded), destination
-        )
+        with self._limiter.slot():
+            self._client.download_fileobj(
+                self._bucket, str(file_to_be_downloaded), destination
+            )
+
+    def get_file_metadata(self, file_key: Union[str, Path]) -> Union[Dict, None]:
+        """
+        Read the object metadata with a HEAD request, without transferring the body.
+        Returns None when the object does not exist
+        """
+        logging.debug(f"Getting metadata of {file_key}")
+        try:
+            with self._limiter.slot():
+                response = self._client.head_object(
+                    Bucket=self._bucket, Key=str(file_key)
+                )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") in ("404", "NoSuchKey"):
+                return None
+            raise
+        return self._read_metadata(response)
+
+    def _read_metadata(self, response: Dict) -> Dict:
+        return {
+            "size": response["ContentLength"],
+            "etag": response.get("ETag", "").strip('"'),
+            "content_type": response.get("ContentType", ""),
+            "metadata": response.get("Metadata", {}),
+        }
+
+    def get_file_stream(self, file_key: Union[str, Path]) -> Tuple[BinaryIO, Dict]:
+        """
+        Open the object body for reading, so it can be consumed without being
+        written to disk. The body must be closed to release the connection
+        """
+        logging.debug(f"Opening {file_key} (streaming)")
+        with self._limiter.slot():
+            response = self._client.get_object(Bucket=self._bucket, Key=str(file_key))
+        return response["Body"], self._read_metadata(response)
+
+    def get_content(self, file_key: Union[str, Path]) -> str:
+        """
+        Read a text object from the storage
+        """
+        logging.debug(f"Reading {file_key}")
+        with self._limiter.slot():
+            response = self._client.get_object(Bucket=self._bucket, Key=str(file_key))
+            with response["Body"] as body:
+                return body.read().decode()
 
     def upload_content(
         self,
         file_key: str,
         content_to_be_uploaded: Union[str, BytesIO],
         permission: str = "public-read",
+        metadata: Union[Dict[str, str], None] = None,
     ) -> None:
         """
         Upload content using streaming to prevent loading entire content in memory (OOM prevention)
         """
         logging.debug(f"Uploading {file_key}")
-
-        if isinstance(content_to_be_uploaded, str):
-            f = BytesIO(content_to_be_uploaded.encode())
-            self._client.upload_fileobj(f, self._bucket, file_key)
-            # Explicit cleanup
-            f.close()
-        else:
-            self._client.upload_fileobj(
-                content_to_be_uploaded,
-                self._bucket,
-                file_key,
-            )
+        extra_args = {"Metadata": metadata} if metadata else None
+
+        with self._limiter.slot():
+            if isinstance(content_to_be_uploaded, str):
+                f = BytesIO(content_to_be_uploaded.encode())
+                self._client.upload_fileobj(
+                    f, self._bucket, file_key, ExtraArgs=extra_args
+                )
+                # Explicit cleanup
+                f.close()
+            else:
+                self._client.upload_fileobj(
+                    content_to_be_uploaded,
+                    self._bucket,
+                    file_key,
+                    ExtraArgs=extra_args,
+                )
 
     def upload_file(
         self,
@@ -117,7 +202,8 @@ class DigitalOceanSpaces(StorageInterface):
         permission: str = "public-read",
     ) -> None:
         logging.debug(f"Uploading {file_key}")
-        self._client.upload_file(file_path, self._bucket, file_key)
+        with self._limiter.slot():
+            self._client.upload_file(file_path, self._bucket, file_key)
 
     def upload_file_multipart(
         self,
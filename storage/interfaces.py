@@ -1,7 +1,7 @@
 import abc
 from io import BytesIO
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Dict, Tuple, Union
 
 
 class StorageInterface(abc.ABC):
@@ -15,9 +15,33 @@ class StorageInterface(abc.ABC):
         Download the given file key in the destination on the host
         """
 
+    @abc.abstractmethod
+    def get_file_stream(self, file_key: Union[str, Path]) -> Tuple[BinaryIO, Dict]:
+        """
+        Open the given file key for reading without writing it to disk. Returns a
+        readable stream, which the caller must close, and the same metadata as
+        get_file_metadata
+        """
+
+    @abc.abstractmethod
+    def get_file_metadata(self, file_key: Union[str, Path]) -> Union[Dict, None]:
+        """
+        Get size, etag, content type and user metadata of the given file key, or
+        None when it does not exist
+        """
+
+    @abc.abstractmethod
+    def get_content(self, file_key: Union[str, Path]) -> str:
+        """
+        Read the given text file key from the host
+        """
+
     @abc.abstractmethod
     def upload_content(
-        self, file_key: str, content_to_be_uploaded: Union[str, BytesIO]
+        self,
+        file_key: str,
+        content_to_be_uploaded: Union[str, BytesIO],
+        metadata: Union[Dict[str, str], None] = None,
     ) -> None:
         """
         Upload the given content to the destination on the host
@@ -34,3 +58,47 @@ class StorageInterface(abc.ABC):
         """
         Delete a file on the host.
         """
+
+
+class AsyncStorageInterface(abc.ABC):
+    """
+    Asynchronous interface to abstract the interaction with the object store system.
+    """
+
+    @abc.abstractmethod
+    async def get_file(
+        self, file_to_be_downloaded: Union[str, Path], destination
+    ) -> None:
+        """
+        Download the given file key in the destination on the host
+        """
+
+    @abc.abstractmethod
+    async def get_file_metadata(self, file_key: Union[str, Path]) -> Union[Dict, None]:
+        """
+        Get size, etag, content type and user metadata of the given file key, or
+        None when it does not exist
+        """
+
+    @abc.abstractmethod
+    async def get_content(self, file_key: Union[str, Path]) -> str:
+        """
+        Read the given text file key from the host
+        """
+
+    @abc.abstractmethod
+    async def upload_content(
+        self,
+        file_key: str,
+        content_to_be_uploaded: Union[str, bytes],
+        metadata: Union[Dict[str, str], None] = None,
+    ) -> None:
+        """
+        Upload the given content to the destination on the host
+        """
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """
+        Release the connections held by the storage client
+        """
@@ -4,11 +4,17 @@ AVAILABLE_TASKS = {
     "create_aggregates": "tasks.gazette_txt_to_xml",
     "create_gazettes_index": "tasks.create_index",
     "create_aggregates_table": "tasks.create_aggregates_table",
+    "create_gazette_dead_letters_table": "tasks.create_gazette_dead_letters_table",
+    "create_gazette_leases_table": "tasks.create_gazette_leases_table",
+    "create_gazette_notify_trigger": "tasks.create_gazette_notify_trigger",
     "create_themed_excerpts_index": "tasks.create_index",
     "embedding_rerank_excerpts": "tasks.gazette_excerpts_embedding_reranking",
     "extract_text_from_gazettes": "tasks.gazette_text_extraction",
+    "extract_text_from_gazettes_async": "tasks.gazette_text_extraction_async",
     "extract_themed_excerpts_from_gazettes": "tasks.gazette_themed_excerpts_extraction",
+    "get_gazette_id_watermark": "tasks.list_gazettes_to_be_processed",
     "get_gazettes_to_be_processed": "tasks.list_gazettes_to_be_processed",
+    "get_new_gazettes": "tasks.list_gazettes_to_be_processed",
     "get_themed_excerpt_ids_without_embedding": "tasks.list_themed_excerpts",
     "get_themes": "tasks.gazette_themes_listing",
     "get_territories": "tasks.list_territories",
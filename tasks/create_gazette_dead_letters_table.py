@@ -0,0 +1,22 @@
+"""
+Tarefa para criar a tabela de diários que falharam de vez (dead letters)
+
+Diários que continuam falhando depois de todas as novas tentativas da extração
+são registrados nessa tabela com o último erro, para serem reprocessados depois
+com o modo de execução DEAD_LETTERS, sem uma execução completa.
+"""
+
+from database import DatabaseInterface
+
+
+def create_gazette_dead_letters_table(database: DatabaseInterface):
+    database._commit_changes(
+        """
+        CREATE TABLE IF NOT EXISTS gazette_dead_letters (
+            gazette_id BIGINT PRIMARY KEY,
+            file_checksum VARCHAR(255) NOT NULL,
+            attempts INTEGER NOT NULL,
+            error TEXT NOT NULL,
+            failed_at TIMESTAMP WITH TIME ZONE NOT NULL
+        ); """
+    )
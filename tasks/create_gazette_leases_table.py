@@ -0,0 +1,31 @@
+"""
+Tarefa para criar a tabela de concessões (leases) de diários no banco relacional
+
+No modo de execução CLAIM, cada worker registra nessa tabela os diários que
+reivindicou e até quando, para que vários workers processem a mesma fila sem
+repetir trabalho. A concessão de um worker que morreu expira e o diário volta a
+ficar disponível.
+"""
+
+from database import DatabaseInterface
+
+
+def create_gazette_leases_table(database: DatabaseInterface):
+    database._commit_changes(
+        """
+        CREATE TABLE IF NOT EXISTS gazette_leases (
+            gazette_id BIGINT PRIMARY KEY,
+            worker_id VARCHAR(255) NOT NULL,
+            leased_until TIMESTAMP WITH TIME ZONE NOT NULL
+        ); """
+    )
+    # Leases of gazettes already processed will never be claimed again
+    database._commit_changes(
+        """
+        DELETE FROM gazette_leases
+        USING gazettes
+        WHERE
+            gazettes.id = gazette_leases.gazette_id
+            AND gazettes.processed is True
+        ; """
+    )
@@ -0,0 +1,32 @@
+"""
+Tarefa para criar o gatilho que avisa quando novos diários são inseridos
+
+No pipeline daemon, o processamento escuta (LISTEN) o canal de notificação e
+processa os diários novos assim que os raspadores os inserem, em vez de esperar
+a próxima execução agendada. Sem o gatilho, o daemon consulta o banco
+periodicamente.
+"""
+
+from database import DatabaseInterface
+
+
+def create_gazette_notify_trigger(database: DatabaseInterface, channel: str):
+    database._commit_changes(
+        """
+        CREATE OR REPLACE FUNCTION notify_new_gazettes() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify(%(channel)s, '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql; """,
+        {"channel": channel},
+    )
+    # One notification per INSERT statement, however many rows it inserts
+    database._commit_changes(
+        """
+        DROP TRIGGER IF EXISTS gazettes_notify_insert ON gazettes;
+        CREATE TRIGGER gazettes_notify_insert
+            AFTER INSERT ON gazettes
+            FOR EACH STATEMENT EXECUTE PROCEDURE notify_new_gazettes();
+        """
+    )
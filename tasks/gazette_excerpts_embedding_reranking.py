@@ -11,7 +11,7 @@ from typing import Dict, List
 
 import sentence_transformers
 
-from index import IndexInterface
+from index import IndexInterface, create_bulk_indexer
 
 from .utils import get_documents_with_ids
 
@@ -40,18 +40,18 @@ def embedding_rerank_excerpts(
         excerpt["_source"]
         for excerpt in get_documents_with_ids(excerpt_ids, index, theme["index"])
     )
-    for excerpt in excerpts:
-        excerpt_vector = model.encode(excerpt["excerpt"], convert_to_tensor=True)
-        excerpt_max_score = sentence_transformers.util.semantic_search(
-            excerpt_vector, queries_vectors, top_k=1
-        )
-        excerpt["excerpt_embedding_score"] = excerpt_max_score[0][0]["score"]
-        index.index_document(
-            excerpt,
-            document_id=excerpt["excerpt_id"],
-            index=theme["index"],
-            refresh=True,
-        )
+    with create_bulk_indexer(index, refresh=True) as bulk_indexer:
+        for excerpt in excerpts:
+            excerpt_vector = model.encode(excerpt["excerpt"], convert_to_tensor=True)
+            excerpt_max_score = sentence_transformers.util.semantic_search(
+                excerpt_vector, queries_vectors, top_k=1
+            )
+            excerpt["excerpt_embedding_score"] = excerpt_max_score[0][0]["score"]
+            bulk_indexer.add(
+                excerpt,
+                document_id=excerpt["excerpt_id"],
+                index=theme["index"],
+            )
 
 
 def get_natural_language_queries(theme: Dict) -> List[str]:
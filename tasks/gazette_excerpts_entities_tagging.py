@@ -8,7 +8,7 @@ permitindo seu destaque em aplicações que consumam os resultados temáticos.
 import re
 from typing import Dict, List
 
-from index import IndexInterface
+from index import IndexInterface, create_bulk_indexer
 
 from .utils import (
     get_documents_from_query_with_highlights,
@@ -30,23 +30,25 @@ def tag_theme_cases(theme: Dict, excerpt_ids: List[str], index: IndexInterface)
         documents = get_documents_from_query_with_highlights(
             es_query, index, theme["index"]
         )
-        for document in documents:
-            excerpt = document["_source"]
-            highlight = document["highlight"]["excerpt.with_stopwords"][0]
-            excerpt.update(
-                {
-                    "excerpt_entities": list(
-                        set(excerpt.get("excerpt_entities", [])) | {case["title"]}
-                    ),
-                    "excerpt": highlight,
-                }
-            )
-            index.index_document(
-                excerpt,
-                document_id=excerpt["excerpt_id"],
-                index=theme["index"],
-                refresh=True,
-            )
+        # Each case reads the excerpts tagged by the previous one, so the case
+        # is flushed before the next query
+        with create_bulk_indexer(index, refresh=True) as bulk_indexer:
+            for document in documents:
+                excerpt = document["_source"]
+                highlight = document["highlight"]["excerpt.with_stopwords"][0]
+                excerpt.update(
+                    {
+                        "excerpt_entities": list(
+                            set(excerpt.get("excerpt_entities", [])) | {case["title"]}
+                        ),
+                        "excerpt": highlight,
+                    }
+                )
+                bulk_indexer.add(
+                    excerpt,
+                    document_id=excerpt["excerpt_id"],
+                    index=theme["index"],
+                )
 
 
 def get_es_query_from_entity_case(
@@ -90,22 +92,22 @@ def tag_cnpjs(theme: Dict, excerpt_ids: List[str], index: IndexInterface) -> Non
         """,
         re.VERBOSE,
     )
-    for excerpt in excerpts:
-        found_cnpjs = re.findall(cnpj_regex, excerpt["excerpt"])
-        if not found_cnpjs:
-            continue
+    with create_bulk_indexer(index, refresh=True) as bulk_indexer:
+        for excerpt in excerpts:
+            found_cnpjs = re.findall(cnpj_regex, excerpt["excerpt"])
+            if not found_cnpjs:
+                continue
 
-        for _, cnpj, _ in set(found_cnpjs):
-            excerpt["excerpt"] = excerpt["excerpt"].replace(
-                cnpj, f"<entidadecnpj>{cnpj}</entidadecnpj>"
-            )
+            for _, cnpj, _ in set(found_cnpjs):
+                excerpt["excerpt"] = excerpt["excerpt"].replace(
+                    cnpj, f"<entidadecnpj>{cnpj}</entidadecnpj>"
+                )
 
-        excerpt["excerpt_entities"] = list(
-            set(excerpt.get("excerpt_entities", [])) | {"CNPJ"}
-        )
-        index.index_document(
-            excerpt,
-            document_id=excerpt["excerpt_id"],
-            index=theme["index"],
-            refresh=True,
-        )
+            excerpt["excerpt_entities"] = list(
+                set(excerpt.get("excerpt_entities", [])) | {"CNPJ"}
+            )
+            bulk_indexer.add(
+                excerpt,
+                document_id=excerpt["excerpt_id"],
+                index=theme["index"],
+            )
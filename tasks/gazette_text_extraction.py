@@ -4,25 +4,91 @@ Tarefa para extrair o conteúdo textual dos diários
 Extrai o conteúdo dos diários, realiza segmentações (se necessário) e os indexa.
 """
 
-import gc
 import logging
 import os
 import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Union
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
 
 from botocore.exceptions import ClientError
 
-from data_extraction import TextExtractorInterface, UnsupportedFileTypeError
+from data_extraction import (
+    PROBE_HEADER_SIZE,
+    FileProbe,
+    ProbingWriter,
+    TextExtractorInterface,
+    UnsupportedFileTypeError,
+    get_type_hint,
+    identify_header,
+)
 from database import DatabaseInterface
-from index import IndexInterface
+from index import IndexInterface, create_bulk_indexer
+from monitoring import get_memory_governor
 from segmentation import get_segmenter
 from storage import StorageInterface
 
+from .utils import (
+    BatchWriter,
+    CheckpointJournal,
+    CostTracker,
+    Deadline,
+    DeadlineExceeded,
+    Lane,
+    RetryScheduler,
+    Stage,
+    bounded_map,
+    check_deadline,
+    get_shutdown_event,
+    pause_shutdown_timeout,
+    prefetch,
+    prefetch_map,
+    run_cpu_bound,
+    run_lanes,
+    run_stages,
+    run_with_deadline,
+    shutdown_requested,
+    stop_on_shutdown,
+)
+
 # Memory management configuration
 MAX_FILE_SIZE_MB = int(os.environ.get("MAX_GAZETTE_FILE_SIZE_MB", 500))
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
+# User metadata of the stored .txt recording the checksum of the source file
+TXT_CHECKSUM_METADATA = "file-checksum"
+EXISTING_INDEXED = "indexed"
+EXISTING_TEXT = "text"
+
+# Called with a gazette and the error with which it failed
+FailureHandler = Callable[[Dict, Exception], None]
+
+
+class GazetteFileTooLargeError(Exception):
+    """Raised when a gazette file is over MAX_GAZETTE_FILE_SIZE_MB"""
+
+
+# Content types with which ZIP archives are stored
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+# Size of the reads from the storage body in streaming mode
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Metadata read by the lanes engine for a gazette file missing in the storage
+_FILE_NOT_FOUND = object()
+
+# Keys of the gazettes that went past their deadline, processed again as slow.
+# Forgotten once processed and at the end of each extraction
+_slow_gazettes = set()
+_slow_gazettes_lock = threading.Lock()
+
+# Threads running gazettes with a deadline, the abandoned ones included
+_deadline_threads = None
+_deadline_threads_lock = threading.Lock()
+
 
 def extract_text_from_gazettes(
     gazettes: Iterable[Dict[str, Any]],
@@ -31,56 +97,945 @@ def extract_text_from_gazettes(
     storage: StorageInterface,
     index: IndexInterface,
     text_extractor: TextExtractorInterface,
+    journal: Union[CheckpointJournal, None] = None,
+    on_indexed: Union[Callable[[List[str]], None], None] = None,
 ) -> List[str]:
     """
     Extracts the text from a list of gazettes
     Includes memory management and proper error handling to prevent OOM
+
+    When a checkpoint journal is given, gazettes it records as finished are
+    skipped (their document ids are still returned) and every gazette finished
+    by this run is recorded in it.
+
+    When on_indexed is given, it is called with the document ids of each gazette
+    as soon as it is indexed (and with the ids of the skipped gazettes first),
+    instead of collecting all of them in the list returned.
+
+    EXTRACTION_ENGINE selects how gazettes are scheduled:
+    - "pool" (default): EXTRACTION_CONCURRENCY gazettes are processed at the same
+      time, each one going through all the steps in a single worker thread.
+    - "staged": download, extraction, upload and indexing run as separate stages
+      connected by bounded queues, each stage with its own concurrency.
+    - "lanes": small and large gazettes are processed by separate workers, each
+      lane with its own concurrency and Tika timeout.
+
+    Once the shutdown is requested (see main), no new gazette is taken: the
+    gazettes in flight finish and the buffered writes are flushed.
     """
-    logging.info("Starting text extraction from gazettes")
+    gazettes = prefetch_gazettes_listing(gazettes)
 
     ids = []
+    if journal is not None:
+        gazettes, ids = skip_completed_gazettes(gazettes, journal)
+    if on_indexed is not None:
+        if ids:
+            on_indexed(ids)
+        ids = []
+
+    engine = get_extraction_engine_function(get_extraction_engine())
+    # New gazettes are only taken while memory use is below the critical watermark
+    memory_governor = get_memory_governor()
+
+    retries = create_retry_scheduler(database)
+
+    def schedule_retry(gazette: Dict, error: Exception) -> None:
+        retries.failed(copy_gazette_for_retry(gazette), error)
+
+    on_failure = schedule_retry if retries is not None else None
+
+    def run_engine(items: Iterable[Dict[str, Any]]):
+        return engine(
+            stop_on_shutdown(memory_governor.throttle(items), "gazettes"),
+            territories,
+            database,
+            storage,
+            index,
+            text_extractor,
+            on_failure=on_failure,
+        )
+
+    if retries is None:
+        results = run_engine(gazettes)
+    else:
+        results = retry_failed_gazettes(gazettes, retries, run_engine)
+
+    # Gazettes that failed before and now succeeded leave the dead-letter table
+    recovered = get_recovered_gazettes_writer(database)
+    record_in_journal = (
+        create_journal_recorder(journal, database) if journal is not None else None
+    )
     processed_count = 0
 
-    for gazette in gazettes:
-        try:
-            document_ids = try_process_gazette_file(
-                gazette, territories, database, storage, index, text_extractor
-            )
-            ids.extend(document_ids)
+    try:
+        for gazette_key, document_ids in results:
+            if document_ids is None:
+                continue
+
+            if retries is not None:
+                retries.succeeded(gazette_key)
+            forget_slow_gazettes(gazette_key)
+            if record_in_journal is not None:
+                record_in_journal(gazette_key, document_ids)
+            if recovered is not None:
+                recovered.add(gazette_key[0])
+            if on_indexed is not None:
+                on_indexed(document_ids)
+            else:
+                ids.extend(document_ids)
             processed_count += 1
 
+            # Collect garbage only when memory use nears the container limit
+            memory_governor.maybe_collect()
+
             # Log progress periodically
             if processed_count % 10 == 0:
                 logging.info(f"Processed {processed_count} gazettes")
+    finally:
+        # The grace period must not run out half way through the flush
+        with pause_shutdown_timeout():
+            close_processed_writer(database)
+            if recovered is not None:
+                recovered.close()
+            if journal is not None:
+                journal.close()
+        # The gazettes still marked failed for good or were left for the next run
+        forget_slow_gazettes()
+
+    logging.info(f"Completed text extraction. Total processed: {processed_count}")
+    return ids
+
+
+def get_gazette_key(gazette: Dict) -> Tuple[Any, str]:
+    return gazette["id"], gazette["file_checksum"]
+
+
+def skip_completed_gazettes(
+    gazettes: Iterable[Dict[str, Any]], journal: CheckpointJournal
+) -> Tuple[Iterable[Dict[str, Any]], List[str]]:
+    """
+    Filters out the gazettes recorded in the journal by an interrupted run and
+    returns the ids of the documents they indexed
+    """
+    completed = journal.load()
+    if completed:
+        logging.info(
+            f"Resuming from {journal.path}: skipping {len(completed)} gazettes "
+            "finished by a previous run"
+        )
+    ids = [
+        document_id
+        for document_ids in completed.values()
+        for document_id in document_ids
+    ]
+    pending = (
+        gazette for gazette in gazettes if get_gazette_key(gazette) not in completed
+    )
+    return pending, ids
+
+
+def get_extraction_engine() -> str:
+    return os.environ.get("EXTRACTION_ENGINE", "pool").lower()
+
+
+def get_extraction_engine_function(engine: str) -> Callable:
+    if engine == "staged":
+        return extract_text_in_stages
+    if engine == "lanes":
+        return extract_text_in_lanes
+    if engine == "pool":
+        return extract_text_in_pool
+    raise ValueError(f'Extraction engine "{engine}" is invalid.')
+
+
+def get_retry_attempts() -> int:
+    """
+    Times a failed gazette is scheduled to run again. 0 (default) disables the
+    retry scheduler
+    """
+    return max(0, int(os.environ.get("EXTRACTION_RETRY_ATTEMPTS", "0")))
+
+
+def get_retry_delay() -> float:
+    """
+    Seconds before the first retry of a failed gazette, doubled on each retry
+    """
+    return float(os.environ.get("EXTRACTION_RETRY_DELAY", "30"))
+
+
+def get_retry_max_delay() -> float:
+    return float(os.environ.get("EXTRACTION_RETRY_MAX_DELAY", "600"))
+
+
+def get_gazette_deadline() -> float:
+    """
+    Seconds a gazette may take through all the steps before it is abandoned and
+    its worker freed. 0 (default) disables the deadline
+    """
+    return float(os.environ.get("EXTRACTION_GAZETTE_DEADLINE", "0"))
+
+
+def get_slow_gazette_deadline() -> float:
+    """
+    Deadline of the gazettes that already went past EXTRACTION_GAZETTE_DEADLINE.
+    0 (default) lets them take as long as needed
+    """
+    return float(os.environ.get("EXTRACTION_SLOW_GAZETTE_DEADLINE", "0"))
+
+
+def get_max_deadline_threads() -> int:
+    """
+    Threads running gazettes with a deadline at once, counting the abandoned ones
+    still running. Once reached, gazettes wait for an abandoned one to stop
+    """
+    return max(1, int(os.environ.get("EXTRACTION_DEADLINE_THREADS", "32")))
+
+
+def get_deadline_threads() -> threading.BoundedSemaphore:
+    global _deadline_threads
+    with _deadline_threads_lock:
+        if _deadline_threads is None:
+            _deadline_threads = threading.BoundedSemaphore(get_max_deadline_threads())
+        return _deadline_threads
+
+
+def create_gazette_deadline(gazette: Dict) -> Union[Deadline, None]:
+    seconds = (
+        get_slow_gazette_deadline()
+        if is_slow_gazette(gazette)
+        else get_gazette_deadline()
+    )
+    return Deadline(seconds) if seconds > 0 else None
+
+
+def mark_gazette_as_slow(gazette: Dict) -> None:
+    with _slow_gazettes_lock:
+        _slow_gazettes.add(get_gazette_key(gazette))
+
+
+def is_slow_gazette(gazette: Dict) -> bool:
+    with _slow_gazettes_lock:
+        return get_gazette_key(gazette) in _slow_gazettes
+
+
+def forget_slow_gazettes(*keys: Tuple[Any, str]) -> None:
+    """
+    Forgets the slow gazettes with keys, or all of them when none is given
+    """
+    with _slow_gazettes_lock:
+        if keys:
+            _slow_gazettes.difference_update(keys)
+        else:
+            _slow_gazettes.clear()
+
+
+def use_dead_letters() -> bool:
+    """
+    Whether gazettes that failed for good are recorded in gazette_dead_letters
+    """
+    return os.environ.get("EXTRACTION_DEAD_LETTERS", "false").lower() == "true"
+
+
+def create_retry_scheduler(
+    database: DatabaseInterface,
+) -> Union[RetryScheduler, None]:
+    """
+    Scheduler of the failed gazettes, or None when neither retries nor dead
+    letters are enabled
+    """
+    attempts = get_retry_attempts()
+    if attempts == 0 and not use_dead_letters():
+        return None
+    return RetryScheduler(
+        attempts,
+        base_delay=get_retry_delay(),
+        max_delay=get_retry_max_delay(),
+        key=get_gazette_key,
+        is_permanent=is_permanent_gazette_failure,
+        give_up=lambda gazette, error, attempts: give_up_gazette(
+            gazette, error, attempts, database
+        ),
+    )
+
+
+def retry_failed_gazettes(
+    gazettes: Iterable[Dict[str, Any]],
+    retries: RetryScheduler,
+    run_engine: Callable[[Iterable[Dict[str, Any]]], Iterable],
+) -> Iterable[Tuple[Tuple[Any, str], Union[List[str], None]]]:
+    """
+    Runs the engine over the gazettes with the due retries among them, then over
+    the retries left until no gazette is waiting for one. On shutdown the retries
+    left are not waited for: the gazettes are still unprocessed for the next run
+    """
+    yield from run_engine(retries.feed(gazettes))
+    while retries.pending() and not shutdown_requested():
+        logging.info(f"Retrying {retries.pending()} failed gazettes")
+        yield from run_engine(retries.drain(stop=get_shutdown_event()))
+
+
+def is_permanent_gazette_failure(error: Exception) -> bool:
+    """
+    Whether the gazette would fail the same way if processed again
+    """
+    return isinstance(error, (UnsupportedFileTypeError, GazetteFileTooLargeError))
+
+
+def copy_gazette_for_retry(gazette: Dict) -> Dict:
+    """
+    Copy of a failed gazette to be processed again, since the gazette itself is
+    cleared once processed. The text extracted so far is dropped
+    """
+    retry = gazette.copy()
+    if "source_text" in retry:
+        retry["source_text"] = ""
+    return retry
+
+
+def give_up_gazette(
+    gazette: Dict, error: Exception, attempts: int, database: DatabaseInterface
+) -> None:
+    if attempts > 1:
+        logging.error(
+            f"Giving up on gazette {gazette['id']} after {attempts} attempts: "
+            f"{type(error).__name__}: {error}"
+        )
+    if use_dead_letters():
+        record_dead_letter(gazette, error, attempts, database)
+
+
+def record_dead_letter(
+    gazette: Dict, error: Exception, attempts: int, database: DatabaseInterface
+) -> None:
+    """
+    Records a gazette that failed for good, so it can be replayed with the
+    DEAD_LETTERS execution mode
+    """
+    command = """
+        INSERT INTO gazette_dead_letters
+            (gazette_id, file_checksum, attempts, error, failed_at)
+        VALUES
+            (%(gazette_id)s, %(file_checksum)s, %(attempts)s, %(error)s, now())
+        ON CONFLICT (gazette_id) DO UPDATE SET
+            file_checksum = EXCLUDED.file_checksum,
+            attempts = gazette_dead_letters.attempts + EXCLUDED.attempts,
+            error = EXCLUDED.error,
+            failed_at = EXCLUDED.failed_at
+    ;
+    """
+    data = {
+        "gazette_id": gazette["id"],
+        "file_checksum": gazette["file_checksum"],
+        "attempts": attempts,
+        "error": f"{type(error).__name__}: {error}"[:2000],
+    }
+    try:
+        database.insert(command, data)
+    except Exception as e:
+        # The database rolled the failed insert back, so the next statements do
+        # not find the transaction aborted. The gazette is left unprocessed and is
+        # listed again by the next run
+        logging.error(
+            f"Failed to record dead letter of gazette {gazette['id']}, left "
+            f"unprocessed: {type(e).__name__}: {e}"
+        )
+
+
+def get_recovered_gazettes_writer(
+    database: DatabaseInterface,
+) -> Union[BatchWriter, None]:
+    """
+    Writer removing the gazettes processed by this run from the dead-letter
+    table, or None when dead letters are disabled
+    """
+    if not use_dead_letters():
+        return None
+    return BatchWriter(
+        lambda gazette_ids: database.delete(
+            "DELETE FROM gazette_dead_letters WHERE gazette_id = ANY(%(ids)s);",
+            {"ids": gazette_ids},
+        ),
+        max_size=500,
+    )
+
+
+def get_extraction_concurrency() -> int:
+    """
+    Number of gazettes processed at the same time. Defaults to 1 (sequential)
+    """
+    return max(1, int(os.environ.get("EXTRACTION_CONCURRENCY", "1")))
+
+
+def get_listing_prefetch_size() -> int:
+    """
+    Gazettes listed ahead in the background, so the next listing page is queried
+    while the current one is processed. 0 (default) lists them on demand
+    """
+    return max(0, int(os.environ.get("EXTRACTION_PREFETCH_GAZETTES", "0")))
+
+
+def get_file_prefetch_count() -> int:
+    """
+    Gazette files downloaded ahead of the workers by the pool engine. 0 (default)
+    downloads each file when its gazette is processed
+    """
+    return max(0, int(os.environ.get("EXTRACTION_PREFETCH_FILES", "0")))
+
+
+def get_file_prefetch_budget() -> int:
+    """
+    Bytes of prefetched files waiting on the disk above which no new file is
+    prefetched
+    """
+    return int(float(os.environ.get("EXTRACTION_PREFETCH_MB", "512")) * 1024 * 1024)
+
+
+def prefetch_gazettes_listing(gazettes: Iterable[Dict]) -> Iterable[Dict]:
+    size = get_listing_prefetch_size()
+    if size == 0:
+        return gazettes
+    logging.info(f"Listing up to {size} gazettes ahead")
+    return prefetch(gazettes, size)
+
+
+def get_stage_concurrency(stage: str, default: int) -> int:
+    """
+    Number of worker threads of a stage in the staged engine, read from
+    EXTRACTION_<STAGE>_CONCURRENCY
+    """
+    variable = f"EXTRACTION_{stage.upper()}_CONCURRENCY"
+    return max(1, int(os.environ.get(variable, default)))
+
+
+def get_stage_queue_size() -> int:
+    """
+    Maximum number of gazettes waiting between two stages in the staged engine
+    """
+    return max(1, int(os.environ.get("EXTRACTION_STAGE_QUEUE_SIZE", "4")))
+
+
+def extract_text_in_pool(
+    gazettes: Iterable[Dict[str, Any]],
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: StorageInterface,
+    index: IndexInterface,
+    text_extractor: TextExtractorInterface,
+    on_failure: Union[FailureHandler, None] = None,
+) -> Iterable[Tuple[Tuple[Any, str], Union[List[str], None]]]:
+    """
+    Processes the gazettes with a bounded pool of workers, yielding the key (id,
+    file_checksum) of each gazette with the ids of its indexed documents (None for
+    failures)
+    """
+    concurrency = get_extraction_concurrency()
+    logging.info(f"Starting text extraction from gazettes (concurrency={concurrency})")
+
+    def process(item: Tuple[Dict, Union[Future, None]]):
+        gazette, prefetched_file = item
+        # The gazette is cleared once processed, so its key is taken first
+        gazette_key = get_gazette_key(gazette)
+        return gazette_key, process_gazette(
+            gazette,
+            territories,
+            database,
+            storage,
+            index,
+            text_extractor,
+            prefetched_file=prefetched_file,
+            on_failure=on_failure,
+        )
+
+    items = prefetch_gazette_files(gazettes, storage, text_extractor)
+    if concurrency > 1:
+        return bounded_map(process, items, concurrency)
+    return map(process, items)
+
+
+def get_large_file_threshold() -> int:
+    """
+    Size in bytes from which a gazette file goes to the large lane
+    """
+    return int(float(os.environ.get("EXTRACTION_LARGE_FILE_MB", "20")) * 1024 * 1024)
+
+
+def get_slow_territory_seconds() -> float:
+    """
+    Average extraction time of the gazettes of a territory from which its next
+    gazettes go to the large lane
+    """
+    return float(os.environ.get("EXTRACTION_SLOW_TERRITORY_SECONDS", "120"))
+
+
+def get_lane_concurrency(lane: str, default: int) -> int:
+    """
+    Number of worker threads of a lane, read from EXTRACTION_<LANE>_CONCURRENCY
+    """
+    variable = f"EXTRACTION_{lane.upper()}_CONCURRENCY"
+    return max(1, int(os.environ.get(variable, default)))
+
+
+def get_lane_timeout(lane: str, default: float) -> float:
+    """
+    Seconds Tika may take to extract the text of a file of a lane, read from
+    EXTRACTION_<LANE>_TIMEOUT
+    """
+    return float(os.environ.get(f"EXTRACTION_{lane.upper()}_TIMEOUT", default))
+
+
+def extract_text_in_lanes(
+    gazettes: Iterable[Dict[str, Any]],
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: StorageInterface,
+    index: IndexInterface,
+    text_extractor: TextExtractorInterface,
+    on_failure: Union[FailureHandler, None] = None,
+) -> Iterable[Tuple[Tuple[Any, str], Union[List[str], None]]]:
+    """
+    Processes small and large gazettes in separate lanes, yielding the key of each
+    gazette with the ids of its indexed documents (None for failures).
+
+    A gazette goes to the large lane when its file is at least
+    EXTRACTION_LARGE_FILE_MB (read with a HEAD request to the storage) or when the
+    gazettes of its territory took EXTRACTION_SLOW_TERRITORY_SECONDS on average so
+    far in this run, or when it already went past its deadline. A few huge files
+    then only hold the large lane workers, while the small lane keeps going with
+    a shorter Tika timeout.
+
+    The metadata is only read with EXTRACTION_PREFLIGHT, and not when reusing
+    existing extractions, which may skip the download altogether. It is read by
+    EXTRACTION_METADATA_CONCURRENCY threads ahead of the lanes and reused to check
+    the file before the download.
+    """
+    large_file_threshold = get_large_file_threshold()
+    slow_territory_seconds = get_slow_territory_seconds()
+    territory_costs = CostTracker()
+
+    def route(item: Tuple[Dict, Union[Dict, None]]) -> int:
+        gazette, file_metadata = item
+        if is_slow_gazette(gazette):
+            return 1
+        if (
+            isinstance(file_metadata, dict)
+            and file_metadata["size"] >= large_file_threshold
+        ):
+            return 1
+        if territory_costs.average(gazette["territory_id"]) >= slow_territory_seconds:
+            return 1
+        return 0
 
-        except UnsupportedFileTypeError as e:
-            logging.warning(
-                f"Could not process gazette {gazette.get('id', 'unknown')}: "
-                f"{gazette.get('file_path', 'unknown path')} "
-                f"(territory: {gazette.get('territory_id', 'unknown')}, "
-                f"date: {gazette.get('date', 'unknown')}). "
-                f"Cause: {e}"
+    def lane_process(lane_extractor: TextExtractorInterface):
+        def process(item: Tuple[Dict, Union[Dict, None]]):
+            gazette, file_metadata = item
+            # The gazette is cleared once processed, so its key is taken first
+            gazette_key = get_gazette_key(gazette)
+            if file_metadata is _FILE_NOT_FOUND:
+                log_missing_gazette_file(gazette)
+                gazette.clear()
+                return gazette_key, []
+            territory_id = gazette["territory_id"]
+            started = time.monotonic()
+            document_ids = process_gazette(
+                gazette,
+                territories,
+                database,
+                storage,
+                index,
+                lane_extractor,
+                file_metadata=file_metadata,
+                on_failure=on_failure,
             )
-        except Exception as e:
-            logging.error(
-                f"Failed to process gazette {gazette.get('id', 'unknown')}: "
-                f"{gazette.get('file_path', 'unknown path')} "
-                f"(territory: {gazette.get('territory_id', 'unknown')}, "
-                f"date: {gazette.get('date', 'unknown')}, "
-                f"checksum: {gazette.get('file_checksum', 'unknown')}). "
-                f"Error: {type(e).__name__}: {str(e)}",
-                exc_info=True,
+            territory_costs.record(territory_id, time.monotonic() - started)
+            return gazette_key, document_ids
+
+        return process
+
+    lanes = []
+    for name, concurrency, timeout in (
+        ("small", get_extraction_concurrency(), 120),
+        ("large", 1, 600),
+    ):
+        concurrency = get_lane_concurrency(name, concurrency)
+        timeout = get_lane_timeout(name, timeout)
+        logging.info(
+            f"Extraction lane {name}: concurrency={concurrency}, timeout={timeout}s"
+        )
+        lanes.append(
+            Lane(
+                name,
+                lane_process(text_extractor.with_read_timeout(timeout)),
+                concurrency,
             )
+        )
+    if use_file_preflight() and not reuse_existing_extractions():
+        items = bounded_map(
+            lambda gazette: (gazette, read_gazette_file_metadata(gazette, storage)),
+            gazettes,
+            get_lane_concurrency("metadata", 4),
+        )
+    else:
+        items = ((gazette, None) for gazette in gazettes)
+    return run_lanes(items, route, lanes, backlog=get_stage_queue_size())
+
+
+def read_gazette_file_metadata(gazette: Dict, storage: StorageInterface) -> Any:
+    """
+    Metadata of the gazette file, _FILE_NOT_FOUND when it does not exist, or None
+    when it could not be read (the file is then checked again before being
+    downloaded)
+    """
+    try:
+        file_metadata = storage.get_file_metadata(
+            get_gazette_file_key_used_in_storage(gazette)
+        )
+    except Exception as e:
+        logging.warning(f"Could not read metadata of {gazette['file_path']}: {e}")
+        return None
+    return file_metadata if file_metadata is not None else _FILE_NOT_FOUND
+
+
+def prefetch_gazette_files(
+    gazettes: Iterable[Dict],
+    storage: StorageInterface,
+    text_extractor: TextExtractorInterface,
+) -> Iterable[Tuple[Dict, Union[Future, None]]]:
+    """
+    Pairs each gazette with the future of its file download, started in the
+    background EXTRACTION_PREFETCH_FILES gazettes ahead (within the
+    EXTRACTION_PREFETCH_MB budget) so the workers do not wait on the storage.
+    The future is None when files are not prefetched.
+
+    Files are not prefetched when streaming, which does not download them, nor
+    when reusing existing extractions, which skips most downloads.
+    """
+    count = get_file_prefetch_count()
+    if count == 0 or use_streaming_extraction() or reuse_existing_extractions():
+        return ((gazette, None) for gazette in gazettes)
+
+    budget = get_file_prefetch_budget()
+    logging.info(
+        f"Prefetching up to {count} gazette files ({budget / 1024 / 1024:.0f}MB)"
+    )
+    return prefetch_map(
+        lambda gazette: prepare_gazette_file(gazette, storage, text_extractor),
+        gazettes,
+        ahead=count,
+        budget=budget,
+        cost=lambda probe: probe.size if probe is not None else 0,
+        discard=lambda probe: remove_gazette_file(probe.path),
+    )
+
+
+def extract_text_in_stages(
+    gazettes: Iterable[Dict[str, Any]],
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: StorageInterface,
+    index: IndexInterface,
+    text_extractor: TextExtractorInterface,
+    on_failure: Union[FailureHandler, None] = None,
+) -> Iterable[Tuple[Tuple[Any, str], List[str]]]:
+    """
+    Processes the gazettes in a pipeline of stages connected by bounded queues,
+    yielding the key of each gazette with the ids of its indexed documents.
+
+    The queue after the download stage bounds how many gazette files wait on the
+    local disk for Apache Tika, so downloads can run ahead of the extraction
+    without filling the disk.
+    """
+    tika_concurrency = get_extraction_concurrency()
+    stages = [
+        Stage(
+            "download",
+            lambda job: run_job_stage(
+                start_gazette_job(job),
+                lambda job: download_stage(job, storage, index, text_extractor),
+            ),
+            get_stage_concurrency("download", 2),
+        ),
+        Stage(
+            "extract",
+            lambda job: run_job_stage(
+                job, lambda job: extract_stage(job, text_extractor)
+            ),
+            get_stage_concurrency("tika", tika_concurrency),
+        ),
+        Stage(
+            "upload",
+            lambda job: run_job_stage(job, lambda job: upload_stage(job, storage)),
+            get_stage_concurrency("upload", 2),
+        ),
+        Stage(
+            "index",
+            lambda job: run_job_stage(
+                job,
+                lambda job: index_stage(job, territories, database, storage, index),
+            ),
+            get_stage_concurrency("index", 2),
+        ),
+    ]
+    queue_size = get_stage_queue_size()
+    logging.info(
+        "Starting staged text extraction from gazettes ("
+        + ", ".join(f"{stage.name}={stage.concurrency}" for stage in stages)
+        + f", queue_size={queue_size})"
+    )
+
+    jobs = (GazetteJob(gazette) for gazette in gazettes)
+    for job in run_stages(
+        jobs,
+        stages,
+        queue_size,
+        on_error=lambda job, error: fail_gazette_job(job, error, on_failure),
+    ):
+        gazette_key = get_gazette_key(job.gazette)
+        job.gazette.clear()
+        yield gazette_key, job.document_ids
+
+
+class GazetteJob:
+    """
+    State of a gazette moving through the stages of the extraction pipeline
+    """
+
+    __slots__ = (
+        "gazette",
+        "gazette_file",
+        "probe",
+        "stream",
+        "document_ids",
+        "existing",
+        "deadline",
+    )
+
+    def __init__(self, gazette: Dict):
+        self.gazette = gazette
+        self.gazette_file = None
+        self.probe = None
+        self.stream = None
+        self.document_ids = []
+        self.deadline = None
+        # Result of a previous extraction being reused (see check_existing_extraction)
+        self.existing = None
+
+
+def download_stage(
+    job: GazetteJob,
+    storage: StorageInterface,
+    index: IndexInterface,
+    text_extractor: TextExtractorInterface,
+) -> Union[GazetteJob, None]:
+    if reuse_existing_extractions():
+        job.existing = check_existing_extraction(job.gazette, storage, index)
+        if job.existing == EXISTING_INDEXED:
+            job.document_ids = [job.gazette["file_checksum"]]
+            return job
+        if job.existing == EXISTING_TEXT:
+            load_existing_text(job.gazette, storage)
+            return job
+
+    if use_streaming_extraction():
+        job.stream = prepare_gazette_stream(job.gazette, storage)
+        if job.stream is None:
+            job.gazette.clear()
+            return None
+        return job
+
+    job.probe = prepare_gazette_file(job.gazette, storage, text_extractor)
+    if job.probe is None:
+        job.gazette.clear()
+        return None
+    job.gazette_file = job.probe.path
+    return job
+
+
+def extract_stage(
+    job: GazetteJob, text_extractor: TextExtractorInterface
+) -> GazetteJob:
+    if job.existing is not None:
+        return job
+    if job.stream is not None:
+        try:
+            extract_gazette_text_from_stream(job.gazette, job.stream, text_extractor)
         finally:
-            # Clear gazette data from memory after processing
-            gazette.clear()
+            job.stream.close()
+            job.stream = None
+        return job
+    try:
+        extract_gazette_text(
+            job.gazette, job.gazette_file, text_extractor, probe=job.probe
+        )
+    finally:
+        remove_gazette_file(job.gazette_file)
+        job.gazette_file = None
+        job.probe = None
+    return job
 
-            # Force GC every 10 documents to prevent memory accumulation
-            if processed_count % 10 == 0:
-                gc.collect()
 
-    logging.info(f"Completed text extraction. Total processed: {processed_count}")
-    return ids
+def upload_stage(job: GazetteJob, storage: StorageInterface) -> GazetteJob:
+    if job.existing is None:
+        upload_gazette_text(job.gazette, storage)
+    return job
+
+
+def index_stage(
+    job: GazetteJob,
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: StorageInterface,
+    index: IndexInterface,
+) -> GazetteJob:
+    # Gazettes found indexed by download_stage are only marked as processed,
+    # otherwise they would be listed again by the next run
+    if job.existing != EXISTING_INDEXED:
+        job.document_ids = index_gazette(job.gazette, territories, storage, index)
+    set_gazette_as_processed(job.gazette, database)
+    return job
+
+
+def start_gazette_job(job: GazetteJob) -> GazetteJob:
+    """
+    Starts the deadline of the job when the first stage takes it
+    """
+    job.deadline = create_gazette_deadline(job.gazette)
+    return job
+
+
+def run_job_stage(job: GazetteJob, stage: Callable[[GazetteJob], Any]) -> Any:
+    """
+    Runs a stage of the job within the deadline of its gazette. The files of a
+    job abandoned past the deadline are released by its stage thread once it stops
+    """
+    if job.deadline is None:
+        return stage(job)
+    return run_with_deadline(
+        lambda: stage(job),
+        job.deadline,
+        on_abandoned=lambda: release_gazette_job_files(job),
+        threads=get_deadline_threads(),
+    )
+
+
+def fail_gazette_job(
+    job: GazetteJob,
+    error: Exception,
+    on_failure: Union[FailureHandler, None] = None,
+) -> None:
+    """
+    Logs the failure of a gazette in any stage and releases its resources
+    """
+    handle_gazette_failure(job.gazette, error, on_failure)
+    if is_abandoned(error):
+        # The file and stream are still in use by the abandoned stage, which
+        # releases them once it stops
+        job.gazette.clear()
+    else:
+        release_gazette_job(job)
+
+
+def release_gazette_job(job: GazetteJob) -> None:
+    release_gazette_job_files(job)
+    job.gazette.clear()
+
+
+def release_gazette_job_files(job: GazetteJob) -> None:
+    if job.gazette_file is not None:
+        remove_gazette_file(job.gazette_file)
+    if job.stream is not None:
+        job.stream.close()
+
+
+def process_gazette(
+    gazette: Dict,
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: StorageInterface,
+    index: IndexInterface,
+    text_extractor: TextExtractorInterface,
+    prefetched_file: Union[Future, None] = None,
+    file_metadata: Union[Dict, None] = None,
+    on_failure: Union[FailureHandler, None] = None,
+) -> Union[List[str], None]:
+    """
+    Processes a single gazette logging any failure. Returns the ids of the indexed
+    documents or None when the gazette could not be processed. on_failure is
+    called with the gazette and the error before the gazette is cleared
+
+    With EXTRACTION_GAZETTE_DEADLINE, a gazette still being processed past its
+    deadline is abandoned so the worker can take the next one. The work is done
+    on a copy of the gazette then, which the abandoned thread clears once it stops
+    """
+    deadline = create_gazette_deadline(gazette)
+    working = gazette if deadline is None else gazette.copy()
+
+    def process():
+        return try_process_gazette_file(
+            working,
+            territories,
+            database,
+            storage,
+            index,
+            text_extractor,
+            prefetched_file=prefetched_file,
+            file_metadata=file_metadata,
+        )
+
+    abandoned = False
+    try:
+        if deadline is None:
+            return process()
+        return run_with_deadline(
+            process,
+            deadline,
+            on_abandoned=working.clear,
+            threads=get_deadline_threads(),
+        )
+    except Exception as e:
+        abandoned = is_abandoned(e)
+        handle_gazette_failure(working if not abandoned else gazette, e, on_failure)
+    finally:
+        # Clear gazette data from memory after processing
+        gazette.clear()
+        if not abandoned:
+            working.clear()
+    return None
+
+
+def handle_gazette_failure(
+    gazette: Dict, error: Exception, on_failure: Union[FailureHandler, None]
+) -> None:
+    log_gazette_failure(gazette, error)
+    if isinstance(error, DeadlineExceeded):
+        # Retried with EXTRACTION_SLOW_GAZETTE_DEADLINE instead
+        mark_gazette_as_slow(gazette)
+    if on_failure is not None:
+        on_failure(gazette, error)
+
+
+def is_abandoned(error: Exception) -> bool:
+    return isinstance(error, DeadlineExceeded) and error.abandoned
+
+
+def log_gazette_failure(gazette: Dict, error: Exception) -> None:
+    if isinstance(error, UnsupportedFileTypeError):
+        logging.warning(
+            f"Could not process gazette {gazette.get('id', 'unknown')}: "
+            f"{gazette.get('file_path', 'unknown path')} "
+            f"(territory: {gazette.get('territory_id', 'unknown')}, "
+            f"date: {gazette.get('date', 'unknown')}). "
+            f"Cause: {error}"
+        )
+    else:
+        logging.error(
+            f"Failed to process gazette {gazette.get('id', 'unknown')}: "
+            f"{gazette.get('file_path', 'unknown path')} "
+            f"(territory: {gazette.get('territory_id', 'unknown')}, "
+            f"date: {gazette.get('date', 'unknown')}, "
+            f"checksum: {gazette.get('file_checksum', 'unknown')}). "
+            f"Error: {type(error).__name__}: {str(error)}",
+            exc_info=error,
+        )
 
 
 def try_process_gazette_file(
@@ -90,16 +1045,95 @@ def try_process_gazette_file(
     storage: StorageInterface,
     index: IndexInterface,
     text_extractor: TextExtractorInterface,
-) -> Dict:
+    prefetched_file: Union[Future, None] = None,
+    file_metadata: Union[Dict, None] = None,
+) -> List[str]:
     """
     Do all the work to extract the content from the gazette files
     Includes memory management to prevent OOM
+
+    prefetched_file is the future of prepare_gazette_file for the gazette, when
+    its file was downloaded in the background. file_metadata is the metadata of
+    the gazette file, when it was already read from the storage
     """
     logging.debug(f"Processing gazette {gazette['file_path']}")
-    gazette_file = None
+    if reuse_existing_extractions():
+        existing = check_existing_extraction(gazette, storage, index)
+        if existing == EXISTING_INDEXED:
+            logging.debug(
+                f"Gazette already extracted and indexed: {gazette['file_path']}"
+            )
+            set_gazette_as_processed(gazette, database)
+            return [gazette["file_checksum"]]
+        if existing == EXISTING_TEXT:
+            logging.debug(f"Reusing stored text of {gazette['file_path']}")
+            load_existing_text(gazette, storage)
+            document_ids = index_gazette(gazette, territories, storage, index)
+            set_gazette_as_processed(gazette, database)
+            return document_ids
+
+    if use_streaming_extraction():
+        stream = prepare_gazette_stream(gazette, storage)
+        if stream is None:
+            return []
+        try:
+            check_deadline("extraction")
+            extract_gazette_text_from_stream(gazette, stream, text_extractor)
+        finally:
+            stream.close()
+        upload_gazette_text(gazette, storage)
+        return index_extracted_gazette(gazette, territories, database, storage, index)
+
+    if prefetched_file is not None:
+        probe = prefetched_file.result()
+    else:
+        probe = prepare_gazette_file(
+            gazette, storage, text_extractor, file_metadata=file_metadata
+        )
+    if probe is None:
+        return []
+
+    gazette_file = probe.path
+    try:
+        check_deadline("extraction")
+        extract_gazette_text(gazette, gazette_file, text_extractor, probe=probe)
+        upload_gazette_text(gazette, storage)
+
+        # Delete file ASAP to free disk space
+        delete_gazette_files(gazette_file)
+        gazette_file = None
+
+        return index_extracted_gazette(gazette, territories, database, storage, index)
+    finally:
+        # Ensure cleanup even if exception occurs
+        if gazette_file:
+            remove_gazette_file(gazette_file)
+
+
+def prepare_gazette_file(
+    gazette: Dict,
+    storage: StorageInterface,
+    text_extractor: TextExtractorInterface,
+    file_metadata: Union[Dict, None] = None,
+) -> Union[FileProbe, None]:
+    """
+    Downloads the gazette file and checks it can be processed. Returns the probe
+    of the downloaded file, or None when the file does not exist in the storage
+
+    With EXTRACTION_PREFLIGHT, files the metadata shows can not be processed are
+    rejected before being downloaded. file_metadata is the metadata of the file
+    when it was already read with get_file_metadata
+    """
+    if use_file_preflight():
+        if file_metadata is None:
+            file_metadata = preflight_gazette_file(gazette, storage)
+            if file_metadata is None:
+                return None
+        else:
+            check_gazette_file_metadata(gazette, file_metadata)
 
     try:
-        gazette_file = download_gazette_file(gazette, storage)
+        probe = download_gazette_file(gazette, storage, file_metadata=file_metadata)
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code", "")
         if error_code == "404":
@@ -108,100 +1142,432 @@ def try_process_gazette_file(
                 f"Gazette ID: {gazette.get('id')}, Checksum: {gazette.get('file_checksum')}"
             )
             # Skip this gazette and continue processing others
-            return []
+            return None
         else:
             # Re-raise other ClientErrors
             raise
 
     try:
         # Check if file is ZIP - not supported, skip processing
-        if text_extractor.is_zip(gazette_file):
+        if probe.is_zip():
             logging.warning(f"Skipping unsupported ZIP file: {gazette['file_path']}")
             raise UnsupportedFileTypeError("application/zip")
 
         # Check file size to prevent OOM on very large files
-        file_size = os.path.getsize(gazette_file)
-        if file_size > MAX_FILE_SIZE_BYTES:
-            raise Exception(
-                f"File too large ({file_size / 1024 / 1024:.2f}MB > {MAX_FILE_SIZE_MB}MB): {gazette['file_path']}"
+        if probe.size > MAX_FILE_SIZE_BYTES:
+            raise GazetteFileTooLargeError(
+                f"File too large ({probe.size / 1024 / 1024:.2f}MB > {MAX_FILE_SIZE_MB}MB): {gazette['file_path']}"
             )
+    except Exception:
+        remove_gazette_file(probe.path)
+        raise
 
-        gazette["source_text"] = try_to_extract_content(gazette_file, text_extractor)
-        gazette_txt_path = define_gazette_txt_path(gazette)
+    return probe
+
+
+def use_file_preflight() -> bool:
+    """
+    Whether the metadata of the gazette files is read with a HEAD request before
+    downloading them
+    """
+    return os.environ.get("EXTRACTION_PREFLIGHT", "true").lower() == "true"
+
+
+def preflight_gazette_file(
+    gazette: Dict, storage: StorageInterface
+) -> Union[Dict, None]:
+    """
+    Reads the metadata of the gazette file without transferring it and checks the
+    file can be processed. Returns the metadata, or None when the file does not
+    exist in the storage
+    """
+    file_metadata = storage.get_file_metadata(
+        get_gazette_file_key_used_in_storage(gazette)
+    )
+    if file_metadata is None:
+        log_missing_gazette_file(gazette)
+        return None
+    check_gazette_file_metadata(gazette, file_metadata)
+    return file_metadata
 
-        # Store relative paths instead of full URLs (controlled by feature flag)
-        use_relative_paths = (
-            os.environ.get("USE_RELATIVE_FILE_PATHS", "false").lower() == "true"
+
+def log_missing_gazette_file(gazette: Dict) -> None:
+    logging.error(f"File not found in storage (404): {gazette['file_path']}")
+    logging.error(
+        f"Gazette ID: {gazette.get('id')}, Checksum: {gazette.get('file_checksum')}"
+    )
+
+
+def check_gazette_file_metadata(gazette: Dict, file_metadata: Dict) -> None:
+    """
+    Rejects files whose metadata shows they are too large or ZIP archives. Files
+    stored without a meaningful content type are still identified once downloaded
+    """
+    content_type = file_metadata["content_type"].split(";")[0].strip().lower()
+    if content_type in ZIP_CONTENT_TYPES:
+        logging.warning(f"Skipping unsupported ZIP file: {gazette['file_path']}")
+        raise UnsupportedFileTypeError("application/zip")
+
+    size = file_metadata["size"]
+    if size > MAX_FILE_SIZE_BYTES:
+        raise GazetteFileTooLargeError(
+            f"File too large ({size / 1024 / 1024:.2f}MB > {MAX_FILE_SIZE_MB}MB): {gazette['file_path']}"
         )
-        if use_relative_paths:
-            gazette["url"] = gazette["file_path"]  # Relative path only
-            gazette["file_raw_txt"] = gazette_txt_path  # Relative path only
+
+
+def index_extracted_gazette(
+    gazette: Dict,
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: StorageInterface,
+    index: IndexInterface,
+) -> List[str]:
+    """
+    Indexes a gazette whose text was already extracted and uploaded, and marks it
+    as processed
+    """
+    document_ids = index_gazette(gazette, territories, storage, index)
+    set_gazette_as_processed(gazette, database)
+
+    # Clear gazette source_text from memory (large string)
+    if "source_text" in gazette:
+        del gazette["source_text"]
+
+    return document_ids
+
+
+class GazetteStream:
+    """
+    Gazette file read straight from the object storage into the text extractor,
+    without being written to disk.
+
+    Files up to EXTRACTION_STREAM_MEMORY_LIMIT_MB are read whole into memory.
+    Larger files keep the storage connection open and are read while they are
+    sent. Files that can not be identified from their first bytes are written
+    to a temporary file (probe.path) like in the download mode.
+    """
+
+    __slots__ = ("probe", "_storage", "_file_key", "_body", "_pending", "_content")
+
+    def __init__(
+        self,
+        probe: FileProbe,
+        storage: StorageInterface,
+        file_key: str,
+        body=None,
+        pending: bytes = b"",
+        content: Union[bytes, None] = None,
+    ):
+        self.probe = probe
+        self._storage = storage
+        self._file_key = file_key
+        self._body = body
+        # Bytes already read from the body to identify the file
+        self._pending = pending
+        self._content = content
+
+    def open_chunks(self) -> Iterable[bytes]:
+        """
+        Returns the file content in chunks. Called again when the extraction is
+        retried, in which case a consumed body is requested again to the storage
+        """
+        if self._content is not None:
+            return [self._content]
+        if self.probe.path is not None:
+            return read_file_chunks(self.probe.path)
+        if self._body is None:
+            self._body, _ = self._storage.get_file_stream(self._file_key)
+            self._pending = b""
+        return self._read_body()
+
+    def _read_body(self) -> Iterable[bytes]:
+        try:
+            if self._pending:
+                yield self._pending
+                self._pending = b""
+            while chunk := self._body.read(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            self._body.close()
+            self._body = None
+
+    def close(self) -> None:
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+        if self.probe.path is not None:
+            remove_gazette_file(self.probe.path)
+        self._content = None
+
+
+def prepare_gazette_stream(
+    gazette: Dict, storage: StorageInterface
+) -> Union[GazetteStream, None]:
+    """
+    Opens the gazette file in the storage and identifies it from its first bytes.
+    Returns None when the file does not exist in the storage
+    """
+    file_key = get_gazette_file_key_used_in_storage(gazette)
+    try:
+        body, metadata = storage.get_file_stream(file_key)
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code", "")
+        if error_code in ("404", "NoSuchKey"):
+            logging.error(f"File not found in storage (404): {gazette['file_path']}")
+            logging.error(
+                f"Gazette ID: {gazette.get('id')}, Checksum: {gazette.get('file_checksum')}"
+            )
+            return None
+        raise
+
+    stream = None
+    try:
+        # The size is known before reading, so large files are never transferred
+        size = metadata["size"]
+        if size > MAX_FILE_SIZE_BYTES:
+            raise GazetteFileTooLargeError(
+                f"File too large ({size / 1024 / 1024:.2f}MB > {MAX_FILE_SIZE_MB}MB): {gazette['file_path']}"
+            )
+
+        hints = (get_type_hint(file_key), metadata["content_type"])
+        if size <= get_stream_memory_limit():
+            content = body.read()
+            body.close()
+            probe = FileProbe(
+                None, identify_header(content, len(content)), len(content)
+            )
+            stream = GazetteStream(probe, storage, file_key, content=content)
         else:
-            # Legacy behavior: store full URLs
-            gazette["url"] = define_file_url(gazette["file_path"])
-            gazette["file_raw_txt"] = define_file_url(gazette_txt_path)
+            header = body.read(PROBE_HEADER_SIZE)
+            mime_type = identify_header(header, size, hints)
+            if mime_type is None:
+                stream = spill_gazette_stream(header, body, storage, file_key)
+            else:
+                probe = FileProbe(None, mime_type, size)
+                stream = GazetteStream(probe, storage, file_key, body, header)
 
-        upload_raw_text(gazette_txt_path, gazette["source_text"], storage)
+        if stream.probe.is_zip():
+            logging.warning(f"Skipping unsupported ZIP file: {gazette['file_path']}")
+            raise UnsupportedFileTypeError("application/zip")
+    except Exception:
+        if stream is not None:
+            stream.close()
+        else:
+            body.close()
+        raise
 
-        # Delete file ASAP to free disk space
-        delete_gazette_files(gazette_file)
-        gazette_file = None
+    return stream
+
+
+def spill_gazette_stream(
+    header: bytes, body, storage: StorageInterface, file_key: str
+) -> GazetteStream:
+    """
+    Writes a file that could not be identified from its header to disk and
+    identifies it from there
+    """
+    with tempfile.NamedTemporaryFile(delete=False) as tmpfile:
+        try:
+            tmpfile.write(header)
+            while chunk := body.read(STREAM_CHUNK_SIZE):
+                tmpfile.write(chunk)
+        except Exception:
+            tmpfile.close()
+            remove_gazette_file(tmpfile.name)
+            raise
+        finally:
+            body.close()
+    return GazetteStream(FileProbe.from_file(tmpfile.name), storage, file_key)
+
+
+def read_file_chunks(path: str) -> Iterable[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+def extract_gazette_text_from_stream(
+    gazette: Dict, stream: GazetteStream, text_extractor: TextExtractorInterface
+) -> None:
+    """
+    Extracts the gazette text from the stream and defines the gazette file and
+    text locations
+    """
+    gazette["source_text"] = text_extractor.extract_text_from_stream(
+        stream.open_chunks, stream.probe, source=gazette["file_path"]
+    )
+    define_gazette_locations(gazette)
+
+
+def extract_gazette_text(
+    gazette: Dict,
+    gazette_file: str,
+    text_extractor: TextExtractorInterface,
+    probe: Union[FileProbe, None] = None,
+) -> None:
+    """
+    Extracts the gazette text and defines the gazette file and text locations
+    """
+    gazette["source_text"] = try_to_extract_content(
+        gazette_file, text_extractor, probe=probe
+    )
+    define_gazette_locations(gazette)
+
+
+def define_gazette_locations(gazette: Dict) -> None:
+    """
+    Defines the gazette file and text locations stored in the index
+    """
+    gazette_txt_path = define_gazette_txt_path(gazette)
+
+    # Store relative paths instead of full URLs (controlled by feature flag)
+    if use_relative_file_paths():
+        gazette["url"] = gazette["file_path"]  # Relative path only
+        gazette["file_raw_txt"] = gazette_txt_path  # Relative path only
+    else:
+        # Legacy behavior: store full URLs
+        gazette["url"] = define_file_url(gazette["file_path"])
+        gazette["file_raw_txt"] = define_file_url(gazette_txt_path)
 
-        document_ids = []
-        if gazette_type_is_aggregated(gazette):
-            segmenter = get_segmenter(gazette["territory_id"], territories)
-            territory_segments = segmenter.get_gazette_segments(gazette)
 
+def upload_gazette_text(gazette: Dict, storage: StorageInterface) -> None:
+    check_deadline("upload")
+    upload_raw_text(
+        define_gazette_txt_path(gazette),
+        gazette["source_text"],
+        storage,
+        metadata={TXT_CHECKSUM_METADATA: gazette["file_checksum"]},
+    )
+
+
+def reuse_existing_extractions() -> bool:
+    """
+    When enabled, gazettes whose text is already stored are not sent to Tika again
+    """
+    return os.environ.get("EXTRACTION_REUSE_EXISTING", "false").lower() == "true"
+
+
+def check_existing_extraction(
+    gazette: Dict, storage: StorageInterface, index: IndexInterface
+) -> Union[str, None]:
+    """
+    Looks for the results of a previous extraction of the same gazette file, using
+    only HEAD requests:
+    - EXISTING_INDEXED: the text is stored and the gazette is in the index
+    - EXISTING_TEXT: only the text is stored
+    - None: the gazette has to be extracted
+
+    The stored text is accepted when it was uploaded with the same file_checksum
+    in its metadata. Texts uploaded before the checksum was recorded are accepted
+    too, since their path is derived from the gazette file path.
+    """
+    metadata = storage.get_file_metadata(define_gazette_txt_path(gazette))
+    if metadata is None:
+        return None
+
+    stored_checksum = metadata["metadata"].get(TXT_CHECKSUM_METADATA)
+    if stored_checksum is not None and stored_checksum != gazette["file_checksum"]:
+        return None
+
+    if not gazette_type_is_aggregated(gazette) and index.document_exists(
+        gazette["file_checksum"]
+    ):
+        return EXISTING_INDEXED
+    return EXISTING_TEXT
+
+
+def load_existing_text(gazette: Dict, storage: StorageInterface) -> None:
+    """
+    Loads the stored gazette text instead of extracting it again
+    """
+    gazette["source_text"] = storage.get_content(define_gazette_txt_path(gazette))
+    define_gazette_locations(gazette)
+
+
+def index_gazette(
+    gazette: Dict,
+    territories: Iterable[Dict[str, Any]],
+    storage: StorageInterface,
+    index: IndexInterface,
+) -> List[str]:
+    """
+    Indexes the gazette, or its segments when it is an association gazette, and
+    returns the ids of the indexed documents
+    """
+    check_deadline("indexing")
+    document_ids = []
+    if gazette_type_is_aggregated(gazette):
+        segmenter = get_segmenter(gazette["territory_id"], territories)
+        # Segmentation runs regexes and checksums over the whole text, so it is
+        # sent to the CPU offload pool (when enabled) to keep the GIL free
+        territory_segments = run_cpu_bound(
+            segmenter.get_gazette_segments,
+            gazette,
+            size=len(gazette["source_text"]),
+        )
+
+        # The segments of a gazette are indexed together, and flushed before the
+        # gazette is marked as processed
+        with create_bulk_indexer(index) as bulk_indexer:
             for segment in territory_segments:
                 segment_txt_path = define_segment_txt_path(segment)
 
                 # Store relative path for segments (controlled by feature flag)
-                use_relative_paths = (
-                    os.environ.get("USE_RELATIVE_FILE_PATHS", "false").lower() == "true"
-                )
-                if use_relative_paths:
+                if use_relative_file_paths():
                     segment["file_raw_txt"] = segment_txt_path  # Relative path only
                 else:
                     # Legacy behavior: store full URL
                     segment["file_raw_txt"] = define_file_url(segment_txt_path)
 
                 upload_raw_text(segment_txt_path, segment["source_text"], storage)
-                # Create a copy before indexing to avoid issues with mock references in tests
-                segment_to_index = dict(segment)
-                index.index_document(
-                    segment_to_index, document_id=segment["file_checksum"]
-                )
+                bulk_indexer.add(dict(segment), document_id=segment["file_checksum"])
                 document_ids.append(segment["file_checksum"])
 
                 # Clear segment data from memory
                 segment.clear()
 
-            # Clear segments list
-            del territory_segments
-        else:
-            # Create a copy before indexing to avoid issues with mock references in tests
-            # and to preserve data integrity during concurrent operations
-            gazette_to_index = dict(gazette)
-            index.index_document(gazette_to_index, document_id=gazette["file_checksum"])
-            document_ids.append(gazette["file_checksum"])
+        # Clear segments list
+        del territory_segments
+    else:
+        # Create a copy before indexing to avoid issues with mock references in tests
+        # and to preserve data integrity during concurrent operations
+        gazette_to_index = dict(gazette)
+        index.index_document(gazette_to_index, document_id=gazette["file_checksum"])
+        document_ids.append(gazette["file_checksum"])
 
-        set_gazette_as_processed(gazette, database)
+    return document_ids
 
-        # Clear gazette source_text from memory (large string)
-        if "source_text" in gazette:
-            del gazette["source_text"]
 
-        return document_ids
-    finally:
-        # Ensure cleanup even if exception occurs
-        if gazette_file and os.path.exists(gazette_file):
-            try:
-                os.remove(gazette_file)
-            except Exception as e:
-                logging.warning(f"Failed to cleanup temp file {gazette_file}: {e}")
+def use_relative_file_paths() -> bool:
+    return os.environ.get("USE_RELATIVE_FILE_PATHS", "false").lower() == "true"
+
+
+def use_streaming_extraction() -> bool:
+    """
+    When enabled, gazette files are read from the storage straight into the text
+    extractor instead of being downloaded to a temporary file first
+    """
+    return os.environ.get("EXTRACTION_STREAMING", "false").lower() == "true"
+
+
+def get_stream_memory_limit() -> int:
+    """
+    Largest gazette file (in bytes) read whole into memory in streaming mode
+    """
+    return int(
+        float(os.environ.get("EXTRACTION_STREAM_MEMORY_LIMIT_MB", "8")) * 1024 * 1024
+    )
 
-        # Force garbage collection after each document
-        gc.collect()
+
+def remove_gazette_file(gazette_file: str) -> None:
+    """
+    Removes the gazette file if it still exists, only logging failures
+    """
+    if os.path.exists(gazette_file):
+        try:
+            os.remove(gazette_file)
+        except Exception as e:
+            logging.warning(f"Failed to cleanup temp file {gazette_file}: {e}")
 
 
 def gazette_type_is_aggregated(gazette: Dict):
@@ -218,11 +1584,19 @@ def gazette_type_is_aggregated(gazette: Dict):
     return str(gazette["territory_id"][-5:]).strip() == "00000"
 
 
-def upload_raw_text(path: Union[str, Path], content: str, storage: StorageInterface):
+def upload_raw_text(
+    path: Union[str, Path],
+    content: str,
+    storage: StorageInterface,
+    metadata: Union[Dict[str, str], None] = None,
+):
     """
     Upload gazette raw text file
     """
-    storage.upload_content(path, content)
+    if metadata:
+        storage.upload_content(path, content, metadata=metadata)
+    else:
+        storage.upload_content(path, content)
     logging.debug(f"Raw text uploaded {path}")
 
 
@@ -264,14 +1638,16 @@ def get_file_endpoint() -> str:
 
 
 def try_to_extract_content(
-    gazette_file: str, text_extractor: TextExtractorInterface
+    gazette_file: str,
+    text_extractor: TextExtractorInterface,
+    probe: Union[FileProbe, None] = None,
 ) -> str:
     """
     Calls the function to extract the content from the gazette file. If it fails
     remove the gazette file and raise an exception
     """
     try:
-        return text_extractor.extract_text(gazette_file)
+        return text_extractor.extract_text(gazette_file, probe=probe)
     except Exception as e:
         # Clean up file before re-raising
         if os.path.exists(gazette_file):
@@ -291,15 +1667,26 @@ def delete_gazette_files(gazette_file: str) -> None:
     os.remove(gazette_file)
 
 
-def download_gazette_file(gazette: Dict, storage: StorageInterface) -> str:
+def download_gazette_file(
+    gazette: Dict,
+    storage: StorageInterface,
+    file_metadata: Union[Dict, None] = None,
+) -> FileProbe:
     """
     Download the file from the object storage and write it down in the local
-    disk to allow the text extraction
+    disk to allow the text extraction. The file type is identified from the bytes
+    seen while writing, so the file is not read again to find it. The Content-Type
+    in file_metadata, when the metadata was already read, is used as a hint
     """
     with tempfile.NamedTemporaryFile(delete=False) as tmpfile:
         gazette_file_key = get_gazette_file_key_used_in_storage(gazette)
-        storage.get_file(gazette_file_key, tmpfile)
-        return tmpfile.name
+        writer = ProbingWriter(tmpfile, gazette_file_key)
+        if file_metadata is not None:
+            # The sync client downloads with download_fileobj, which does not
+            # expose the Content-Type of the object
+            writer.content_type_hint = file_metadata.get("content_type") or None
+        storage.get_file(gazette_file_key, writer)
+    return writer.probe(tmpfile.name)
 
 
 def get_gazette_file_key_used_in_storage(gazette: Dict) -> str:
@@ -309,7 +1696,134 @@ def get_gazette_file_key_used_in_storage(gazette: Dict) -> str:
     return gazette["file_path"]
 
 
+def get_processed_batch_size() -> int:
+    """
+    Gazettes marked as processed in a single statement. 1 (default) updates each
+    gazette as soon as it is done
+    """
+    return int(os.environ.get("PROCESSED_FLAG_BATCH_SIZE", "1"))
+
+
+def get_processed_flush_interval() -> float:
+    """
+    Longest time (in seconds) a processed gazette waits for its batch
+    """
+    return float(os.environ.get("PROCESSED_FLAG_FLUSH_SECONDS", "5"))
+
+
+_processed_writers = weakref.WeakKeyDictionary()
+_processed_writers_lock = threading.Lock()
+
+
+def get_processed_writer(
+    database: DatabaseInterface,
+    on_written: Union[Callable[[List[Tuple[Any, str]]], None], None] = None,
+) -> Union[BatchWriter, None]:
+    """
+    Returns the writer batching the processed flags written to database, or None
+    when batching is disabled. on_written is given to the writer when it is
+    created, and called with the (id, file_checksum) rows of each batch written
+    """
+    batch_size = get_processed_batch_size()
+    if batch_size <= 1:
+        return None
+    with _processed_writers_lock:
+        writer = _processed_writers.get(database)
+        if writer is None:
+            writer = BatchWriter(
+                lambda rows: set_gazettes_as_processed(rows, database),
+                max_size=batch_size,
+                max_delay=get_processed_flush_interval(),
+                on_written=on_written,
+            )
+            _processed_writers[database] = writer
+        return writer
+
+
+class ProcessedJournalRecorder:
+    """
+    Records the finished gazettes in the checkpoint journal once their processed
+    flag was written. The batch with the flag of a gazette may be written before
+    or after the gazette comes out of the engine, so both are matched by key
+    """
+
+    def __init__(self, journal: CheckpointJournal):
+        self._journal = journal
+        self._lock = threading.Lock()
+        self._finished = {}
+        self._written = set()
+
+    def record(self, gazette_key: Tuple[Any, str], document_ids: List[str]) -> None:
+        with self._lock:
+            if gazette_key not in self._written:
+                self._finished[gazette_key] = document_ids
+                return
+            self._written.remove(gazette_key)
+        self._journal.record(*gazette_key, document_ids)
+
+    def written(self, rows: List[Tuple[Any, str]]) -> None:
+        for gazette_key in rows:
+            with self._lock:
+                document_ids = self._finished.pop(gazette_key, None)
+                if document_ids is None:
+                    self._written.add(gazette_key)
+                    continue
+            self._journal.record(*gazette_key, document_ids)
+
+
+def create_journal_recorder(
+    journal: CheckpointJournal, database: DatabaseInterface
+) -> Callable[[Tuple[Any, str], List[str]], None]:
+    """
+    Returns the function recording a finished gazette in the journal. With the
+    processed flags written in batches, a gazette is only recorded once its batch
+    was written, so a resumed run does not skip a gazette left unprocessed
+    """
+    if get_processed_batch_size() <= 1:
+        return lambda gazette_key, document_ids: journal.record(
+            *gazette_key, document_ids
+        )
+    recorder = ProcessedJournalRecorder(journal)
+    get_processed_writer(database, on_written=recorder.written)
+    return recorder.record
+
+
+def close_processed_writer(database: DatabaseInterface) -> None:
+    """
+    Writes the processed flags still buffered for database
+    """
+    with _processed_writers_lock:
+        writer = _processed_writers.pop(database, None)
+    if writer is not None:
+        writer.close()
+
+
+def set_gazettes_as_processed(
+    rows: List[Tuple[Any, str]], database: DatabaseInterface
+) -> None:
+    """
+    Marks all the (id, file_checksum) rows as processed in a single statement
+    """
+    command = """
+        UPDATE gazettes
+        SET processed = True
+        FROM (VALUES %s) AS processed (id, file_checksum)
+        WHERE gazettes.id = processed.id
+        AND gazettes.file_checksum = processed.file_checksum
+    ;
+    """
+    logging.debug(f"Marking {len(rows)} gazettes as processed")
+    database.update_many(command, rows)
+
+
 def set_gazette_as_processed(gazette: Dict, database: DatabaseInterface) -> None:
+    # An abandoned attempt must not mark the gazette after the one replacing it
+    check_deadline("marking as processed")
+    writer = get_processed_writer(database)
+    if writer is not None:
+        writer.add((gazette["id"], gazette["file_checksum"]))
+        return
+
     command = """
         UPDATE gazettes
         SET processed = True
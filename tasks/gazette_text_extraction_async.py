@@ -0,0 +1,337 @@
+"""
+Tarefa para extrair o conteúdo textual dos diários usando asyncio
+
+Versão assíncrona da extração de texto: um único event loop mantém muitas
+requisições ao Apache Tika, ao armazenamento e ao índice em andamento ao mesmo
+tempo, sem uma thread para cada uma.
+"""
+
+import asyncio
+import logging
+import tempfile
+from typing import Any, Callable, Dict, Iterable, List, Union
+
+from botocore.exceptions import ClientError
+
+from data_extraction import (
+    AsyncTextExtractorInterface,
+    FileProbe,
+    ProbingWriter,
+    UnsupportedFileTypeError,
+)
+from database import DatabaseInterface
+from index import AsyncIndexInterface
+from monitoring import get_memory_governor
+from segmentation import get_segmenter
+from storage import AsyncStorageInterface
+
+from .gazette_text_extraction import (
+    EXISTING_INDEXED,
+    EXISTING_TEXT,
+    MAX_FILE_SIZE_BYTES,
+    MAX_FILE_SIZE_MB,
+    TXT_CHECKSUM_METADATA,
+    GazetteFileTooLargeError,
+    check_gazette_file_metadata,
+    close_processed_writer,
+    create_journal_recorder,
+    define_file_url,
+    define_gazette_locations,
+    define_gazette_txt_path,
+    define_segment_txt_path,
+    gazette_type_is_aggregated,
+    get_extraction_concurrency,
+    get_gazette_key,
+    log_gazette_failure,
+    prefetch_gazettes_listing,
+    remove_gazette_file,
+    reuse_existing_extractions,
+    set_gazette_as_processed,
+    skip_completed_gazettes,
+    use_file_preflight,
+    use_relative_file_paths,
+)
+from .utils import (
+    CheckpointJournal,
+    pause_shutdown_timeout,
+    run_cpu_bound_async,
+    stop_on_shutdown,
+)
+
+_NO_MORE_GAZETTES = object()
+
+
+async def extract_text_from_gazettes_async(
+    gazettes: Iterable[Dict[str, Any]],
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: AsyncStorageInterface,
+    index: AsyncIndexInterface,
+    text_extractor: AsyncTextExtractorInterface,
+    journal: Union[CheckpointJournal, None] = None,
+    on_indexed: Union[Callable[[List[str]], None], None] = None,
+) -> List[str]:
+    """
+    Extracts the text from a list of gazettes keeping up to EXTRACTION_CONCURRENCY
+    gazettes in flight on the event loop, resuming from the checkpoint journal
+    and handing the document ids to on_indexed like extract_text_from_gazettes
+    """
+    concurrency = get_extraction_concurrency()
+    logging.info(
+        f"Starting async text extraction from gazettes (concurrency={concurrency})"
+    )
+
+    gazettes = prefetch_gazettes_listing(gazettes)
+
+    ids = []
+    if journal is not None:
+        gazettes, ids = skip_completed_gazettes(gazettes, journal)
+    if on_indexed is not None:
+        if ids:
+            on_indexed(ids)
+        ids = []
+
+    record_in_journal = (
+        create_journal_recorder(journal, database) if journal is not None else None
+    )
+    processed_count = 0
+    memory_governor = get_memory_governor()
+    gazettes = iter(stop_on_shutdown(memory_governor.throttle(gazettes), "gazettes"))
+    pending = set()
+    # The gazettes are cleared once processed, so their keys are kept here
+    gazette_keys = {}
+
+    try:
+        while True:
+            while len(pending) < concurrency:
+                # The listing queries the database and may wait for free memory,
+                # so it runs outside the event loop
+                gazette = await asyncio.to_thread(next, gazettes, _NO_MORE_GAZETTES)
+                if gazette is _NO_MORE_GAZETTES:
+                    break
+                task = asyncio.create_task(
+                    process_gazette_async(
+                        gazette,
+                        territories,
+                        database,
+                        storage,
+                        index,
+                        text_extractor,
+                    )
+                )
+                gazette_keys[task] = get_gazette_key(gazette)
+                pending.add(task)
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                gazette_key = gazette_keys.pop(task)
+                document_ids = task.result()
+                if document_ids is None:
+                    continue
+                if record_in_journal is not None:
+                    record_in_journal(gazette_key, document_ids)
+                if on_indexed is not None:
+                    on_indexed(document_ids)
+                else:
+                    ids.extend(document_ids)
+                processed_count += 1
+                memory_governor.maybe_collect()
+                if processed_count % 10 == 0:
+                    logging.info(f"Processed {processed_count} gazettes")
+    finally:
+        with pause_shutdown_timeout():
+            await asyncio.to_thread(close_processed_writer, database)
+            if journal is not None:
+                journal.close()
+
+    logging.info(f"Completed text extraction. Total processed: {processed_count}")
+    return ids
+
+
+async def process_gazette_async(
+    gazette: Dict,
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: AsyncStorageInterface,
+    index: AsyncIndexInterface,
+    text_extractor: AsyncTextExtractorInterface,
+) -> Union[List[str], None]:
+    """
+    Processes a single gazette logging any failure. Returns the ids of the indexed
+    documents or None when the gazette could not be processed
+    """
+    try:
+        return await try_process_gazette_file_async(
+            gazette, territories, database, storage, index, text_extractor
+        )
+    except Exception as e:
+        log_gazette_failure(gazette, e)
+    finally:
+        gazette.clear()
+    return None
+
+
+async def try_process_gazette_file_async(
+    gazette: Dict,
+    territories: Iterable[Dict[str, Any]],
+    database: DatabaseInterface,
+    storage: AsyncStorageInterface,
+    index: AsyncIndexInterface,
+    text_extractor: AsyncTextExtractorInterface,
+) -> List[str]:
+    """
+    Do all the work to extract the content from the gazette files
+    """
+    logging.debug(f"Processing gazette {gazette['file_path']}")
+    if reuse_existing_extractions():
+        existing = await check_existing_extraction_async(gazette, storage, index)
+        if existing == EXISTING_INDEXED:
+            logging.debug(
+                f"Gazette already extracted and indexed: {gazette['file_path']}"
+            )
+            await asyncio.to_thread(set_gazette_as_processed, gazette, database)
+            return [gazette["file_checksum"]]
+        if existing == EXISTING_TEXT:
+            logging.debug(f"Reusing stored text of {gazette['file_path']}")
+            gazette["source_text"] = await storage.get_content(
+                define_gazette_txt_path(gazette)
+            )
+            define_gazette_locations(gazette)
+            document_ids = await index_gazette_async(
+                gazette, territories, storage, index
+            )
+            await asyncio.to_thread(set_gazette_as_processed, gazette, database)
+            return document_ids
+
+    probe = await prepare_gazette_file_async(gazette, storage, text_extractor)
+    if probe is None:
+        return []
+
+    try:
+        gazette["source_text"] = await text_extractor.extract_text(
+            probe.path, probe=probe
+        )
+    finally:
+        await asyncio.to_thread(remove_gazette_file, probe.path)
+
+    define_gazette_locations(gazette)
+    await storage.upload_content(
+        define_gazette_txt_path(gazette),
+        gazette["source_text"],
+        metadata={TXT_CHECKSUM_METADATA: gazette["file_checksum"]},
+    )
+
+    document_ids = await index_gazette_async(gazette, territories, storage, index)
+    await asyncio.to_thread(set_gazette_as_processed, gazette, database)
+    return document_ids
+
+
+async def check_existing_extraction_async(
+    gazette: Dict, storage: AsyncStorageInterface, index: AsyncIndexInterface
+) -> Union[str, None]:
+    """
+    Same as check_existing_extraction, using the async clients
+    """
+    metadata = await storage.get_file_metadata(define_gazette_txt_path(gazette))
+    if metadata is None:
+        return None
+
+    stored_checksum = metadata["metadata"].get(TXT_CHECKSUM_METADATA)
+    if stored_checksum is not None and stored_checksum != gazette["file_checksum"]:
+        return None
+
+    if not gazette_type_is_aggregated(gazette) and await index.document_exists(
+        gazette["file_checksum"]
+    ):
+        return EXISTING_INDEXED
+    return EXISTING_TEXT
+
+
+async def prepare_gazette_file_async(
+    gazette: Dict,
+    storage: AsyncStorageInterface,
+    text_extractor: AsyncTextExtractorInterface,
+) -> Union[FileProbe, None]:
+    """
+    Downloads the gazette file and checks it can be processed. Returns the probe
+    of the downloaded file, or None when the file does not exist in the storage.
+    Files are checked from their metadata first like in prepare_gazette_file
+    """
+    if use_file_preflight():
+        file_metadata = await storage.get_file_metadata(gazette["file_path"])
+        if file_metadata is None:
+            logging.error(f"File not found in storage (404): {gazette['file_path']}")
+            return None
+        check_gazette_file_metadata(gazette, file_metadata)
+
+    with tempfile.NamedTemporaryFile(delete=False) as tmpfile:
+        gazette_file = tmpfile.name
+        writer = ProbingWriter(tmpfile, gazette["file_path"])
+        try:
+            await storage.get_file(gazette["file_path"], writer)
+        except ClientError as e:
+            await asyncio.to_thread(remove_gazette_file, gazette_file)
+            if e.response.get("Error", {}).get("Code", "") == "404":
+                logging.error(
+                    f"File not found in storage (404): {gazette['file_path']}"
+                )
+                return None
+            raise
+        except Exception:
+            await asyncio.to_thread(remove_gazette_file, gazette_file)
+            raise
+
+    try:
+        # libmagic may read the file when the header is not enough
+        probe = await asyncio.to_thread(writer.probe, gazette_file)
+        if probe.is_zip():
+            logging.warning(f"Skipping unsupported ZIP file: {gazette['file_path']}")
+            raise UnsupportedFileTypeError("application/zip")
+
+        if probe.size > MAX_FILE_SIZE_BYTES:
+            raise GazetteFileTooLargeError(
+                f"File too large ({probe.size / 1024 / 1024:.2f}MB > {MAX_FILE_SIZE_MB}MB): {gazette['file_path']}"
+            )
+    except Exception:
+        await asyncio.to_thread(remove_gazette_file, gazette_file)
+        raise
+
+    return probe
+
+
+async def index_gazette_async(
+    gazette: Dict,
+    territories: Iterable[Dict[str, Any]],
+    storage: AsyncStorageInterface,
+    index: AsyncIndexInterface,
+) -> List[str]:
+    """
+    Indexes the gazette, or its segments when it is an association gazette, and
+    returns the ids of the indexed documents
+    """
+    if not gazette_type_is_aggregated(gazette):
+        await index.index_document(dict(gazette), document_id=gazette["file_checksum"])
+        return [gazette["file_checksum"]]
+
+    segmenter = get_segmenter(gazette["territory_id"], territories)
+    document_ids = []
+    segments = await run_cpu_bound_async(
+        segmenter.get_gazette_segments, gazette, size=len(gazette["source_text"])
+    )
+    for segment in segments:
+        segment_txt_path = define_segment_txt_path(segment)
+        if use_relative_file_paths():
+            segment["file_raw_txt"] = segment_txt_path
+        else:
+            segment["file_raw_txt"] = define_file_url(segment_txt_path)
+
+        await storage.upload_content(segment_txt_path, segment["source_text"])
+        await index.index_document(dict(segment), document_id=segment["file_checksum"])
+        document_ids.append(segment["file_checksum"])
+        segment.clear()
+    return document_ids
@@ -8,7 +8,7 @@ filtros temáticos e indexa os resultados.
 import hashlib
 from typing import Dict, Iterable, List
 
-from index import IndexInterface
+from index import IndexInterface, create_bulk_indexer
 
 from .utils import (
     batched,
@@ -21,23 +21,23 @@ def extract_themed_excerpts_from_gazettes(
     theme: Dict, gazette_ids: List[str], index: IndexInterface
 ) -> List[str]:
     ids = []
-    for theme_query in theme["queries"]:
-        for batch in batched(gazette_ids, 250):
-            for excerpt in get_excerpts_from_gazettes_with_themed_query(
-                theme_query, batch, index
-            ):
-                # excerpts with less than 10% of the expected size of excerpt account for
-                # fewer than 1% of excerpts yet their score is usually high
-                if len(excerpt["excerpt"]) < 200:
-                    continue
-
-                index.index_document(
-                    excerpt,
-                    document_id=excerpt["excerpt_id"],
-                    index=theme["index"],
-                    refresh=True,
-                )
-                ids.append(excerpt["excerpt_id"])
+    with create_bulk_indexer(index, refresh=True) as bulk_indexer:
+        for theme_query in theme["queries"]:
+            for batch in batched(gazette_ids, 250):
+                for excerpt in get_excerpts_from_gazettes_with_themed_query(
+                    theme_query, batch, index
+                ):
+                    # excerpts with less than 10% of the expected size of excerpt account for
+                    # fewer than 1% of excerpts yet their score is usually high
+                    if len(excerpt["excerpt"]) < 200:
+                        continue
+
+                    bulk_indexer.add(
+                        excerpt,
+                        document_id=excerpt["excerpt_id"],
+                        index=theme["index"],
+                    )
+                    ids.append(excerpt["excerpt_id"])
 
     return ids
 
@@ -2,127 +2,194 @@
 
 import logging
 import os
-from typing import Dict, Iterable
+import socket
+from typing import Iterable, List, Union
 
 from database import DatabaseInterface
 
+from .utils import GazetteRecord, shutdown_requested
+
 # Configuration for pagination to prevent OOM
 DEFAULT_PAGE_SIZE = 1000
 QUERY_PAGE_SIZE = int(os.environ.get("GAZETTE_QUERY_PAGE_SIZE", DEFAULT_PAGE_SIZE))
 
+# Configuration of the CLAIM mode, where several workers share the backlog
+DEFAULT_CLAIM_BATCH_SIZE = 100
+DEFAULT_LEASE_SECONDS = 3600
+
+# Columns read by format_gazette_data, in order. The stored source_text is not
+# read, since the extraction replaces it
+GAZETTE_COLUMNS = """
+    gazettes.id,
+    gazettes.date,
+    gazettes.edition_number,
+    gazettes.is_extra_edition,
+    gazettes.power,
+    gazettes.file_checksum,
+    gazettes.file_path,
+    gazettes.file_url,
+    gazettes.scraped_at,
+    gazettes.created_at,
+    gazettes.territory_id,
+    gazettes.processed,
+    territories.name as territory_name,
+    territories.state_code
+"""
+
 
 def get_gazettes_to_be_processed(
     execution_mode: str, database: DatabaseInterface
-) -> Iterable[Dict]:
+) -> Iterable[GazetteRecord]:
     if execution_mode == "DAILY":
         yield from get_gazettes_extracted_since_yesterday(database)
     elif execution_mode == "ALL":
         yield from get_all_gazettes_extracted(database)
     elif execution_mode == "UNPROCESSED":
         yield from get_unprocessed_gazettes(database)
+    elif execution_mode == "CLAIM":
+        yield from claim_unprocessed_gazettes(database)
+    elif execution_mode == "DEAD_LETTERS":
+        yield from get_dead_letter_gazettes(database)
     else:
         raise Exception(f'Execution mode "{execution_mode}" is invalid.')
 
 
 def get_gazettes_extracted_since_yesterday(
     database: DatabaseInterface,
-) -> Iterable[Dict]:
+) -> Iterable[GazetteRecord]:
     """
     List the gazettes which were extracted since yesterday
     Uses pagination to prevent loading all data into memory at once (OOM prevention)
     """
     logging.info("Listing gazettes extracted since yesterday (paginated)")
+    yield from list_gazettes_by_page(
+        database, "scraped_at > current_timestamp - interval '1 day'"
+    )
 
-    # Read page size dynamically to allow test mocking
-    page_size = int(os.environ.get("GAZETTE_QUERY_PAGE_SIZE", DEFAULT_PAGE_SIZE))
 
-    offset = 0
-    while True:
-        command = f"""
-        SELECT
-            gazettes.id,
-            gazettes.source_text,
-            gazettes.date,
-            gazettes.edition_number,
-            gazettes.is_extra_edition,
-            gazettes.power,
-            gazettes.file_checksum,
-            gazettes.file_path,
-            gazettes.file_url,
-            gazettes.scraped_at,
-            gazettes.created_at,
-            gazettes.territory_id,
-            gazettes.processed,
-            territories.name as territory_name,
-            territories.state_code
-        FROM
-            gazettes
-        INNER JOIN territories ON territories.id = gazettes.territory_id
-        WHERE
-            scraped_at > current_timestamp - interval '1 day'
-            AND gazettes.file_path NOT LIKE '%.zip'
-        ORDER BY gazettes.id DESC
-        LIMIT {page_size} OFFSET {offset}
-        ;
-        """
+def get_all_gazettes_extracted(
+    database: DatabaseInterface,
+) -> Iterable[GazetteRecord]:
+    """
+    List all the gazettes which were extracted
+    Uses pagination to prevent loading all data into memory at once (OOM prevention)
+    """
+    logging.info("Listing all gazettes extracted (paginated)")
+    yield from list_gazettes_by_page(database)
 
-        page_results = list(database.select(command))
 
-        if not page_results:
-            break
+def get_unprocessed_gazettes(
+    database: DatabaseInterface,
+) -> Iterable[GazetteRecord]:
+    """
+    List all the unprocessed gazettes
+    Uses pagination to prevent loading all data into memory at once (OOM prevention)
+    """
+    logging.info("Listing unprocessed gazettes (paginated)")
+    yield from list_gazettes_by_page(database, "processed is False")
 
-        logging.debug(
-            f"Processing page with {len(page_results)} gazettes (offset={offset})"
-        )
 
-        for gazette in page_results:
-            yield format_gazette_data(gazette)
+def get_dead_letter_gazettes(
+    database: DatabaseInterface,
+) -> Iterable[GazetteRecord]:
+    """
+    List the gazettes recorded in the dead-letter table by previous runs, to
+    replay them
+    """
+    logging.info("Listing gazettes in the dead-letter table (paginated)")
+    yield from list_gazettes_by_page(
+        database, "gazettes.id IN (SELECT gazette_id FROM gazette_dead_letters)"
+    )
 
-        offset += page_size
 
-        # If we got fewer results than page size, we're done
-        if len(page_results) < page_size:
-            break
+def get_gazette_id_watermark(database: DatabaseInterface, lookback_hours: int) -> int:
+    """
+    Highest id of the gazettes scraped more than lookback_hours ago. The daemon
+    starts right after it, so the gazettes scraped while it was down are caught up
+    """
+    command = f"""
+    SELECT COALESCE(MAX(id), 0)
+    FROM gazettes
+    WHERE scraped_at <= current_timestamp - interval '{int(lookback_hours)} hours'
+    ;
+    """
+    return list(database.select(command))[0][0]
 
 
-def get_all_gazettes_extracted(
+def get_new_gazettes(
     database: DatabaseInterface,
-) -> Iterable[Dict]:
+    after_id: int,
+    limit: int,
+    up_to_id: Union[int, None] = None,
+    skip_dead_letters: bool = False,
+) -> List[GazetteRecord]:
     """
-    List all the gazettes which were extracted
-    Uses pagination to prevent loading all data into memory at once (OOM prevention)
+    List up to limit unprocessed gazettes with ids above after_id (and up to
+    up_to_id, when given), from the oldest to the newest. The daemon moves
+    after_id past every batch it takes, so each query only seeks the newest end
+    of the primary key, and lists the range it already went through to retry
+    the gazettes that failed. skip_dead_letters leaves out the gazettes recorded
+    in gazette_dead_letters, which failed for good
     """
-    logging.info("Listing all gazettes extracted (paginated)")
+    upper_bound = f"AND gazettes.id <= {int(up_to_id)}" if up_to_id is not None else ""
+    dead_letters = (
+        """AND NOT EXISTS (
+            SELECT 1 FROM gazette_dead_letters
+            WHERE gazette_dead_letters.gazette_id = gazettes.id
+        )"""
+        if skip_dead_letters
+        else ""
+    )
+    command = f"""
+    SELECT
+        {GAZETTE_COLUMNS}
+    FROM
+        gazettes
+    INNER JOIN territories ON territories.id = gazettes.territory_id
+    WHERE
+        gazettes.file_path NOT LIKE '%.zip'
+        AND gazettes.processed is False
+        AND gazettes.id > {int(after_id)}
+        {upper_bound}
+        {dead_letters}
+    ORDER BY gazettes.id ASC
+    LIMIT {int(limit)}
+    ;
+    """
+    return [format_gazette_data(gazette) for gazette in database.select(command)]
 
+
+def list_gazettes_by_page(
+    database: DatabaseInterface, condition: str = ""
+) -> Iterable[GazetteRecord]:
+    """
+    List the gazettes matching the SQL condition, from the newest id to the oldest
+
+    Pages are read by keyset: each page starts below the last id of the previous
+    one, so Postgres seeks to it through the primary key instead of scanning and
+    discarding the previous pages as with OFFSET. Gazettes changing during the
+    run (e.g. becoming processed) do not shift the next pages either.
+    """
     # Read page size dynamically to allow test mocking
     page_size = int(os.environ.get("GAZETTE_QUERY_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+    condition = f"AND {condition}" if condition else ""
 
-    offset = 0
+    last_id = None
     while True:
+        # The id comes from the previous page, so it is a number safe to embed
+        keyset = f"AND gazettes.id < {int(last_id)}" if last_id is not None else ""
         command = f"""
         SELECT
-            gazettes.id,
-            gazettes.source_text,
-            gazettes.date,
-            gazettes.edition_number,
-            gazettes.is_extra_edition,
-            gazettes.power,
-            gazettes.file_checksum,
-            gazettes.file_path,
-            gazettes.file_url,
-            gazettes.scraped_at,
-            gazettes.created_at,
-            gazettes.territory_id,
-            gazettes.processed,
-            territories.name as territory_name,
-            territories.state_code
+            {GAZETTE_COLUMNS}
         FROM
             gazettes
         INNER JOIN territories ON territories.id = gazettes.territory_id
         WHERE
             gazettes.file_path NOT LIKE '%.zip'
+            {condition}
+            {keyset}
         ORDER BY gazettes.id DESC
-        LIMIT {page_size} OFFSET {offset}
+        LIMIT {page_size}
         ;
         """
 
@@ -132,95 +199,115 @@ def get_all_gazettes_extracted(
             break
 
         logging.debug(
-            f"Processing page with {len(page_results)} gazettes (offset={offset})"
+            f"Processing page with {len(page_results)} gazettes (below id {last_id})"
         )
 
         for gazette in page_results:
             yield format_gazette_data(gazette)
 
-        offset += page_size
+        last_id = page_results[-1][0]
 
         # If we got fewer results than page size, we're done
         if len(page_results) < page_size:
             break
 
 
-def get_unprocessed_gazettes(
+def get_worker_id() -> str:
+    return os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def claim_unprocessed_gazettes(
     database: DatabaseInterface,
-) -> Iterable[Dict]:
+) -> Iterable[GazetteRecord]:
     """
-    List all the unprocessed gazettes
-    Uses pagination to prevent loading all data into memory at once (OOM prevention)
+    List the unprocessed gazettes claimed by this worker, in batches
+
+    Each batch is claimed with a single statement: the unprocessed gazettes
+    without a valid lease are locked with FOR UPDATE SKIP LOCKED, so concurrent
+    workers skip each other's candidates instead of waiting for them, and leased
+    to this worker for GAZETTE_LEASE_SECONDS. The lease is only taken over when it
+    has expired, so gazettes held by a worker that died are claimed again later.
+    The next batch is claimed when the previous one was consumed, until no
+    gazette is left to claim or the shutdown is requested.
     """
-    logging.info("Listing unprocessed gazettes (paginated)")
-
-    # Read page size dynamically to allow test mocking
-    page_size = int(os.environ.get("GAZETTE_QUERY_PAGE_SIZE", DEFAULT_PAGE_SIZE))
-
-    offset = 0
-    while True:
-        command = f"""
-        SELECT
-            gazettes.id,
-            gazettes.source_text,
-            gazettes.date,
-            gazettes.edition_number,
-            gazettes.is_extra_edition,
-            gazettes.power,
-            gazettes.file_checksum,
-            gazettes.file_path,
-            gazettes.file_url,
-            gazettes.scraped_at,
-            gazettes.created_at,
-            gazettes.territory_id,
-            gazettes.processed,
-            territories.name as territory_name,
-            territories.state_code
-        FROM
-            gazettes
-        INNER JOIN territories ON territories.id = gazettes.territory_id
+    worker_id = get_worker_id()
+    batch_size = int(
+        os.environ.get("GAZETTE_CLAIM_BATCH_SIZE", DEFAULT_CLAIM_BATCH_SIZE)
+    )
+    lease_seconds = int(os.environ.get("GAZETTE_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+    logging.info(f"Claiming unprocessed gazettes as worker {worker_id}")
+
+    command = f"""
+    WITH candidates AS (
+        SELECT gazettes.id
+        FROM gazettes
+        LEFT JOIN gazette_leases ON gazette_leases.gazette_id = gazettes.id
         WHERE
-            processed is False
-            AND gazettes.file_path NOT LIKE '%.zip'
+            gazettes.processed is False
+            AND gazettes.file_path NOT LIKE '%%.zip'
+            AND (
+                gazette_leases.gazette_id IS NULL
+                OR gazette_leases.leased_until < now()
+            )
         ORDER BY gazettes.id DESC
-        LIMIT {page_size} OFFSET {offset}
-        ;
-        """
-
-        page_results = list(database.select(command))
+        LIMIT %(batch_size)s
+        FOR UPDATE OF gazettes SKIP LOCKED
+    ),
+    claimed AS (
+        INSERT INTO gazette_leases (gazette_id, worker_id, leased_until)
+        SELECT id, %(worker_id)s, now() + %(lease_seconds)s * interval '1 second'
+        FROM candidates
+        ON CONFLICT (gazette_id) DO UPDATE
+        SET worker_id = EXCLUDED.worker_id, leased_until = EXCLUDED.leased_until
+        WHERE gazette_leases.leased_until < now()
+        RETURNING gazette_id
+    )
+    SELECT
+        {GAZETTE_COLUMNS}
+    FROM
+        gazettes
+    INNER JOIN claimed ON claimed.gazette_id = gazettes.id
+    INNER JOIN territories ON territories.id = gazettes.territory_id
+    ORDER BY gazettes.id DESC
+    ;
+    """
+    data = {
+        "batch_size": batch_size,
+        "worker_id": worker_id,
+        "lease_seconds": lease_seconds,
+    }
 
-        if not page_results:
+    while not shutdown_requested():
+        try:
+            claimed = database.update_returning(command, data)
+        except Exception as e:
+            # Claims are not run again by the database when the connection is
+            # lost, since the lost one may have been committed: its gazettes
+            # stay leased until the lease expires and a new batch is claimed
+            logging.warning(f"Failed to claim gazettes, claiming again: {e}")
+            claimed = database.update_returning(command, data)
+        if not claimed:
             break
 
-        logging.debug(
-            f"Processing page with {len(page_results)} unprocessed gazettes (offset={offset})"
-        )
-
-        for gazette in page_results:
+        logging.debug(f"Claimed {len(claimed)} gazettes")
+        for gazette in claimed:
             yield format_gazette_data(gazette)
 
-        offset += page_size
-
-        # If we got fewer results than page size, we're done
-        if len(page_results) < page_size:
-            break
 
-
-def format_gazette_data(data):
-    return {
-        "id": data[0],
-        "source_text": data[1],
-        "date": data[2],
-        "edition_number": data[3],
-        "is_extra_edition": data[4],
-        "power": data[5],
-        "file_checksum": data[6],
-        "file_path": data[7],
-        "file_url": data[8],
-        "scraped_at": data[9],
-        "created_at": data[10],
-        "territory_id": data[11],
-        "processed": data[12],
-        "territory_name": data[13],
-        "state_code": data[14],
-    }
+def format_gazette_data(data) -> GazetteRecord:
+    return GazetteRecord(
+        id=data[0],
+        date=data[1],
+        edition_number=data[2],
+        is_extra_edition=data[3],
+        power=data[4],
+        file_checksum=data[5],
+        file_path=data[6],
+        file_url=data[7],
+        scraped_at=data[8],
+        created_at=data[9],
+        territory_id=data[10],
+        processed=data[11],
+        territory_name=data[12],
+        state_code=data[13],
+    )
@@ -1,4 +1,13 @@
+from .batching import BatchWriter
+from .channel import SpillingChannel
+from .concurrency import bounded_map
 from .datetime import br_timezone
+from .deadline import (
+    Deadline,
+    DeadlineExceeded,
+    check_deadline,
+    run_with_deadline,
+)
 from .hash import (
     hash_content,
     hash_file,
@@ -10,6 +19,42 @@ from .index import (
 from .iter import (
     batched,
 )
+from .journal import (
+    CheckpointJournal,
+    create_checkpoint_journal,
+)
+from .lanes import (
+    CostTracker,
+    Lane,
+    run_lanes,
+)
+from .offload import (
+    run_cpu_bound,
+    run_cpu_bound_async,
+    shutdown_cpu_pool,
+)
+from .prefetch import (
+    prefetch,
+    prefetch_map,
+)
+from .records import (
+    GazetteRecord,
+    RecordMapping,
+)
+from .retry import RetryScheduler
+from .shutdown import (
+    ShutdownTimeout,
+    clear_shutdown_request,
+    get_shutdown_event,
+    pause_shutdown_timeout,
+    request_shutdown,
+    shutdown_requested,
+    stop_on_shutdown,
+)
+from .stages import (
+    Stage,
+    run_stages,
+)
 from .territories import (
     get_territory_data,
     get_territory_slug,
@@ -20,14 +65,43 @@ from .text import (
 )
 
 __all__ = [
+    "BatchWriter",
+    "CheckpointJournal",
+    "CostTracker",
+    "Deadline",
+    "DeadlineExceeded",
+    "GazetteRecord",
+    "Lane",
+    "RecordMapping",
+    "RetryScheduler",
+    "ShutdownTimeout",
+    "SpillingChannel",
+    "Stage",
     "batched",
+    "bounded_map",
     "br_timezone",
+    "check_deadline",
     "clean_extra_whitespaces",
+    "clear_shutdown_request",
+    "create_checkpoint_journal",
     "get_checksum",
     "get_documents_from_query_with_highlights",
     "get_documents_with_ids",
+    "get_shutdown_event",
     "get_territory_data",
     "get_territory_slug",
     "hash_content",
     "hash_file",
+    "pause_shutdown_timeout",
+    "prefetch",
+    "prefetch_map",
+    "request_shutdown",
+    "run_cpu_bound",
+    "run_cpu_bound_async",
+    "run_lanes",
+    "run_stages",
+    "run_with_deadline",
+    "shutdown_cpu_pool",
+    "shutdown_requested",
+    "stop_on_shutdown",
 ]
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from typing import Callable, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BatchWriter(Generic[T]):
+    """
+    Buffers items and writes them with write_batch in a single call.
+
+    A batch is written when max_size items are buffered, when the oldest
+    buffered item has waited max_delay seconds, and on close(). It is safe to
+    add items from several threads; write_batch is never called concurrently.
+    A batch that fails to be written is kept and retried with the next one.
+    on_written is called with the items of each batch once it was written.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[T]], None],
+        max_size: int = 500,
+        max_delay: float = 5.0,
+        on_written: Optional[Callable[[List[T]], None]] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least one")
+        self._write_batch = write_batch
+        self._on_written = on_written
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._items = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._timer = None
+
+    def add(self, item: T) -> None:
+        with self._lock:
+            self._items.append(item)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._items) >= self._max_size
+            if self._timer is None and not self._closed.is_set():
+                self._timer = threading.Thread(
+                    target=self._flush_periodically, name="batch-writer", daemon=True
+                )
+                self._timer.start()
+        if full:
+            self._flush_logging_errors()
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                items, self._items = self._items, []
+                self._oldest = None
+            if not items:
+                return
+            try:
+                self._write_batch(items)
+            except Exception:
+                with self._lock:
+                    self._items[:0] = items
+                    self._oldest = self._oldest or time.monotonic()
+                raise
+            if self._on_written is not None:
+                self._on_written(items)
+
+    def _flush_logging_errors(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Failed to write batch, will retry: {e}", exc_info=e)
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self._max_delay / 2):
+            with self._lock:
+                stale = (
+                    self._oldest is not None
+                    and time.monotonic() - self._oldest >= self._max_delay
+                )
+            if stale:
+                self._flush_logging_errors()
+
+    def close(self) -> None:
+        """
+        Stops the periodic flush and writes the items left, raising if they can
+        not be written
+        """
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        self.flush()
@@ -0,0 +1,133 @@
+import logging
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Iterable, Iterator, List, Optional
+
+
+class SpillingChannel:
+    """
+    FIFO channel between threads keeping at most capacity items in memory.
+
+    Items put past the capacity are appended to a temporary file in spill_dir
+    and read back, in order, once the items in memory were taken. put() never
+    blocks, so the producer is not held back by a slow consumer, while the
+    memory used by the backlog stays bounded. Items are strings without line
+    breaks, such as document ids.
+    """
+
+    def __init__(self, capacity: int, spill_dir: Optional[str] = None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least one")
+        self._capacity = capacity
+        self._spill_dir = spill_dir
+        self._memory = deque()
+        self._spill_file = None
+        self._spilled = 0
+        self._read_offset = 0
+        self._write_offset = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._aborted = False
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._memory) + self._spilled
+
+    def put(self, item: str) -> None:
+        self.put_many([item])
+
+    def put_many(self, items: Iterable[str]) -> None:
+        with self._condition:
+            if self._closed:
+                raise ValueError("Channel is closed")
+            for item in items:
+                if self._spilled or len(self._memory) >= self._capacity:
+                    self._spill(item)
+                else:
+                    self._memory.append(item)
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """
+        Signals that no item will be put anymore. The items left are still taken
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self) -> None:
+        """
+        Closes the channel dropping the items left, so consumers stop at once
+        """
+        with self._condition:
+            self._closed = self._aborted = True
+            self._memory.clear()
+            self._spilled = 0
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+            self._condition.notify_all()
+
+    def batches(self, size: int, max_delay: float) -> Iterator[List[str]]:
+        """
+        Yields batches of up to size items until the channel is closed and empty.
+        A smaller batch is yielded when its first item waited max_delay seconds
+        """
+        while True:
+            with self._condition:
+                started = None
+                while True:
+                    if self._aborted:
+                        return
+                    available = len(self._memory) + self._spilled
+                    if available >= size or (self._closed and available):
+                        break
+                    if self._closed:
+                        return
+                    if available and started is None:
+                        started = time.monotonic()
+                    if started is not None:
+                        remaining = started + max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                batch = self._take(size)
+            yield batch
+
+    def _spill(self, item: str) -> None:
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=self._spill_dir)
+            logging.info(
+                f"Channel backlog over {self._capacity} items, spilling to "
+                f"{self._spill_dir or tempfile.gettempdir()}"
+            )
+        self._spill_file.seek(self._write_offset)
+        self._spill_file.write(item.encode() + b"\n")
+        self._write_offset = self._spill_file.tell()
+        self._spilled += 1
+
+    def _take(self, size: int) -> List[str]:
+        batch = []
+        while len(batch) < size:
+            if not self._memory:
+                if not self._spilled:
+                    break
+                self._read_spilled()
+            batch.append(self._memory.popleft())
+        return batch
+
+    def _read_spilled(self) -> None:
+        self._spill_file.seek(self._read_offset)
+        for _ in range(min(self._capacity, self._spilled)):
+            self._memory.append(self._spill_file.readline()[:-1].decode())
+            self._spilled -= 1
+        self._read_offset = self._spill_file.tell()
+        if not self._spilled:
+            # Every spilled item was read back, so the file starts over
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._read_offset = self._write_offset = 0
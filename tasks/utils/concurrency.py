@@ -0,0 +1,34 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def bounded_map(
+    func: Callable[[T], R], items: Iterable[T], max_workers: int
+) -> Iterator[R]:
+    """
+    Runs func over items in a thread pool, yielding results as they complete.
+
+    At most max_workers items are in flight at any time, so the input iterable
+    is consumed lazily and memory use does not grow with the input size.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least one")
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="worker"
+    ) as executor:
+        pending = set()
+        for item in items:
+            if len(pending) >= max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(func, item))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
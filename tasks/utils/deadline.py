@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+_current = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when work goes past its deadline. abandoned is True when the work is
+    still running in a thread that was given up on
+    """
+
+    def __init__(self, message: str, abandoned: bool = False):
+        super().__init__(message)
+        self.abandoned = abandoned
+
+
+class Deadline:
+    """
+    Time budget of a piece of work, started when the deadline is created
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self._expires - time.monotonic()
+
+    def check(self, step: str = "") -> None:
+        if self.remaining() <= 0:
+            where = f" before {step}" if step else ""
+            raise DeadlineExceeded(f"Deadline of {self.seconds:.0f}s exceeded{where}")
+
+
+def check_deadline(step: str = "") -> None:
+    """
+    Raises DeadlineExceeded when the work running in this thread with
+    run_with_deadline is past its deadline or was abandoned. Called before each
+    side effect, so abandoned work cannot commit after the work that replaced it
+    """
+    abandoned = getattr(_current, "abandoned", None)
+    if abandoned is not None and abandoned.is_set():
+        where = f" before {step}" if step else ""
+        raise DeadlineExceeded(f"Work abandoned{where}", abandoned=True)
+    deadline = getattr(_current, "deadline", None)
+    if deadline is not None:
+        deadline.check(step)
+
+
+def run_with_deadline(
+    func: Callable[[], Any],
+    deadline: Deadline,
+    on_abandoned: Optional[Callable[[], None]] = None,
+    threads: Optional[threading.Semaphore] = None,
+) -> Any:
+    """
+    Runs func in a thread of its own, waiting for it at most until the deadline.
+
+    Past the deadline DeadlineExceeded is raised and the thread is abandoned: it
+    keeps running until func returns or reaches check_deadline(), and then calls
+    on_abandoned to release what func was using.
+
+    threads bounds the threads running at once, the abandoned ones included.
+    When none is free before the deadline, DeadlineExceeded is raised without
+    running func
+    """
+    deadline.check()
+    if threads is not None and not threads.acquire(
+        timeout=max(0.0, deadline.remaining())
+    ):
+        raise DeadlineExceeded(
+            f"Deadline of {deadline.seconds:.0f}s exceeded waiting for a thread"
+        )
+    future = Future()
+    lock = threading.Lock()
+    state = {"finished": False, "abandoned": False}
+    abandoned_event = threading.Event()
+
+    def run():
+        _current.deadline = deadline
+        _current.abandoned = abandoned_event
+        result = error = None
+        try:
+            result = func()
+        except BaseException as e:
+            error = e
+        with lock:
+            state["finished"] = True
+            abandoned = state["abandoned"]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        try:
+            if abandoned and on_abandoned is not None:
+                on_abandoned()
+        finally:
+            if threads is not None:
+                threads.release()
+
+    try:
+        threading.Thread(target=run, name="deadline", daemon=True).start()
+    except BaseException:
+        if threads is not None:
+            threads.release()
+        raise
+    try:
+        return future.result(timeout=max(0.0, deadline.remaining()))
+    except TimeoutError:
+        with lock:
+            finished = state["finished"]
+            if not finished:
+                state["abandoned"] = True
+                abandoned_event.set()
+        if finished:
+            # func finished just in time, or raised the TimeoutError itself
+            return future.result()
+        raise DeadlineExceeded(
+            f"Deadline of {deadline.seconds:.0f}s exceeded", abandoned=True
+        ) from None
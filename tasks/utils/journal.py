@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Tuple, Union
+
+GazetteKey = Tuple[Any, str]
+
+
+class CheckpointJournal:
+    """
+    Append-only file recording the gazettes a run already finished, one JSON
+    line per gazette, so an interrupted run can resume where it stopped.
+
+    Each line is flushed as soon as it is written, so it survives the process
+    being killed. A line cut short by a crash is ignored when the journal is
+    loaded. finish() removes the journal once the whole run succeeded.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def load(self) -> Dict[GazetteKey, List[str]]:
+        """
+        Returns the document ids of every gazette recorded, by (id, file_checksum)
+        """
+        completed = {}
+        if not os.path.exists(self._path):
+            return completed
+        with open(self._path) as journal_file:
+            for line in journal_file:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    key = (entry["id"], entry["file_checksum"])
+                    completed[key] = entry["document_ids"]
+                except (ValueError, KeyError, TypeError):
+                    logging.warning(f"Ignoring incomplete line in {self._path}")
+        return completed
+
+    def record(self, gazette_id: Any, file_checksum: str, document_ids: List[str]):
+        line = json.dumps(
+            {
+                "id": gazette_id,
+                "file_checksum": file_checksum,
+                "document_ids": document_ids,
+            }
+        )
+        with self._lock:
+            if self._file is None:
+                self._file = open(self._path, "a")
+                # A previous run may have been killed in the middle of a line
+                if self._file.tell() > 0:
+                    self._file.write("\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def finish(self) -> None:
+        """
+        Removes the journal after the run finished, so the next run starts over
+        """
+        self.close()
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+
+def create_checkpoint_journal(name: str) -> Union[CheckpointJournal, None]:
+    """
+    Journal named name in CHECKPOINT_JOURNAL_DIR, or None when the variable is not
+    set. The directory must outlive the container (e.g. a mounted volume) for a
+    rescheduled run to resume
+    """
+    directory = os.environ.get("CHECKPOINT_JOURNAL_DIR")
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return CheckpointJournal(os.path.join(directory, f"{name}.jsonl"))
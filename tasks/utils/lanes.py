@@ -0,0 +1,173 @@
+import logging
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List
+
+_END = object()
+
+
+@dataclass
+class Lane:
+    """
+    A lane of a lane scheduler. func receives an item and returns its result.
+    concurrency is the number of worker threads of the lane.
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    concurrency: int = 1
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def run_lanes(
+    items: Iterable[Any],
+    route: Callable[[Any], int],
+    lanes: List[Lane],
+    backlog: int,
+) -> Iterator[Any]:
+    """
+    Runs each item through the lane chosen by route (an index in lanes), yielding
+    the results as they are ready.
+
+    Every lane has its own workers and a queue of at most backlog items, so items
+    taking long in one lane do not hold back the items of the others. Items for a
+    lane whose queue is full are held back while the next items are read, up to
+    backlog items per lane held in total, so a run of items for a busy lane does
+    not stop the items behind it from reaching an idle one. Items whose route
+    raises go to the first lane. Errors raised by a lane func are raised to the
+    consumer.
+    """
+    if not lanes:
+        raise ValueError("At least one lane is required")
+
+    queues = [queue.Queue(maxsize=max(1, backlog)) for _ in lanes]
+    results = queue.Queue()
+    cancelled = threading.Event()
+    # Notified by the workers when they take an item, making room in a queue
+    room = threading.Condition()
+    held = [deque() for _ in lanes]
+    max_held = max(1, backlog) * len(lanes)
+
+    def put(target: queue.Queue, item: Any) -> bool:
+        while not cancelled.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feed() -> None:
+        """
+        Moves the held items to the queues of their lanes while they have room
+        """
+        for lane_queue, lane_held in zip(queues, held):
+            while lane_held:
+                try:
+                    lane_queue.put_nowait(lane_held[0])
+                except queue.Full:
+                    break
+                lane_held.popleft()
+
+    def dispatch():
+        try:
+            for item in items:
+                try:
+                    lane = route(item)
+                except Exception as e:
+                    logging.warning(f"Failed to route item, using first lane: {e}")
+                    lane = 0
+                held[lane].append(item)
+                with room:
+                    feed()
+                    while sum(map(len, held)) >= max_held:
+                        if cancelled.is_set():
+                            return
+                        room.wait(0.5)
+                        feed()
+        except Exception as e:
+            logging.error(f"Lane scheduler input failed: {type(e).__name__}: {e}")
+            results.put(_Failure(e))
+        finally:
+            for lane, lane_queue, lane_held in zip(lanes, queues, held):
+                while lane_held:
+                    put(lane_queue, lane_held.popleft())
+                for _ in range(lane.concurrency):
+                    put(lane_queue, _END)
+
+    def work(lane: Lane, lane_queue: queue.Queue):
+        try:
+            while not cancelled.is_set():
+                try:
+                    item = lane_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                with room:
+                    room.notify()
+                if item is _END:
+                    return
+                try:
+                    results.put(lane.func(item))
+                except Exception as e:
+                    results.put(_Failure(e))
+        finally:
+            results.put(_END)
+
+    threads = [threading.Thread(target=dispatch, name="lane-dispatch", daemon=True)]
+    for lane, lane_queue in zip(lanes, queues):
+        threads.extend(
+            threading.Thread(
+                target=work,
+                args=(lane, lane_queue),
+                name=f"lane-{lane.name}-{worker}",
+                daemon=True,
+            )
+            for worker in range(lane.concurrency)
+        )
+    for thread in threads:
+        thread.start()
+
+    workers = sum(lane.concurrency for lane in lanes)
+    try:
+        while workers:
+            result = results.get()
+            if result is _END:
+                workers -= 1
+            elif isinstance(result, _Failure):
+                raise result.error
+            else:
+                yield result
+    finally:
+        cancelled.set()
+
+
+class CostTracker:
+    """
+    Moving average of the cost (e.g. seconds) of the items of each key, updated
+    from several threads. Keys never recorded have an average of 0.
+    """
+
+    def __init__(self, weight: float = 0.3):
+        self._weight = weight
+        self._averages: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: Hashable, cost: float) -> None:
+        with self._lock:
+            average = self._averages.get(key)
+            if average is None:
+                self._averages[key] = cost
+            else:
+                self._averages[key] = average + self._weight * (cost - average)
+
+    def average(self, key: Hashable) -> float:
+        with self._lock:
+            return self._averages.get(key, 0.0)
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Union
+
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
+
+def get_cpu_offload_workers() -> int:
+    """
+    Number of processes used to run CPU-bound steps. 0 (default) runs them inline
+    """
+    return max(0, int(os.environ.get("CPU_OFFLOAD_WORKERS", "0")))
+
+
+def get_cpu_offload_min_size() -> int:
+    """
+    Smallest input (in characters) worth sending to another process
+    """
+    return int(os.environ.get("CPU_OFFLOAD_MIN_SIZE", 256 * 1024))
+
+
+def get_cpu_pool() -> Union[ProcessPoolExecutor, None]:
+    global _cpu_pool
+    workers = get_cpu_offload_workers()
+    if workers == 0:
+        return None
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            logging.info(f"Starting CPU offload pool with {workers} processes")
+            _cpu_pool = ProcessPoolExecutor(max_workers=workers)
+    return _cpu_pool
+
+
+def should_offload(size: int) -> bool:
+    return get_cpu_offload_workers() > 0 and size >= get_cpu_offload_min_size()
+
+
+def run_cpu_bound(func: Callable, *args, size: int = 0) -> Any:
+    """
+    Runs func(*args) in the CPU offload pool and waits for the result, leaving the
+    GIL free for the I/O running in other threads. Runs inline when the pool is
+    disabled or the input is smaller than CPU_OFFLOAD_MIN_SIZE.
+
+    func and args are pickled to the worker process, so func must be a module
+    level function or a method of a picklable object.
+    """
+    if not should_offload(size):
+        return func(*args)
+    return get_cpu_pool().submit(func, *args).result()
+
+
+async def run_cpu_bound_async(func: Callable, *args, size: int = 0) -> Any:
+    """
+    Same as run_cpu_bound, awaiting the offload pool without blocking the event loop.
+    When the pool is not used, func runs in a thread instead of on the event loop
+    """
+    if not should_offload(size):
+        return await asyncio.to_thread(func, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_pool(), func, *args)
+
+
+def shutdown_cpu_pool() -> None:
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is not None:
+            _cpu_pool.shutdown(wait=True, cancel_futures=True)
+            _cpu_pool = None
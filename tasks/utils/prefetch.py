@@ -0,0 +1,147 @@
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_END = object()
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def prefetch(items: Iterable[T], size: int) -> Iterator[T]:
+    """
+    Iterates items in a background thread, keeping up to size of them ready.
+
+    The source keeps being read while the consumer works, so a source reading
+    pages from the database queries the next page before the current one runs
+    out. Errors raised by the source are raised to the consumer.
+    """
+    if size < 1:
+        raise ValueError("size must be at least one")
+
+    ready = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                ready.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_Failure(e))
+            return
+        put(_END)
+
+    reader = threading.Thread(target=read, name="prefetch", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+def prefetch_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    ahead: int,
+    budget: int,
+    cost: Callable[[R], int],
+    discard: Optional[Callable[[R], None]] = None,
+) -> Iterator[Tuple[T, "Future[R]"]]:
+    """
+    Yields each item with a future of func(item), started in a background thread
+    pool before the consumer asks for the item.
+
+    Up to ahead items are being processed or waiting for the consumer. New items
+    are only started while the cost of the results waiting for the consumer is
+    below budget (e.g. bytes of downloaded files). Items still being processed
+    count with the average cost of the results so far, so a burst of them does
+    not go over budget once finished. When the consumer stops early, the results
+    it did not take are passed to discard.
+    """
+    if ahead < 1:
+        raise ValueError("ahead must be at least one")
+
+    items = iter(items)
+    pending = deque()
+    # Number and total cost of the results so far
+    finished = [0, 0]
+    finished_lock = threading.Lock()
+
+    def record_cost(future: "Future[R]") -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        result_cost = cost(future.result())
+        with finished_lock:
+            finished[0] += 1
+            finished[1] += result_cost
+
+    def waiting_cost() -> int:
+        with finished_lock:
+            count, total_cost = finished
+        expected = total_cost // count if count else 0
+        total = 0
+        for _, future in pending:
+            if not future.done():
+                total += expected
+            elif future.exception() is None:
+                total += cost(future.result())
+        return total
+
+    with ThreadPoolExecutor(max_workers=ahead, thread_name_prefix="prefetch") as pool:
+        try:
+            exhausted = False
+            while True:
+                while (
+                    not exhausted
+                    and len(pending) < ahead
+                    and (not pending or waiting_cost() < budget)
+                ):
+                    item = next(items, _END)
+                    if item is _END:
+                        exhausted = True
+                        break
+                    future = pool.submit(func, item)
+                    future.add_done_callback(record_cost)
+                    pending.append((item, future))
+                if not pending:
+                    return
+                yield pending.popleft()
+        finally:
+            for _, future in pending:
+                if future.cancel():
+                    continue
+                try:
+                    result = future.result()
+                except Exception:
+                    continue
+                if discard is not None and result is not None:
+                    try:
+                        discard(result)
+                    except Exception as e:
+                        logging.warning(f"Failed to discard prefetched item: {e}")
@@ -0,0 +1,91 @@
+import copy
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Iterator, List, Tuple, Union
+
+
+class RecordMapping:
+    """
+    Lets records with __slots__ be used like the dicts the tasks pass around:
+    fields are read and set with record["field"], dict(record) and {**record}
+    build a plain dict, and clear() drops every field to free their values.
+    Only the fields still set are shown by repr().
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        delattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.__slots__ and hasattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(name, getattr(self, name)) for name in self.keys()]
+
+    def clear(self) -> None:
+        for name in self.keys():
+            delattr(self, name)
+
+    def copy(self):
+        return copy.copy(self)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+
+@dataclass(slots=True, eq=False, repr=False)
+class GazetteRecord(RecordMapping):
+    """
+    Gazette listed from the database, carried through the text extraction until
+    it is indexed. The fields filled by the extraction start empty.
+    """
+
+    id: int
+    date: date
+    edition_number: str
+    is_extra_edition: bool
+    power: str
+    file_checksum: str
+    file_path: str
+    file_url: str
+    scraped_at: datetime
+    created_at: datetime
+    territory_id: str
+    processed: bool
+    territory_name: str
+    state_code: str
+    source_text: str = ""
+    url: Union[str, None] = None
+    file_raw_txt: Union[str, None] = None
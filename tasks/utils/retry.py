@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+
+class RetryScheduler:
+    """
+    Schedules failed items to run again later instead of retrying them in place,
+    so a flaky item does not hold a worker while it waits.
+
+    The n-th retry of an item is due base_delay * 2 ** (n - 1) seconds (up to
+    max_delay) after its failure. feed() hands the due retries out between the
+    fresh items; drain() hands out the remaining ones as they become due. Items
+    that failed max_attempts + 1 times, or with an error is_permanent accepts, are
+    passed to give_up(item, error, attempts) instead. succeeded() forgets the
+    attempts of an item once a retry of it worked.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        key: Callable[[Any], Hashable],
+        is_permanent: Callable[[Exception], bool],
+        give_up: Callable[[Any, Exception, int], None],
+    ):
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._key = key
+        self._is_permanent = is_permanent
+        self._give_up = give_up
+        self._attempts: Dict[Hashable, int] = {}
+        # Heap of (due time, sequence, item)
+        self._scheduled: List[Tuple[float, int, Any]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def pending(self) -> int:
+        """
+        Number of items waiting for a retry
+        """
+        with self._lock:
+            return len(self._scheduled)
+
+    def failed(self, item: Any, error: Exception) -> None:
+        """
+        Schedules the item to run again, or gives up on it
+        """
+        key = self._key(item)
+        with self._lock:
+            attempts = self._attempts.get(key, 0) + 1
+            retry = attempts <= self._max_attempts and not self._is_permanent(error)
+            if retry:
+                self._attempts[key] = attempts
+                delay = min(self._max_delay, self._base_delay * 2 ** (attempts - 1))
+                heapq.heappush(
+                    self._scheduled,
+                    (time.monotonic() + delay, next(self._sequence), item),
+                )
+            else:
+                self._attempts.pop(key, None)
+        if retry:
+            logging.info(f"Retry {attempts}/{self._max_attempts} of {key} scheduled")
+        else:
+            self._give_up(item, error, attempts)
+
+    def succeeded(self, key: Hashable) -> None:
+        """
+        Forgets the failed attempts of the item with key, which was processed
+        """
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def feed(self, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Yields the items, handing out the retries that are due between them
+        """
+        for item in items:
+            yield from self._take_due()
+            yield item
+        yield from self._take_due()
+
+    def drain(self, stop: Optional[threading.Event] = None) -> Iterator[Any]:
+        """
+        Yields the scheduled retries as they become due, until none is left or
+        stop is set. Items failing while this runs are scheduled for the next drain
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            with self._lock:
+                if not self._scheduled:
+                    return
+                due = self._scheduled[0][0]
+            wait = due - time.monotonic()
+            if wait > 0 and stop.wait(wait):
+                return
+            yield from self._take_due()
+
+    def _take_due(self) -> Iterator[Any]:
+        while True:
+            with self._lock:
+                if not self._scheduled or self._scheduled[0][0] > time.monotonic():
+                    return
+                _, _, item = heapq.heappop(self._scheduled)
+            yield item
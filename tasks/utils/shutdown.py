@@ -0,0 +1,74 @@
+import logging
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_requested = threading.Event()
+
+
+class ShutdownTimeout(BaseException):
+    """
+    Raised in the main thread when the work in flight did not finish within the
+    shutdown grace period. Like KeyboardInterrupt, it is not an Exception, so the
+    handlers of failed gazettes let it through to the finally blocks that flush
+    the buffered writes
+    """
+
+
+def request_shutdown() -> None:
+    """
+    Asks the running tasks to stop taking new work and finish the work in flight
+    """
+    _requested.set()
+
+
+def shutdown_requested() -> bool:
+    return _requested.is_set()
+
+
+def get_shutdown_event() -> threading.Event:
+    """
+    Event set when the shutdown is requested, to wait on instead of sleeping
+    """
+    return _requested
+
+
+def clear_shutdown_request() -> None:
+    _requested.clear()
+
+
+def stop_on_shutdown(items: Iterable[T], name: str = "items") -> Iterator[T]:
+    """
+    Yields the items until the shutdown is requested. The source is not read
+    again after that, so no new item is listed or claimed
+    """
+    iterator = iter(items)
+    while not _requested.is_set():
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        yield item
+    logging.info(f"Shutdown requested, not taking new {name}")
+
+
+@contextmanager
+def pause_shutdown_timeout() -> Iterator[None]:
+    """
+    Pauses the shutdown grace period timer while the buffered writes are
+    flushed, so ShutdownTimeout does not interrupt them half way. The time left
+    is given back afterwards, so the work that follows is still bounded. The
+    timer only runs in the main thread
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    remaining, _ = signal.setitimer(signal.ITIMER_REAL, 0)
+    try:
+        yield
+    finally:
+        if remaining:
+            signal.setitimer(signal.ITIMER_REAL, remaining)
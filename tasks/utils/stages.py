@@ -0,0 +1,132 @@
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+_END = object()
+
+
+@dataclass
+class Stage:
+    """
+    A step of a staged pipeline. func receives an item and returns the item that
+    is handed to the next stage, or None to drop it. concurrency is the number of
+    worker threads running func.
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    concurrency: int = 1
+
+
+def run_stages(
+    items: Iterable[Any],
+    stages: List[Stage],
+    queue_size: int,
+    on_error: Optional[Callable[[Any, Exception], None]] = None,
+) -> Iterator[Any]:
+    """
+    Runs items through stages connected by bounded queues, yielding the items
+    coming out of the last stage as they are ready.
+
+    Each queue holds at most queue_size items, so a fast stage blocks once it is
+    queue_size items ahead of the next one (backpressure) and the slowest stage
+    sets the throughput of the whole pipeline. Items whose stage function raises
+    are passed to on_error and dropped. An error reading items is raised to the
+    consumer once the items read before it went through the stages.
+    """
+    if not stages:
+        raise ValueError("At least one stage is required")
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    cancelled = threading.Event()
+    input_errors = []
+
+    def put(target: queue.Queue, item: Any) -> bool:
+        while not cancelled.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feed():
+        try:
+            for item in items:
+                if not put(queues[0], item):
+                    return
+        except Exception as e:
+            logging.error(f"Pipeline input failed: {type(e).__name__}: {e}")
+            input_errors.append(e)
+        finally:
+            for _ in range(stages[0].concurrency):
+                put(queues[0], _END)
+
+    def work(position: int, stage: Stage, finished: List[int], lock: threading.Lock):
+        source, target = queues[position], queues[position + 1]
+        try:
+            while True:
+                item = source.get()
+                if item is _END:
+                    break
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    handle_error(stage, item, e)
+                    continue
+                if result is not None and not put(target, result):
+                    return
+        finally:
+            # The next stage must be told even when this worker died, otherwise
+            # the pipeline would wait for it forever
+            with lock:
+                finished[0] += 1
+                last_worker = finished[0] == stage.concurrency
+            if last_worker:
+                next_concurrency = (
+                    stages[position + 1].concurrency
+                    if position + 1 < len(stages)
+                    else 1
+                )
+                for _ in range(next_concurrency):
+                    put(target, _END)
+
+    def handle_error(stage: Stage, item: Any, error: Exception) -> None:
+        if on_error is not None:
+            try:
+                on_error(item, error)
+                return
+            except Exception as e:
+                logging.error(
+                    f"Error handler of stage {stage.name} failed: "
+                    f"{type(e).__name__}: {e}"
+                )
+        logging.error(f"Stage {stage.name} failed: {type(error).__name__}: {error}")
+
+    threads = [threading.Thread(target=feed, name="stage-input", daemon=True)]
+    for position, stage in enumerate(stages):
+        finished, lock = [0], threading.Lock()
+        threads.extend(
+            threading.Thread(
+                target=work,
+                args=(position, stage, finished, lock),
+                name=f"stage-{stage.name}-{n}",
+                daemon=True,
+            )
+            for n in range(stage.concurrency)
+        )
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        while (item := queues[-1].get()) is not _END:
+            yield item
+        if input_errors:
+            raise input_errors[0]
+    finally:
+        cancelled.set()
+        for thread in threads:
+            thread.join(timeout=1)
@@ -1,14 +1,20 @@
 import unittest
 
+from .adaptive_limiter_tests import AdaptiveLimiterTests
+from .bulk_indexer_tests import BulkIndexerTests
 from .digital_ocean_spaces import (
     DigitalOceanSpacesIntegrationTests,
     StorageInterfaceCreationTests,
 )
+from .file_probe_tests import FileProbeTests
 from .list_gazettes_pagination_tests import (
+    DaemonGazettesListingTests,
+    GazettesClaimTests,
     GazettesListingPaginationTests,
     GazettesListingRegressionTests,
 )
 from .main_tests import MainModuleTests
+from .memory_governor_tests import MemoryGovernorTests
 from .opensearch import (
     IndexInterfaceFactoryFunctionTests,
     OpensearchBasicTests,
@@ -16,9 +22,27 @@ from .opensearch import (
 )
 from .postgresql import (
     CreationDatabaseInterfaceFunctionTests,
+    PooledPostgreSQLTests,
+    PostgreSQLChangeTests,
     PostgreSQLConnectionTests,
+    PostgreSQLCursorTests,
+    PostgreSQLNotificationTests,
     PostgreSQLTests,
 )
+from .task_utils_tests import (
+    BatchWriterTests,
+    CheckpointJournalTests,
+    CpuOffloadTests,
+    DeadlineTests,
+    GazetteRecordTests,
+    LanesTests,
+    PrefetchTests,
+    RetrySchedulerTests,
+    ShutdownTests,
+    SpillingChannelTests,
+    StagesTests,
+)
+from .text_extraction_async_task_tests import AsyncTextExtractionTaskTests
 from .text_extraction_task_tests import TextExtractionTaskTests
 from .text_extraction_tests import (
     ApacheTikaTextExtractorTest,
@@ -26,18 +50,40 @@ from .text_extraction_tests import (
 )
 
 __all__ = [
+    "AdaptiveLimiterTests",
     "ApacheTikaTextExtractorTest",
+    "AsyncTextExtractionTaskTests",
+    "BatchWriterTests",
+    "BulkIndexerTests",
+    "CheckpointJournalTests",
+    "CpuOffloadTests",
     "CreationDatabaseInterfaceFunctionTests",
+    "DaemonGazettesListingTests",
+    "DeadlineTests",
     "DigitalOceanSpacesIntegrationTests",
     "FactoryMethodApacheTikaTest",
+    "FileProbeTests",
+    "GazetteRecordTests",
+    "GazettesClaimTests",
     "GazettesListingPaginationTests",
     "GazettesListingRegressionTests",
     "IndexInterfaceFactoryFunctionTests",
+    "LanesTests",
     "MainModuleTests",
+    "MemoryGovernorTests",
     "OpensearchBasicTests",
     "OpensearchIntegrationTests",
+    "PooledPostgreSQLTests",
+    "PostgreSQLChangeTests",
     "PostgreSQLConnectionTests",
+    "PostgreSQLCursorTests",
+    "PostgreSQLNotificationTests",
     "PostgreSQLTests",
+    "PrefetchTests",
+    "RetrySchedulerTests",
+    "ShutdownTests",
+    "SpillingChannelTests",
+    "StagesTests",
     "StorageInterfaceCreationTests",
     "TextExtractionTaskTests",
     "unittest",
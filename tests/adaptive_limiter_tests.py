@@ -0,0 +1,105 @@
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from monitoring.limiter import AdaptiveLimiter, NoLimiter, get_adaptive_limiter
+
+
+class AdaptiveLimiterTests(TestCase):
+    def build_limiter(self, initial=4, **kwargs):
+        return AdaptiveLimiter(
+            "backend",
+            initial=initial,
+            maximum=8,
+            target_latency=1.0,
+            window=4,
+            **kwargs,
+        )
+
+    def run_calls(self, limiter, latencies, concurrent):
+        """
+        Releases calls with the given latencies, keeping concurrent of them in
+        flight before each release
+        """
+        for latency in latencies:
+            while limiter.in_flight < concurrent:
+                limiter.acquire()
+            limiter.release(latency)
+
+    def test_raises_limit_when_saturated_within_target(self):
+        limiter = self.build_limiter()
+        self.run_calls(limiter, [0.5] * 4, concurrent=4)
+        self.assertEqual(limiter.limit, 5)
+
+    def test_keeps_limit_when_not_saturated(self):
+        limiter = self.build_limiter()
+        self.run_calls(limiter, [0.5] * 4, concurrent=1)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_lowers_limit_when_p95_over_target(self):
+        limiter = self.build_limiter()
+        self.run_calls(limiter, [0.5, 0.5, 0.5, 3.0], concurrent=4)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_halves_limit_once_per_window_on_overload(self):
+        limiter = self.build_limiter(initial=8)
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(0.1, overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_never_goes_below_minimum(self):
+        limiter = self.build_limiter(initial=1)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_only_overload_errors_cut_the_limit(self):
+        limiter = self.build_limiter(
+            initial=8, is_overload=lambda error: isinstance(error, TimeoutError)
+        )
+        with self.assertRaises(ValueError):
+            with limiter.slot():
+                raise ValueError("bad file")
+        self.assertEqual(limiter.limit, 8)
+
+        with self.assertRaises(TimeoutError):
+            with limiter.slot():
+                raise TimeoutError()
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_calls_over_limit_wait_for_a_slot(self):
+        limiter = self.build_limiter(initial=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def call():
+            limiter.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release(0.1)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    @patch.dict("os.environ", {"ADAPTIVE_CONCURRENCY": "false"})
+    def test_disabled_returns_no_limiter(self):
+        limiter = get_adaptive_limiter("tika", maximum=10, target_latency=60)
+        self.assertIsInstance(limiter, NoLimiter)
+        with limiter.slot() as slot:
+            slot.mark_overloaded()
+
+    @patch.dict(
+        "os.environ",
+        {"ADAPTIVE_CONCURRENCY": "true", "ADAPTIVE_STORAGE_TEST_MAX": "3"},
+    )
+    def test_enabled_limiter_is_shared_and_configured(self):
+        limiter = get_adaptive_limiter("storage_test", maximum=64, target_latency=10)
+        self.assertIs(
+            limiter, get_adaptive_limiter("storage_test", maximum=64, target_latency=10)
+        )
+        self.assertEqual(limiter.maximum, 3)
+        self.assertEqual(limiter.limit, 3)
@@ -0,0 +1,143 @@
+import json
+from datetime import date
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from index import BulkIndexer, BulkIndexError, IndexInterface
+
+
+def bulk_response(*statuses):
+    return {
+        "errors": any(status >= 300 for status in statuses),
+        "items": [{"index": {"status": status}} for status in statuses],
+    }
+
+
+def sent_ids(body):
+    lines = body.splitlines()
+    return [json.loads(action)["index"]["_id"] for action in lines[::2]]
+
+
+class BulkIndexerTests(TestCase):
+    def setUp(self):
+        self.index = MagicMock(spec=IndexInterface)
+        self.index.bulk.side_effect = lambda body, refresh: bulk_response(
+            *[201] * len(sent_ids(body))
+        )
+
+    def test_sends_request_when_document_count_is_reached(self):
+        indexer = BulkIndexer(self.index, max_documents=2)
+
+        indexer.add({"text": "a"}, document_id="1")
+        self.index.bulk.assert_not_called()
+        indexer.add({"text": "b"}, document_id="2")
+
+        self.index.bulk.assert_called_once()
+        self.assertEqual(sent_ids(self.index.bulk.call_args.args[0]), ["1", "2"])
+
+    def test_sends_request_when_byte_size_is_reached(self):
+        indexer = BulkIndexer(self.index, max_documents=100, max_bytes=100)
+
+        indexer.add({"text": "a" * 30}, document_id="1")
+        self.index.bulk.assert_not_called()
+        indexer.add({"text": "b" * 30}, document_id="2")
+
+        self.index.bulk.assert_called_once()
+
+    def test_flush_at_the_end_of_the_block(self):
+        with BulkIndexer(self.index) as indexer:
+            indexer.add({"date": date(2020, 10, 18)}, document_id="1", index="theme")
+
+        body = self.index.bulk.call_args.args[0]
+        action, document = body.splitlines()
+        self.assertEqual(json.loads(action), {"index": {"_id": "1", "_index": "theme"}})
+        self.assertEqual(json.loads(document), {"date": "2020-10-18"})
+
+    def test_retries_only_rejected_documents(self):
+        self.index.bulk.side_effect = [
+            bulk_response(201, 429, 201),
+            bulk_response(201),
+        ]
+        indexer = BulkIndexer(self.index, retry_base_delay=0)
+        for document_id in ("1", "2", "3"):
+            indexer.add({}, document_id=document_id)
+
+        indexer.flush()
+
+        self.assertEqual(self.index.bulk.call_count, 2)
+        self.assertEqual(sent_ids(self.index.bulk.call_args.args[0]), ["2"])
+
+    def test_flush_reports_documents_that_could_not_be_indexed(self):
+        self.index.bulk.side_effect = [bulk_response(201, 400)]
+        indexer = BulkIndexer(self.index, retry_base_delay=0)
+        indexer.add({}, document_id="1")
+        indexer.add({}, document_id="2")
+
+        with self.assertRaises(BulkIndexError) as context:
+            indexer.flush()
+
+        self.assertEqual(self.index.bulk.call_count, 1)
+        self.assertEqual([f["id"] for f in context.exception.failures], ["2"])
+
+    def test_gives_up_retrying_after_max_retries(self):
+        self.index.bulk.side_effect = lambda body, refresh: bulk_response(429)
+        indexer = BulkIndexer(self.index, max_retries=2, retry_base_delay=0)
+        indexer.add({}, document_id="1")
+
+        with self.assertRaises(BulkIndexError):
+            indexer.flush()
+
+        self.assertEqual(self.index.bulk.call_count, 3)
+
+    def test_retries_failed_requests(self):
+        self.index.bulk.side_effect = [ConnectionError("reset"), bulk_response(201)]
+        indexer = BulkIndexer(self.index, retry_base_delay=0)
+        indexer.add({}, document_id="1")
+
+        indexer.flush()
+
+        self.assertEqual(self.index.bulk.call_count, 2)
+        self.assertEqual(sent_ids(self.index.bulk.call_args.args[0]), ["1"])
+
+    def test_keeps_documents_of_request_that_still_failed(self):
+        self.index.bulk.side_effect = ConnectionError("reset")
+        indexer = BulkIndexer(self.index, max_retries=1, retry_base_delay=0)
+        indexer.add({}, document_id="1")
+
+        with self.assertRaises(ConnectionError):
+            indexer.flush()
+        self.index.bulk.side_effect = lambda body, refresh: bulk_response(201)
+        indexer.add({}, document_id="2")
+        indexer.flush()
+
+        self.assertEqual(sent_ids(self.index.bulk.call_args.args[0]), ["1", "2"])
+
+    def test_reports_documents_of_request_rejected_by_the_index(self):
+        error = Exception("request entity too large")
+        error.status_code = 413
+        self.index.bulk.side_effect = error
+        indexer = BulkIndexer(self.index, retry_base_delay=0)
+        indexer.add({}, document_id="1")
+
+        with self.assertRaises(BulkIndexError) as context:
+            indexer.flush()
+        self.assertEqual(context.exception.failures[0]["status"], 413)
+        self.index.bulk.side_effect = lambda body, refresh: bulk_response(201)
+        indexer.add({}, document_id="2")
+        indexer.flush()
+
+        self.assertEqual(self.index.bulk.call_count, 2)
+        self.assertEqual(sent_ids(self.index.bulk.call_args.args[0]), ["2"])
+
+    def test_request_is_sent_without_holding_the_lock(self):
+        indexer = BulkIndexer(self.index, max_documents=1)
+
+        def bulk(body, refresh):
+            self.assertFalse(indexer._lock.locked())
+            return bulk_response(201)
+
+        self.index.bulk.side_effect = bulk
+        indexer.add({}, document_id="1")
+        indexer.flush()
+
+        self.index.bulk.assert_called_once()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import magic
+
+from data_extraction import FileProbe, ProbingWriter
+
+
+class FileProbeTests(TestCase):
+    def setUp(self):
+        self.tmpfile = tempfile.NamedTemporaryFile(delete=False)
+
+    def tearDown(self):
+        self.tmpfile.close()
+        os.remove(self.tmpfile.name)
+
+    def download(self, source, file_key, header_size=64 * 1024, chunk_size=1000):
+        with open(source, "rb") as f:
+            content = f.read()
+        writer = ProbingWriter(self.tmpfile, file_key, header_size=header_size)
+        for start in range(0, len(content), chunk_size):
+            writer.write(content[start : start + chunk_size])
+        self.tmpfile.close()
+        return writer, content
+
+    def test_probe_uses_bytes_seen_while_downloading(self):
+        writer, content = self.download("tests/data/fake_gazette.pdf", "a/b.pdf")
+
+        with patch("magic.from_file") as from_file:
+            probe = writer.probe(self.tmpfile.name)
+
+        from_file.assert_not_called()
+        self.assertTrue(probe.is_pdf())
+        self.assertTrue(probe.is_supported())
+        self.assertEqual(probe.size, len(content))
+        self.assertEqual(probe.path, self.tmpfile.name)
+
+    def test_header_is_kept_when_ranges_are_written_out_of_order(self):
+        with open("tests/data/fake_gazette.pdf", "rb") as f:
+            content = f.read()
+        writer = ProbingWriter(self.tmpfile, "a/b.pdf", header_size=4096)
+        writer.seek(2000)
+        writer.write(content[2000:])
+        writer.seek(0)
+        writer.write(content[:2000])
+        self.tmpfile.close()
+
+        probe = writer.probe(self.tmpfile.name)
+
+        self.assertTrue(probe.is_pdf())
+        self.assertEqual(probe.size, len(content))
+        with open(self.tmpfile.name, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_ambiguous_header_is_confirmed_with_the_whole_file(self):
+        writer, _ = self.download(
+            "tests/data/fake_gazette.doc", "a/b.bin", header_size=2048
+        )
+
+        with patch("magic.from_file", wraps=magic.from_file) as from_file:
+            probe = writer.probe(self.tmpfile.name)
+
+        from_file.assert_called_once_with(self.tmpfile.name, mime=True)
+        self.assertTrue(probe.is_doc())
+
+    def test_hint_agreeing_with_ambiguous_header_skips_whole_file_read(self):
+        writer = ProbingWriter(self.tmpfile, "a/b.zip", header_size=4)
+        writer.write(b"PK\x03\x04" + b"\x00" * 100)
+        self.tmpfile.close()
+
+        with patch("magic.from_buffer", return_value="application/zip"):
+            with patch("magic.from_file") as from_file:
+                probe = writer.probe(self.tmpfile.name)
+
+        from_file.assert_not_called()
+        self.assertTrue(probe.is_zip())
+
+    def test_generic_header_is_confirmed_with_the_whole_file(self):
+        writer = ProbingWriter(self.tmpfile, "a/b.txt", header_size=4)
+        writer.write(b"text" + b"\x00" * 100)
+        self.tmpfile.close()
+
+        with patch("magic.from_buffer", return_value="text/plain"):
+            with patch("magic.from_file", return_value="application/octet-stream"):
+                probe = writer.probe(self.tmpfile.name)
+
+        self.assertEqual(probe.mime_type, "application/octet-stream")
+        self.assertFalse(probe.is_supported())
+
+    def test_probe_from_file(self):
+        probe = FileProbe.from_file("tests/data/fake_gazette.txt")
+
+        self.assertTrue(probe.is_txt())
+        self.assertEqual(probe.size, os.path.getsize("tests/data/fake_gazette.txt"))
@@ -4,7 +4,7 @@ Testes para as funções de listagem de gazettes com paginação
 Inclui testes de regressão para garantir que:
 1. A paginação funciona corretamente
 2. database.select() é chamado com assinatura correta
-3. Queries SQL contêm LIMIT e OFFSET corretos
+3. Queries SQL contêm LIMIT e o id de início da página (keyset) corretos
 4. Não há tentativa de passar parâmetros separados para select()
 """
 
@@ -14,11 +14,15 @@ from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 from tasks.list_gazettes_to_be_processed import (
+    claim_unprocessed_gazettes,
     get_all_gazettes_extracted,
+    get_gazette_id_watermark,
     get_gazettes_extracted_since_yesterday,
     get_gazettes_to_be_processed,
+    get_new_gazettes,
     get_unprocessed_gazettes,
 )
+from tasks.utils import GazetteRecord, clear_shutdown_request, request_shutdown
 
 
 class GazettesListingPaginationTests(TestCase):
@@ -34,7 +38,6 @@ class GazettesListingPaginationTests(TestCase):
         # Mock data - simula resultados do banco
         self.sample_gazette_row = (
             1,  # id
-            "",  # source_text
             date(2020, 10, 18),  # date
             "1",  # edition_number
             False,  # is_extra_edition
@@ -86,10 +89,13 @@ class GazettesListingPaginationTests(TestCase):
                 msg=f"select() não deve receber kwargs, recebeu {kwargs}",
             )
 
+    def gazette_row_with_id(self, gazette_id):
+        return (gazette_id,) + self.sample_gazette_row[1:]
+
     @patch.dict("os.environ", {"GAZETTE_QUERY_PAGE_SIZE": "100"})
-    def test_get_unprocessed_gazettes_queries_contain_limit_and_offset(self):
+    def test_get_unprocessed_gazettes_queries_contain_limit_without_offset(self):
         """
-        Testa que as queries SQL contêm LIMIT e OFFSET corretos
+        Testa que as queries SQL contêm LIMIT correto e não usam OFFSET
         REGRESSÃO: Garante que os valores são embutidos no SQL (f-string), não passados como parâmetros
         """
         # Simula uma página com resultados
@@ -105,16 +111,19 @@ class GazettesListingPaginationTests(TestCase):
         first_call_args = self.database_mock.select.call_args_list[0]
         sql_command = first_call_args[0][0]  # Primeiro argumento posicional
 
-        # CRÍTICO: Verifica que LIMIT e OFFSET estão no SQL
+        # CRÍTICO: Verifica que LIMIT está no SQL e a primeira página não tem keyset
         self.assertIn("LIMIT 100", sql_command, "SQL deve conter 'LIMIT 100'")
-        self.assertIn("OFFSET 0", sql_command, "SQL deve conter 'OFFSET 0'")
+        self.assertNotIn("OFFSET", sql_command, "SQL não deve usar OFFSET")
+        self.assertNotIn(
+            "gazettes.id <", sql_command, "Primeira página não deve ter keyset"
+        )
 
         # CRÍTICO: Verifica que NÃO usa placeholders de parâmetros
         self.assertNotIn(
             "%(limit)s", sql_command, "SQL não deve usar placeholder %(limit)s"
         )
         self.assertNotIn(
-            "%(offset)s", sql_command, "SQL não deve usar placeholder %(offset)s"
+            "%(last_id)s", sql_command, "SQL não deve usar placeholder %(last_id)s"
         )
 
     @patch.dict("os.environ", {"GAZETTE_QUERY_PAGE_SIZE": "3"})
@@ -157,28 +166,52 @@ class GazettesListingPaginationTests(TestCase):
         self.assertEqual(self.database_mock.select.call_count, 1)
 
     @patch.dict("os.environ", {"GAZETTE_QUERY_PAGE_SIZE": "2"})
-    def test_get_unprocessed_gazettes_offset_increments_correctly(self):
+    def test_get_unprocessed_gazettes_pages_start_below_last_id(self):
         """
-        Testa que o OFFSET incrementa corretamente a cada página
+        Testa que cada página começa abaixo do último id da página anterior
         """
         self.database_mock.select.side_effect = [
-            [self.sample_gazette_row, self.sample_gazette_row],  # Página 1
-            [self.sample_gazette_row, self.sample_gazette_row],  # Página 2
-            [self.sample_gazette_row],  # Página 3
+            [self.gazette_row_with_id(9), self.gazette_row_with_id(7)],  # Página 1
+            [self.gazette_row_with_id(6), self.gazette_row_with_id(3)],  # Página 2
+            [self.gazette_row_with_id(1)],  # Página 3
         ]
 
-        list(get_unprocessed_gazettes(self.database_mock))
+        result = list(get_unprocessed_gazettes(self.database_mock))
 
-        # Verifica os OFFSETs nas chamadas
+        self.assertEqual([gazette["id"] for gazette in result], [9, 7, 6, 3, 1])
+
+        # Verifica o keyset nas chamadas
         calls = self.database_mock.select.call_args_list
 
         sql_1 = calls[0][0][0]
         sql_2 = calls[1][0][0]
         sql_3 = calls[2][0][0]
 
-        self.assertIn("OFFSET 0", sql_1, "Primeira página deve ter OFFSET 0")
-        self.assertIn("OFFSET 2", sql_2, "Segunda página deve ter OFFSET 2")
-        self.assertIn("OFFSET 4", sql_3, "Terceira página deve ter OFFSET 4")
+        self.assertNotIn("gazettes.id <", sql_1, "Primeira página não tem keyset")
+        self.assertIn("gazettes.id < 7", sql_2, "Segunda página começa abaixo de 7")
+        self.assertIn("gazettes.id < 3", sql_3, "Terceira página começa abaixo de 3")
+
+    @patch.dict("os.environ", {"GAZETTE_QUERY_PAGE_SIZE": "1"})
+    def test_all_listing_modes_use_keyset_pagination(self):
+        """
+        Testa que os três modos de listagem paginam por keyset
+        """
+        for list_gazettes in (
+            get_all_gazettes_extracted,
+            get_gazettes_extracted_since_yesterday,
+            get_unprocessed_gazettes,
+        ):
+            self.database_mock.reset_mock()
+            self.database_mock.select.side_effect = [
+                [self.gazette_row_with_id(5)],
+                [],
+            ]
+
+            list(list_gazettes(self.database_mock))
+
+            sql_command = self.database_mock.select.call_args[0][0]
+            self.assertIn("gazettes.id < 5", sql_command)
+            self.assertNotIn("OFFSET", sql_command)
 
     @patch.dict("os.environ", {"GAZETTE_QUERY_PAGE_SIZE": "5"})
     def test_get_all_gazettes_extracted_uses_pagination(self):
@@ -235,6 +268,19 @@ class GazettesListingPaginationTests(TestCase):
         list(get_gazettes_to_be_processed("DAILY", self.database_mock))
         self.assertTrue(self.database_mock.select.called)
 
+    def test_dead_letters_mode_lists_recorded_gazettes(self):
+        """
+        Testa que o modo DEAD_LETTERS lista só os diários da tabela de dead letters
+        """
+        self.database_mock.select.return_value = [self.sample_gazette_row]
+
+        result = list(get_gazettes_to_be_processed("DEAD_LETTERS", self.database_mock))
+
+        self.assertEqual(len(result), 1)
+        command = self.database_mock.select.call_args.args[0]
+        self.assertIn("SELECT gazette_id FROM gazette_dead_letters", command)
+        self.assertEqual(len(self.database_mock.select.call_args.args), 1)
+
     def test_get_gazettes_to_be_processed_raises_on_invalid_mode(self):
         """
         Testa que levanta exceção para modo inválido
@@ -272,8 +318,8 @@ class GazettesListingPaginationTests(TestCase):
         self.assertEqual(len(result), 1)
         gazette = result[0]
 
-        # Verifica estrutura do dicionário
-        self.assertIsInstance(gazette, dict)
+        # Verifica estrutura do registro
+        self.assertIsInstance(gazette, GazetteRecord)
         self.assertIn("id", gazette)
         self.assertIn("file_checksum", gazette)
         self.assertIn("file_path", gazette)
@@ -281,6 +327,20 @@ class GazettesListingPaginationTests(TestCase):
         self.assertIn("processed", gazette)
         self.assertEqual(gazette["id"], 1)
         self.assertEqual(gazette["file_checksum"], "checksum-123")
+        self.assertEqual(gazette["territory_name"], "Test City")
+        self.assertEqual(gazette["state_code"], "SC")
+        self.assertEqual(gazette["source_text"], "")
+
+    def test_listing_does_not_read_stored_source_text(self):
+        """
+        Testa que o texto já armazenado não é lido, pois a extração o substitui
+        """
+        self.database_mock.select.return_value = []
+
+        list(get_unprocessed_gazettes(self.database_mock))
+
+        sql_command = self.database_mock.select.call_args[0][0]
+        self.assertNotIn("source_text", sql_command)
 
 
 class GazettesListingRegressionTests(TestCase):
@@ -327,21 +387,163 @@ class GazettesListingRegressionTests(TestCase):
 
         sql_command = database_mock.select.call_args[0][0]
 
-        # Verifica que LIMIT e OFFSET são números inteiros no SQL
+        # Verifica que LIMIT é um número inteiro no SQL
         import re
 
         limit_match = re.search(r"LIMIT\s+(\d+)", sql_command)
-        offset_match = re.search(r"OFFSET\s+(\d+)", sql_command)
 
         self.assertIsNotNone(limit_match, "SQL deve conter LIMIT com valor numérico")
-        self.assertIsNotNone(offset_match, "SQL deve conter OFFSET com valor numérico")
 
-        # Verifica que são números válidos
+        # Verifica que é um número válido
         limit_value = int(limit_match.group(1))
-        offset_value = int(offset_match.group(1))
 
         self.assertGreater(limit_value, 0, "LIMIT deve ser positivo")
-        self.assertGreaterEqual(offset_value, 0, "OFFSET deve ser não-negativo")
+
+
+class GazettesClaimTests(TestCase):
+    """
+    Testes do modo CLAIM, em que vários workers dividem a fila de diários
+    """
+
+    def setUp(self):
+        self.database_mock = MagicMock()
+        self.sample_gazette_row = (
+            1,
+            date(2020, 10, 18),
+            "1",
+            False,
+            "executive",
+            "checksum-123",
+            "path/to/file.pdf",
+            "http://example.com/file.pdf",
+            datetime.now(),
+            datetime.now(),
+            "3550308",
+            False,
+            "Test City",
+            "SC",
+        )
+
+    @patch.dict(
+        "os.environ",
+        {
+            "GAZETTE_CLAIM_BATCH_SIZE": "2",
+            "GAZETTE_LEASE_SECONDS": "600",
+            "WORKER_ID": "worker-1",
+        },
+    )
+    def test_claims_batches_until_none_is_left(self):
+        self.database_mock.update_returning.side_effect = [
+            [self.sample_gazette_row] * 2,
+            [self.sample_gazette_row],
+            [],
+        ]
+
+        result = list(claim_unprocessed_gazettes(self.database_mock))
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[0]["file_checksum"], "checksum-123")
+        self.assertEqual(self.database_mock.update_returning.call_count, 3)
+        command, data = self.database_mock.update_returning.call_args.args
+        self.assertIn("FOR UPDATE OF gazettes SKIP LOCKED", command)
+        self.assertEqual(
+            data, {"batch_size": 2, "worker_id": "worker-1", "lease_seconds": 600}
+        )
+        self.database_mock.select.assert_not_called()
+
+    def test_get_gazettes_to_be_processed_routes_claim_mode(self):
+        self.database_mock.update_returning.return_value = []
+
+        list(get_gazettes_to_be_processed("CLAIM", self.database_mock))
+
+        self.database_mock.update_returning.assert_called_once()
+
+    def test_failed_claim_is_claimed_again(self):
+        """
+        Uma reivindicação perdida com a conexão é refeita pelo listador
+        """
+        self.database_mock.update_returning.side_effect = [
+            Exception("server closed the connection"),
+            [self.sample_gazette_row],
+            [],
+        ]
+
+        result = list(claim_unprocessed_gazettes(self.database_mock))
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(self.database_mock.update_returning.call_count, 3)
+
+    def test_no_batch_is_claimed_after_shutdown(self):
+        """
+        Após o SIGTERM, o worker não reivindica novos lotes
+        """
+        self.addCleanup(clear_shutdown_request)
+        self.database_mock.update_returning.return_value = [self.sample_gazette_row]
+
+        claimed = claim_unprocessed_gazettes(self.database_mock)
+        next(claimed)
+        request_shutdown()
+
+        self.assertEqual(list(claimed), [])
+        self.database_mock.update_returning.assert_called_once()
+
+
+class DaemonGazettesListingTests(TestCase):
+    """
+    Testes das consultas do pipeline daemon
+    """
+
+    def test_new_gazettes_come_after_the_last_id_seen(self):
+        database_mock = MagicMock()
+        database_mock.select.return_value = iter(
+            [
+                (
+                    42,
+                    date(2020, 10, 18),
+                    "1",
+                    False,
+                    "executive",
+                    "checksum-123",
+                    "path/to/file.pdf",
+                    "http://example.com/file.pdf",
+                    datetime.now(),
+                    datetime.now(),
+                    "3550308",
+                    False,
+                    "Test City",
+                    "SC",
+                )
+            ]
+        )
+
+        gazettes = get_new_gazettes(database_mock, 41, 50)
+
+        self.assertEqual(len(gazettes), 1)
+        self.assertEqual(gazettes[0]["file_checksum"], "checksum-123")
+        command = database_mock.select.call_args.args[0]
+        self.assertIn("gazettes.id > 41", command)
+        self.assertIn("gazettes.processed is False", command)
+        self.assertIn("ORDER BY gazettes.id ASC", command)
+        self.assertIn("LIMIT 50", command)
+        self.assertNotIn("gazette_dead_letters", command)
+
+    def test_retried_gazettes_leave_out_dead_letters(self):
+        database_mock = MagicMock()
+        database_mock.select.return_value = iter([])
+
+        get_new_gazettes(database_mock, 41, 50, up_to_id=99, skip_dead_letters=True)
+
+        command = database_mock.select.call_args.args[0]
+        self.assertIn("gazettes.id <= 99", command)
+        self.assertIn("NOT EXISTS", command)
+        self.assertIn("gazette_dead_letters.gazette_id = gazettes.id", command)
+
+    def test_watermark_looks_back_the_given_hours(self):
+        database_mock = MagicMock()
+        database_mock.select.return_value = iter([(1234,)])
+
+        self.assertEqual(get_gazette_id_watermark(database_mock, 24), 1234)
+        self.assertIn("interval '24 hours'", database_mock.select.call_args.args[0])
 
 
 if __name__ == "__main__":
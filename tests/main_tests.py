@@ -1,8 +1,26 @@
 import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from main import enable_debug_if_necessary
+from main.__main__ import (
+    extract_themes_from_gazettes,
+    follow_new_gazettes,
+    handle_grace_period_expired,
+    handle_termination,
+    process_gazettes_batch,
+    wait_for_interrupted_themes,
+    wait_for_new_gazettes,
+)
+from tasks.utils import (
+    ShutdownTimeout,
+    clear_shutdown_request,
+    request_shutdown,
+    shutdown_requested,
+)
 
 
 class MainModuleTests(TestCase):
@@ -42,3 +60,200 @@ class MainModuleTests(TestCase):
         with patch("logging.debug") as mock:
             enable_debug_if_necessary()
             mock.assert_not_called()
+
+    @patch.dict("os.environ", {"SHUTDOWN_GRACE_PERIOD": "10"})
+    @patch("signal.setitimer")
+    @patch("signal.signal")
+    def test_sigterm_requests_shutdown_with_grace_period(self, signal_mock, timer_mock):
+        self.addCleanup(clear_shutdown_request)
+
+        handle_termination(signal.SIGTERM, None)
+        handle_termination(signal.SIGTERM, None)
+
+        self.assertTrue(shutdown_requested())
+        signal_mock.assert_called_once_with(signal.SIGALRM, handle_grace_period_expired)
+        timer_mock.assert_called_once_with(signal.ITIMER_REAL, 10.0)
+
+    def test_grace_period_expiry_interrupts_the_pipeline(self):
+        with self.assertRaises(ShutdownTimeout):
+            handle_grace_period_expired(signal.SIGALRM, None)
+
+    @patch("signal.getitimer", return_value=(0.1, 0.0))
+    def test_interrupted_themes_are_waited_within_the_grace_period(self, _):
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(release.set)
+
+        wait_for_interrupted_themes(executor.submit(lambda: None))
+        with self.assertRaises(ShutdownTimeout):
+            wait_for_interrupted_themes(executor.submit(release.wait))
+
+    @patch("main.__main__.run_task")
+    def test_themes_run_on_each_batch_of_gazettes(self, run_task_mock):
+        run_task_mock.side_effect = lambda name, theme, ids, index: (
+            ["excerpt"] if name == "extract_themed_excerpts_from_gazettes" else None
+        )
+        themes = [{"index": "theme-a"}, {"index": "theme-b"}]
+
+        extract_themes_from_gazettes(themes, iter([["g1", "g2"], ["g3"]]), MagicMock())
+
+        extracted = [
+            (call.args[1]["index"], call.args[2])
+            for call in run_task_mock.call_args_list
+            if call.args[0] == "extract_themed_excerpts_from_gazettes"
+        ]
+        self.assertEqual(
+            extracted,
+            [
+                ("theme-a", ["g1", "g2"]),
+                ("theme-b", ["g1", "g2"]),
+                ("theme-a", ["g3"]),
+                ("theme-b", ["g3"]),
+            ],
+        )
+        self.assertEqual(run_task_mock.call_count, 12)
+
+    @patch("main.__main__.run_task")
+    def test_gazettes_index_is_refreshed_before_each_themes_batch(self, run_task_mock):
+        calls = []
+        index = MagicMock()
+        index.refresh_index.side_effect = lambda: calls.append("refresh")
+        run_task_mock.side_effect = lambda name, theme, ids, index: calls.append(
+            (name, ids)
+        )
+
+        extract_themes_from_gazettes(
+            [{"index": "theme-a"}], iter([["g1"], ["g2"]]), index
+        )
+
+        self.assertEqual(
+            calls,
+            [
+                "refresh",
+                ("extract_themed_excerpts_from_gazettes", ["g1"]),
+                "refresh",
+                ("extract_themed_excerpts_from_gazettes", ["g2"]),
+            ],
+        )
+
+    def test_new_gazettes_wait_ends_on_notification(self):
+        database = MagicMock()
+        database.wait_for_notification.side_effect = [False, True]
+
+        self.assertTrue(wait_for_new_gazettes(database, "new_gazettes", 60))
+        database.wait_for_notification.assert_called_with("new_gazettes", 1.0)
+
+    def test_new_gazettes_wait_ends_on_shutdown(self):
+        self.addCleanup(clear_shutdown_request)
+        database = MagicMock()
+        database.wait_for_notification.side_effect = lambda channel, timeout: (
+            request_shutdown()
+        )
+
+        self.assertFalse(wait_for_new_gazettes(database, "new_gazettes", 60))
+        database.wait_for_notification.assert_called_once()
+
+    @patch.dict(
+        "os.environ", {"DAEMON_RETRY_INTERVAL": "0", "DAEMON_POLL_INTERVAL": "0"}
+    )
+    @patch("main.__main__.run_task")
+    def test_daemon_retries_gazette_failed_in_batch(self, run_task_mock):
+        self.addCleanup(clear_shutdown_request)
+        unprocessed = {11, 12, 13}
+
+        def get_new_gazettes(task, database, after_id, limit, up_to_id=None, **kwargs):
+            return [
+                {"id": gazette_id}
+                for gazette_id in sorted(unprocessed)
+                if gazette_id > after_id
+                and (up_to_id is None or gazette_id <= up_to_id)
+            ][:limit]
+
+        run_task_mock.side_effect = get_new_gazettes
+        batches = []
+
+        def process_batch(gazettes):
+            ids = [gazette["id"] for gazette in gazettes]
+            batches.append(ids)
+            if len(batches) == 1:
+                # Gazette 12 fails, so it stays unprocessed
+                unprocessed.difference_update({11, 13})
+            else:
+                unprocessed.difference_update(ids)
+                request_shutdown()
+
+        follow_new_gazettes(MagicMock(), 10, process_batch)
+
+        self.assertEqual(batches, [[11, 12, 13], [12]])
+        self.assertEqual(unprocessed, set())
+
+    @patch.dict(
+        "os.environ",
+        {
+            "DAEMON_RETRY_INTERVAL": "0",
+            "DAEMON_POLL_INTERVAL": "0",
+            "DAEMON_RETRY_ATTEMPTS": "2",
+            "EXTRACTION_DEAD_LETTERS": "true",
+        },
+    )
+    @patch("main.__main__.run_task")
+    def test_daemon_stops_retrying_gazette_that_keeps_failing(self, run_task_mock):
+        self.addCleanup(clear_shutdown_request)
+        queries = []
+
+        def get_new_gazettes(task, database, after_id, limit, up_to_id=None, **kwargs):
+            queries.append(dict(kwargs, up_to_id=up_to_id))
+            if len(queries) > 20:
+                request_shutdown()
+            return [
+                {"id": gazette_id}
+                for gazette_id in (11, 12)
+                if gazette_id > after_id
+                and (up_to_id is None or gazette_id <= up_to_id)
+            ][:limit]
+
+        run_task_mock.side_effect = get_new_gazettes
+        batches = []
+
+        follow_new_gazettes(
+            MagicMock(),
+            10,
+            lambda gazettes: batches.append([gazette["id"] for gazette in gazettes]),
+        )
+
+        # Both gazettes fail every time: retried twice, then left alone
+        self.assertEqual(batches, [[11, 12], [11, 12], [11, 12]])
+        self.assertIn({"up_to_id": 12, "skip_dead_letters": True}, queries)
+
+    @patch("main.__main__.run_task")
+    def test_daemon_batch_themes_see_the_gazettes_just_indexed(self, run_task_mock):
+        calls = []
+        index = MagicMock()
+        index.refresh_index.side_effect = lambda: calls.append("refresh")
+
+        def run_task(name, *args):
+            calls.append(name)
+            if name == "extract_text_from_gazettes":
+                return ["checksum-1"]
+
+        run_task_mock.side_effect = run_task
+
+        process_gazettes_batch(
+            [{"id": 1}],
+            [{"index": "theme-a"}],
+            [],
+            MagicMock(),
+            MagicMock(),
+            index,
+            MagicMock(),
+        )
+
+        self.assertEqual(
+            calls,
+            [
+                "extract_text_from_gazettes",
+                "refresh",
+                "extract_themed_excerpts_from_gazettes",
+            ],
+        )
@@ -0,0 +1,52 @@
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from monitoring.memory import MemoryGovernor, read_cgroup_memory_limit
+
+
+class MemoryGovernorTests(TestCase):
+    def build_governor(self):
+        return MemoryGovernor(
+            1000,
+            high_watermark=0.5,
+            critical_watermark=0.8,
+            sample_interval=0,
+            collect_interval=0,
+        )
+
+    def test_reads_cgroup_v2_limit(self):
+        with tempfile.NamedTemporaryFile("w") as limit_file:
+            limit_file.write("2147483648\n")
+            limit_file.flush()
+            with patch("monitoring.memory.CGROUP_V2_MEMORY_LIMIT", limit_file.name):
+                self.assertEqual(read_cgroup_memory_limit(), 2147483648)
+
+    def test_unlimited_cgroup_returns_none(self):
+        with tempfile.NamedTemporaryFile("w") as limit_file:
+            limit_file.write("max\n")
+            limit_file.flush()
+            with patch("monitoring.memory.CGROUP_V2_MEMORY_LIMIT", limit_file.name):
+                self.assertIsNone(read_cgroup_memory_limit())
+
+    @patch("monitoring.memory.gc.collect")
+    @patch("monitoring.memory.read_process_rss", return_value=400)
+    def test_does_not_collect_below_high_watermark(self, rss_mock, collect_mock):
+        self.assertFalse(self.build_governor().maybe_collect())
+        collect_mock.assert_not_called()
+
+    @patch("monitoring.memory.gc.collect")
+    @patch("monitoring.memory.read_process_rss", return_value=600)
+    def test_collects_above_high_watermark(self, rss_mock, collect_mock):
+        self.assertTrue(self.build_governor().maybe_collect())
+        collect_mock.assert_called_once()
+
+    @patch("monitoring.memory.time.sleep")
+    @patch("monitoring.memory.gc.collect")
+    @patch(
+        "monitoring.memory.read_process_rss", side_effect=[900, 900, 900] + [100] * 10
+    )
+    def test_throttle_waits_for_headroom(self, rss_mock, collect_mock, sleep_mock):
+        items = list(self.build_governor().throttle(["gazette"]))
+        self.assertEqual(items, ["gazette"])
+        sleep_mock.assert_called()
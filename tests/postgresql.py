@@ -1,12 +1,19 @@
 import os
+import threading
 import uuid
 from datetime import date, datetime
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import psycopg2
+from psycopg2 import sql
 
-from database import DatabaseInterface, PostgreSQL, create_database_interface
+from database import (
+    DatabaseInterface,
+    PooledPostgreSQL,
+    PostgreSQL,
+    create_database_interface,
+)
 
 
 def get_database_name():
@@ -51,6 +58,288 @@ class CreationDatabaseInterfaceFunctionTests(TestCase):
             )
 
 
+@patch.dict(
+    "os.environ",
+    {
+        "POSTGRES_DB": "db",
+        "POSTGRES_USER": "user",
+        "POSTGRES_PASSWORD": "pass",
+        "POSTGRES_HOST": "localhost",
+        "POSTGRES_PORT": "9999",
+        "POSTGRES_CURSOR_ITERSIZE": "500",
+    },
+)
+class PostgreSQLCursorTests(TestCase):
+    def test_select_streams_rows_from_server_side_cursor(self):
+        with patch("psycopg2.connect") as connect:
+            connection = connect.return_value
+            cursor = connection.cursor.return_value
+            cursor.fetchmany.side_effect = [[(1,), (2,)], []]
+
+            rows = list(create_database_interface().select("SELECT id FROM gazettes"))
+
+        self.assertEqual(rows, [(1,), (2,)])
+        cursor.fetchmany.assert_called_with(500)
+        cursor.close.assert_called_once()
+        cursor_kwargs = connection.cursor.call_args.kwargs
+        self.assertTrue(cursor_kwargs["name"])
+        self.assertTrue(cursor_kwargs["withhold"])
+        self.assertEqual(connection.cursor.return_value.itersize, 500)
+
+    @patch.dict("os.environ", {"POSTGRES_CURSOR_ITERSIZE": "0"})
+    def test_select_uses_client_side_cursor_when_itersize_is_zero(self):
+        with patch("psycopg2.connect") as connect:
+            connection = connect.return_value
+            connection.cursor.return_value.fetchall.return_value = []
+
+            list(create_database_interface().select("SELECT id FROM gazettes"))
+
+        connection.cursor.assert_called_once_with()
+
+
+class PostgreSQLChangeTests(TestCase):
+    def setUp(self):
+        patcher = patch("psycopg2.connect")
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection = self.connect.return_value
+        self.connection.closed = 0
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+        self.database = PostgreSQL("localhost", "db", "user", "pass", "9999")
+
+    def test_failed_change_is_rolled_back(self):
+        self.cursor.execute.side_effect = [
+            psycopg2.IntegrityError("duplicate key"),
+            None,
+        ]
+
+        with self.assertRaises(psycopg2.IntegrityError):
+            self.database.insert("INSERT INTO gazette_dead_letters", {})
+        self.connection.rollback.assert_called_once()
+
+        self.database.update("UPDATE gazettes", {})
+        self.connection.commit.assert_called_once()
+
+    def test_threads_take_turns_on_the_connection(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_change(*args):
+            if not started.is_set():
+                started.set()
+                release.wait(5)
+
+        self.cursor.execute.side_effect = slow_change
+        first = threading.Thread(
+            target=self.database.update, args=("UPDATE gazettes", {})
+        )
+        first.start()
+        started.wait(5)
+        second = threading.Thread(
+            target=self.database.update, args=("UPDATE gazettes", {})
+        )
+        second.start()
+        second.join(0.2)
+
+        # The second change waits for the first one to be committed
+        self.assertTrue(second.is_alive())
+        self.connection.commit.assert_not_called()
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(self.connection.commit.call_count, 2)
+
+    def test_changes_run_while_rows_are_iterated(self):
+        select_cursor = MagicMock()
+        select_cursor.fetchmany.side_effect = [[(1,)], [(2,)], []]
+        self.connection.cursor.side_effect = lambda *args, **kwargs: (
+            select_cursor if kwargs else MagicMock()
+        )
+        updated = []
+
+        for (gazette_id,) in self.database.select("SELECT id FROM gazettes"):
+            worker = threading.Thread(
+                target=self.database.update, args=("UPDATE gazettes", {})
+            )
+            worker.start()
+            worker.join(5)
+            updated.append(gazette_id)
+
+        self.assertEqual(updated, [1, 2])
+        # The declaration plus one commit per update
+        self.assertEqual(self.connection.commit.call_count, 3)
+
+    def test_claim_is_not_run_again_after_lost_connection(self):
+        def drop_connection(*args):
+            self.connection.closed = 2
+            raise psycopg2.OperationalError("server closed the connection")
+
+        self.cursor.execute.side_effect = drop_connection
+
+        with self.assertRaises(psycopg2.OperationalError):
+            self.database.update_returning("INSERT INTO gazette_leases", {})
+        self.cursor.execute.assert_called_once()
+
+    def test_lost_connection_change_is_run_again(self):
+        def execute(*args):
+            if self.cursor.execute.call_count == 1:
+                self.connection.closed = 2
+                raise psycopg2.OperationalError("server closed the connection")
+
+        self.cursor.execute.side_effect = execute
+
+        self.database.update("UPDATE gazettes", {})
+
+        self.assertEqual(self.cursor.execute.call_count, 2)
+        self.assertEqual(self.connect.call_count, 2)
+
+
+class PostgreSQLNotificationTests(TestCase):
+    def setUp(self):
+        patcher = patch("psycopg2.connect")
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.database = PostgreSQL("localhost", "db", "user", "pass", "9999")
+        self.listener = MagicMock()
+        self.listener.closed = 0
+        self.listener.notifies = []
+        self.connect.return_value = self.listener
+
+    @patch("select.select")
+    def test_listens_once_and_receives_notification(self, select_mock):
+        select_mock.return_value = ([self.listener], [], [])
+        self.listener.poll.side_effect = lambda: self.listener.notifies.append(
+            MagicMock(channel="new_gazettes")
+        )
+
+        self.assertTrue(self.database.wait_for_notification("new_gazettes", 1))
+        self.assertTrue(self.database.wait_for_notification("new_gazettes", 1))
+
+        self.listener.set_isolation_level.assert_called_once_with(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+        )
+        cursor = self.listener.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once()
+        self.assertEqual(
+            cursor.execute.call_args.args[0],
+            sql.SQL("LISTEN {};").format(sql.Identifier("new_gazettes")),
+        )
+        self.assertEqual(self.listener.notifies, [])
+
+    @patch("select.select", return_value=([], [], []))
+    def test_times_out_without_notification(self, select_mock):
+        self.assertFalse(self.database.wait_for_notification("new_gazettes", 0.5))
+        select_mock.assert_called_once_with([self.listener], [], [], 0.5)
+
+    @patch("time.sleep")
+    @patch("select.select")
+    def test_lost_listener_is_opened_again(self, select_mock, sleep_mock):
+        select_mock.side_effect = [
+            psycopg2.OperationalError("server closed the connection"),
+            ([], [], []),
+        ]
+
+        self.assertFalse(self.database.wait_for_notification("new_gazettes", 1))
+        self.assertFalse(self.database.wait_for_notification("new_gazettes", 1))
+
+        self.listener.close.assert_called_once()
+        sleep_mock.assert_called_once_with(1)
+        # The main connection and two listener connections
+        self.assertEqual(self.connect.call_count, 3)
+
+
+class PooledPostgreSQLTests(TestCase):
+    def setUp(self):
+        patcher = patch("psycopg2.pool.ThreadedConnectionPool")
+        self.pool = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def connection_mock(self):
+        connection = MagicMock()
+        connection.closed = 0
+        connection.get_transaction_status.return_value = (
+            psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        )
+        return connection
+
+    def create_pool(self, **kwargs):
+        return PooledPostgreSQL("localhost", "db", "user", "pass", "9999", **kwargs)
+
+    @patch.dict("os.environ", {"POSTGRES_POOL_MAX_SIZE": "4"})
+    def test_factory_creates_pool_when_max_size_is_set(self):
+        with patch.dict(
+            "os.environ",
+            {
+                "POSTGRES_DB": "db",
+                "POSTGRES_USER": "user",
+                "POSTGRES_PASSWORD": "pass",
+                "POSTGRES_HOST": "localhost",
+                "POSTGRES_PORT": "9999",
+            },
+        ):
+            self.assertIsInstance(create_database_interface(), PooledPostgreSQL)
+
+    def test_dropped_connection_is_replaced_at_checkout(self):
+        dropped = self.connection_mock()
+        dropped.closed = 2
+        healthy = self.connection_mock()
+        self.pool.getconn.side_effect = [dropped, healthy]
+
+        self.create_pool().update("UPDATE gazettes SET processed = true", {})
+
+        self.pool.putconn.assert_any_call(dropped, close=True)
+        self.pool.putconn.assert_called_with(healthy, close=False)
+        healthy.commit.assert_called_once()
+
+    def test_idle_connection_is_checked_before_checkout(self):
+        stale = self.connection_mock()
+        stale.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            psycopg2.OperationalError("server closed the connection")
+        )
+        healthy = self.connection_mock()
+        self.pool.getconn.side_effect = [stale, healthy]
+
+        self.create_pool(check_after=0).update("UPDATE gazettes", {})
+
+        self.pool.putconn.assert_any_call(stale, close=True)
+        healthy.commit.assert_called_once()
+
+    def test_change_is_retried_when_connection_is_lost(self):
+        lost = self.connection_mock()
+
+        def drop_connection(*args):
+            lost.closed = 2
+            raise psycopg2.OperationalError("server closed the connection")
+
+        lost.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            drop_connection
+        )
+        healthy = self.connection_mock()
+        self.pool.getconn.side_effect = [lost, healthy]
+
+        self.create_pool().update("UPDATE gazettes", {})
+
+        self.pool.putconn.assert_any_call(lost, close=True)
+        healthy.commit.assert_called_once()
+
+    def test_error_on_open_connection_is_not_retried(self):
+        connection = self.connection_mock()
+        connection.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            psycopg2.extensions.QueryCanceledError("statement timeout")
+        )
+        connection.get_transaction_status.return_value = (
+            psycopg2.extensions.TRANSACTION_STATUS_INERROR
+        )
+        self.pool.getconn.return_value = connection
+
+        with self.assertRaises(psycopg2.OperationalError):
+            self.create_pool().update("UPDATE gazettes", {})
+
+        self.pool.getconn.assert_called_once()
+        connection.rollback.assert_called_once()
+        self.pool.putconn.assert_called_once_with(connection, close=False)
+
+
 class PostgreSQLConnectionTests(TestCase):
     def test_postgresql_connection(self):
         HOST = "localhost"
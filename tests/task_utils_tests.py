@@ -0,0 +1,709 @@
+import asyncio
+import os
+import pickle
+import signal
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from unittest import TestCase
+from unittest.mock import patch
+
+from tasks.utils import (
+    BatchWriter,
+    CheckpointJournal,
+    CostTracker,
+    Deadline,
+    DeadlineExceeded,
+    GazetteRecord,
+    Lane,
+    RetryScheduler,
+    ShutdownTimeout,
+    SpillingChannel,
+    Stage,
+    check_deadline,
+    clean_extra_whitespaces,
+    clear_shutdown_request,
+    get_shutdown_event,
+    pause_shutdown_timeout,
+    prefetch,
+    prefetch_map,
+    request_shutdown,
+    run_cpu_bound,
+    run_cpu_bound_async,
+    run_lanes,
+    run_stages,
+    run_with_deadline,
+    shutdown_cpu_pool,
+    stop_on_shutdown,
+)
+
+
+def get_process_id(_):
+    return os.getpid()
+
+
+def get_thread_id(_):
+    return threading.get_ident()
+
+
+class CpuOffloadTests(TestCase):
+    def tearDown(self):
+        shutdown_cpu_pool()
+
+    @patch.dict("os.environ", {"CPU_OFFLOAD_WORKERS": "0"})
+    def test_runs_inline_when_disabled(self):
+        self.assertEqual(run_cpu_bound(get_process_id, None, size=10**9), os.getpid())
+
+    @patch.dict(
+        "os.environ", {"CPU_OFFLOAD_WORKERS": "1", "CPU_OFFLOAD_MIN_SIZE": "100"}
+    )
+    def test_runs_inline_for_small_inputs(self):
+        self.assertEqual(run_cpu_bound(get_process_id, None, size=99), os.getpid())
+
+    @patch.dict(
+        "os.environ", {"CPU_OFFLOAD_WORKERS": "1", "CPU_OFFLOAD_MIN_SIZE": "100"}
+    )
+    def test_runs_large_inputs_in_another_process(self):
+        self.assertNotEqual(run_cpu_bound(get_process_id, None, size=100), os.getpid())
+        self.assertEqual(
+            run_cpu_bound(clean_extra_whitespaces, "a  \n b", size=100), "a b"
+        )
+
+    @patch.dict("os.environ", {"CPU_OFFLOAD_WORKERS": "0"})
+    def test_async_runs_outside_event_loop_when_disabled(self):
+        async def run():
+            return await run_cpu_bound_async(get_thread_id, None, size=10**9)
+
+        self.assertNotEqual(asyncio.run(run()), threading.get_ident())
+
+
+class BatchWriterTests(TestCase):
+    def test_writes_when_batch_is_full(self):
+        batches = []
+        writer = BatchWriter(batches.append, max_size=2, max_delay=60)
+
+        for item in range(5):
+            writer.add(item)
+
+        self.assertEqual(batches, [[0, 1], [2, 3]])
+        writer.close()
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+
+    def test_writes_stale_items_after_max_delay(self):
+        written = threading.Event()
+        batches = []
+
+        def write_batch(items):
+            batches.append(items)
+            written.set()
+
+        writer = BatchWriter(write_batch, max_size=100, max_delay=0.05)
+        writer.add("a")
+
+        self.assertTrue(written.wait(timeout=5))
+        self.assertEqual(batches, [["a"]])
+        writer.close()
+        self.assertEqual(batches, [["a"]])
+
+    def test_failed_batch_is_kept_for_the_next_write(self):
+        batches = []
+        failures = [Exception("database unavailable")]
+
+        def write_batch(items):
+            if failures:
+                raise failures.pop()
+            batches.append(items)
+
+        writer = BatchWriter(write_batch, max_size=2, max_delay=60)
+        writer.add(1)
+        writer.add(2)
+        writer.add(3)
+        writer.close()
+
+        self.assertEqual(batches, [[1, 2, 3]])
+
+    def test_written_batches_are_reported(self):
+        written = []
+        failures = [Exception("database unavailable")]
+
+        def write_batch(items):
+            if failures:
+                raise failures.pop()
+
+        writer = BatchWriter(
+            write_batch, max_size=2, max_delay=60, on_written=written.append
+        )
+        writer.add(1)
+        writer.add(2)
+        self.assertEqual(written, [])
+        writer.close()
+
+        self.assertEqual(written, [[1, 2]])
+
+
+class CheckpointJournalTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "extraction.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_loads_recorded_gazettes(self):
+        journal = CheckpointJournal(self.path)
+        journal.record(1, "checksum-1", ["checksum-1"])
+        journal.record(2, "checksum-2", ["segment-1", "segment-2"])
+        journal.close()
+
+        self.assertEqual(
+            CheckpointJournal(self.path).load(),
+            {
+                (1, "checksum-1"): ["checksum-1"],
+                (2, "checksum-2"): ["segment-1", "segment-2"],
+            },
+        )
+
+    def test_ignores_line_cut_short_by_crash(self):
+        with open(self.path, "w") as journal_file:
+            journal_file.write('{"id": 1, "file_checksum": "checksum-1", "docu')
+
+        journal = CheckpointJournal(self.path)
+        self.assertEqual(journal.load(), {})
+        journal.record(2, "checksum-2", ["checksum-2"])
+        journal.close()
+
+        self.assertEqual(journal.load(), {(2, "checksum-2"): ["checksum-2"]})
+
+    def test_finish_removes_journal(self):
+        journal = CheckpointJournal(self.path)
+        journal.record(1, "checksum-1", ["checksum-1"])
+        journal.finish()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(journal.load(), {})
+
+
+class GazetteRecordTests(TestCase):
+    def setUp(self):
+        self.record = GazetteRecord(
+            id=1,
+            date=date(2020, 10, 18),
+            edition_number="1",
+            is_extra_edition=False,
+            power="executive",
+            file_checksum="checksum-1",
+            file_path="path/to/file.pdf",
+            file_url="http://example.com/file.pdf",
+            scraped_at=datetime(2020, 10, 18),
+            created_at=datetime(2020, 10, 18),
+            territory_id="3550308",
+            processed=False,
+            territory_name="Test City",
+            state_code="SC",
+        )
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(self.record, "__dict__"))
+
+    def test_is_used_like_a_dict(self):
+        self.record["source_text"] = "content"
+
+        self.assertEqual(self.record["source_text"], "content")
+        self.assertEqual(dict(self.record)["file_checksum"], "checksum-1")
+        self.assertEqual({**self.record}["territory_name"], "Test City")
+        self.assertIsNone(self.record.get("url"))
+        with self.assertRaises(KeyError):
+            self.record["unknown"]
+        with self.assertRaises(KeyError):
+            self.record["keys"]
+
+        del self.record["source_text"]
+        self.assertNotIn("source_text", self.record)
+
+    def test_clear_drops_every_field(self):
+        self.record.clear()
+
+        self.assertEqual(len(self.record), 0)
+        self.assertNotIn("id", self.record)
+        self.assertEqual(self.record.get("id", "unknown"), "unknown")
+
+    def test_repr_shows_the_fields_still_set(self):
+        del self.record["url"]
+        self.assertIn("id=1", repr(self.record))
+        self.assertNotIn(" url=", repr(self.record))
+
+        self.record.clear()
+        self.assertEqual(repr(self.record), "GazetteRecord()")
+
+    def test_survives_pickling(self):
+        self.record["source_text"] = "content"
+
+        copy = pickle.loads(pickle.dumps(self.record))
+
+        self.assertEqual(dict(copy), dict(self.record))
+
+
+class PrefetchTests(TestCase):
+    def test_prefetch_reads_ahead_of_consumer(self):
+        read = []
+        all_read = threading.Event()
+
+        def source():
+            for item in range(3):
+                read.append(item)
+                yield item
+            all_read.set()
+
+        items = prefetch(source(), 5)
+        self.assertEqual(next(items), 0)
+        # The rest of the source is read without the consumer asking for it
+        self.assertTrue(all_read.wait(5))
+        self.assertEqual(list(items), [1, 2])
+
+    def test_prefetch_raises_source_errors(self):
+        def source():
+            yield 1
+            raise ValueError("listing failed")
+
+        items = prefetch(source(), 2)
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_prefetch_map_starts_items_ahead(self):
+        started = []
+        lock = threading.Lock()
+
+        def func(item):
+            with lock:
+                started.append(item)
+            return item * 10
+
+        results = prefetch_map(func, range(6), ahead=3, budget=1000, cost=lambda r: 1)
+        item, future = next(results)
+
+        self.assertEqual((item, future.result()), (0, 0))
+        self.assertEqual(sorted(started), [0, 1, 2])
+        self.assertEqual(
+            [(item, future.result()) for item, future in results],
+            [(1, 10), (2, 20), (3, 30), (4, 40), (5, 50)],
+        )
+
+    def test_prefetch_map_stops_starting_items_over_budget(self):
+        started = []
+        results = prefetch_map(
+            lambda item: started.append(item) or 100,
+            range(5),
+            ahead=4,
+            budget=0,
+            cost=lambda result: result,
+        )
+
+        _, future = next(results)
+        future.result()
+        _, future = next(results)
+        future.result()
+
+        # With no budget left, items are only started when the consumer asks
+        self.assertEqual(started, [0, 1])
+        results.close()
+
+    def test_prefetch_map_reserves_the_cost_of_running_items(self):
+        started = []
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def func(item):
+            started.append(item)
+            if item > 0:
+                release.wait(5)
+            return 100
+
+        results = prefetch_map(func, range(6), ahead=4, budget=150, cost=lambda r: r)
+        _, future = next(results)
+        future.result()
+        next(results)
+
+        # The running items are expected to cost 100 each, like the first one
+        self.assertLessEqual(max(started), 3)
+        release.set()
+        results.close()
+
+    def test_prefetch_map_discards_results_not_taken(self):
+        discarded = []
+        results = prefetch_map(
+            lambda item: item,
+            range(4),
+            ahead=3,
+            budget=1000,
+            cost=lambda result: 1,
+            discard=discarded.append,
+        )
+
+        next(results)
+        results.close()
+
+        self.assertEqual(sorted(discarded), [1, 2])
+
+
+class LanesTests(TestCase):
+    def test_items_run_in_the_lane_chosen_by_route(self):
+        lanes = [
+            Lane("small", lambda item: ("small", item), concurrency=2),
+            Lane("large", lambda item: ("large", item)),
+        ]
+
+        results = run_lanes(range(6), lambda item: item % 2, lanes, backlog=2)
+
+        self.assertEqual(
+            sorted(results),
+            [("large", 1), ("large", 3), ("large", 5)]
+            + [("small", 0), ("small", 2), ("small", 4)],
+        )
+
+    def test_slow_lane_does_not_hold_other_lanes(self):
+        release = threading.Event()
+
+        def slow(item):
+            release.wait(5)
+            return item
+
+        lanes = [Lane("small", lambda item: item), Lane("large", slow)]
+        results = run_lanes(
+            [100, 1, 2, 3], lambda item: int(item >= 100), lanes, backlog=1
+        )
+
+        self.assertEqual([next(results) for _ in range(3)], [1, 2, 3])
+        release.set()
+        self.assertEqual(list(results), [100])
+
+    def test_items_behind_a_full_lane_reach_other_lanes(self):
+        release = threading.Event()
+
+        def slow(item):
+            release.wait(5)
+            return item
+
+        lanes = [Lane("small", lambda item: item), Lane("large", slow)]
+        results = run_lanes(
+            [100, 101, 102, 1, 2, 3], lambda item: int(item >= 100), lanes, backlog=1
+        )
+
+        self.assertEqual([next(results) for _ in range(3)], [1, 2, 3])
+        release.set()
+        self.assertEqual(sorted(results), [100, 101, 102])
+
+    def test_failed_route_uses_first_lane(self):
+        def route(item):
+            raise RuntimeError("HEAD failed")
+
+        lanes = [Lane("small", lambda item: item), Lane("large", lambda item: -item)]
+
+        self.assertEqual(sorted(run_lanes([1, 2], route, lanes, backlog=1)), [1, 2])
+
+    def test_lane_errors_are_raised(self):
+        def fail(item):
+            raise ValueError("extraction failed")
+
+        results = run_lanes([1], lambda item: 0, [Lane("small", fail)], backlog=1)
+
+        with self.assertRaises(ValueError):
+            list(results)
+
+    def test_cost_tracker_averages_costs_by_key(self):
+        costs = CostTracker(weight=0.5)
+        costs.record("3550308", 10)
+        costs.record("3550308", 30)
+
+        self.assertEqual(costs.average("3550308"), 20)
+        self.assertEqual(costs.average("4205902"), 0)
+
+
+class StagesTests(TestCase):
+    def test_items_go_through_every_stage(self):
+        stages = [
+            Stage("double", lambda item: item * 2, 2),
+            Stage("add", lambda item: item + 1),
+        ]
+
+        self.assertEqual(sorted(run_stages([1, 2, 3], stages, queue_size=1)), [3, 5, 7])
+
+    def test_input_errors_are_raised(self):
+        def items():
+            yield 1
+            raise ConnectionError("database unavailable")
+
+        results = run_stages(items(), [Stage("double", lambda item: item * 2)], 1)
+
+        self.assertEqual(next(results), 2)
+        with self.assertRaises(ConnectionError):
+            next(results)
+
+    def test_failing_error_handler_does_not_stop_the_pipeline(self):
+        def fail_odd(item):
+            if item % 2:
+                raise ValueError("extraction failed")
+            return item
+
+        def on_error(item, error):
+            raise RuntimeError("dead-letter insert failed")
+
+        stages = [Stage("extract", fail_odd), Stage("index", lambda item: item)]
+        results = run_stages(range(5), stages, queue_size=1, on_error=on_error)
+
+        self.assertEqual(sorted(results), [0, 2, 4])
+
+
+class RetrySchedulerTests(TestCase):
+    def build_scheduler(self, max_attempts=2, base_delay=0.0):
+        self.given_up = []
+        return RetryScheduler(
+            max_attempts,
+            base_delay=base_delay,
+            max_delay=60,
+            key=lambda item: item,
+            is_permanent=lambda error: isinstance(error, TypeError),
+            give_up=lambda item, error, attempts: self.given_up.append(
+                (item, attempts)
+            ),
+        )
+
+    def test_due_retries_are_fed_between_fresh_items(self):
+        scheduler = self.build_scheduler()
+        fed = []
+        for item in scheduler.feed(["a", "b", "c"]):
+            fed.append(item)
+            if item == "a" and fed.count("a") == 1:
+                scheduler.failed(item, RuntimeError("timeout"))
+
+        self.assertEqual(fed, ["a", "a", "b", "c"])
+        self.assertEqual(scheduler.pending(), 0)
+
+    def test_gives_up_after_max_attempts(self):
+        scheduler = self.build_scheduler(max_attempts=2)
+        for _ in range(3):
+            scheduler.failed("a", RuntimeError("timeout"))
+            list(scheduler.drain())
+
+        self.assertEqual(self.given_up, [("a", 3)])
+
+    def test_attempts_are_forgotten_once_a_retry_succeeded(self):
+        scheduler = self.build_scheduler(max_attempts=1)
+        scheduler.failed("a", RuntimeError("timeout"))
+        list(scheduler.drain())
+        scheduler.succeeded("a")
+
+        # A later failure of the item starts counting again
+        scheduler.failed("a", RuntimeError("timeout"))
+
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertEqual(self.given_up, [])
+
+    def test_permanent_errors_are_not_retried(self):
+        scheduler = self.build_scheduler()
+        scheduler.failed("a", TypeError("zip"))
+
+        self.assertEqual(scheduler.pending(), 0)
+        self.assertEqual(self.given_up, [("a", 1)])
+
+    def test_drain_waits_until_retries_are_due(self):
+        scheduler = self.build_scheduler(base_delay=0.05)
+        scheduler.failed("a", RuntimeError("timeout"))
+
+        # Not due yet, so feed does not hand it out
+        self.assertEqual(list(scheduler.feed([])), [])
+        self.assertEqual(list(scheduler.drain()), ["a"])
+
+
+class DeadlineTests(TestCase):
+    def test_returns_result_within_deadline(self):
+        self.assertEqual(run_with_deadline(lambda: 42, Deadline(5)), 42)
+
+    def test_raises_errors_of_the_work(self):
+        def fail():
+            raise ValueError("bad file")
+
+        with self.assertRaises(ValueError):
+            run_with_deadline(fail, Deadline(5))
+
+    def test_abandons_work_past_deadline(self):
+        release = threading.Event()
+        released = threading.Event()
+
+        with self.assertRaises(DeadlineExceeded) as context:
+            run_with_deadline(
+                lambda: release.wait(5), Deadline(0.05), on_abandoned=released.set
+            )
+
+        self.assertTrue(context.exception.abandoned)
+        self.assertFalse(released.is_set())
+        release.set()
+        self.assertTrue(released.wait(5))
+
+    def test_abandoned_work_stops_at_next_check(self):
+        steps = []
+        done = threading.Event()
+
+        def work():
+            steps.append("extraction")
+            threading.Event().wait(0.1)
+            check_deadline("upload")
+            steps.append("upload")
+
+        with self.assertRaises(DeadlineExceeded):
+            run_with_deadline(work, Deadline(0.05), on_abandoned=done.set)
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(steps, ["extraction"])
+
+    def test_abandoned_threads_are_bounded(self):
+        threads = threading.BoundedSemaphore(1)
+        release = threading.Event()
+        released = threading.Event()
+
+        with self.assertRaises(DeadlineExceeded):
+            run_with_deadline(
+                lambda: release.wait(5),
+                Deadline(0.05),
+                on_abandoned=released.set,
+                threads=threads,
+            )
+        with self.assertRaises(DeadlineExceeded) as context:
+            run_with_deadline(lambda: 42, Deadline(0.05), threads=threads)
+
+        self.assertFalse(context.exception.abandoned)
+        release.set()
+        self.assertTrue(released.wait(5))
+        self.assertEqual(
+            run_with_deadline(lambda: 42, Deadline(5), threads=threads), 42
+        )
+
+    def test_abandoned_work_stops_before_side_effect(self):
+        steps = []
+        abandoned = threading.Event()
+        done = threading.Event()
+
+        def work():
+            abandoned.wait(5)
+            try:
+                check_deadline("marking as processed")
+                steps.append("marked")
+            except DeadlineExceeded as e:
+                steps.append(e.abandoned)
+
+        with self.assertRaises(DeadlineExceeded):
+            run_with_deadline(work, Deadline(0.05), on_abandoned=done.set)
+        abandoned.set()
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(steps, [True])
+
+    def test_check_deadline_outside_deadline_does_nothing(self):
+        check_deadline("upload")
+
+
+class ShutdownTests(TestCase):
+    def tearDown(self):
+        clear_shutdown_request()
+
+    def test_stops_reading_items_on_shutdown(self):
+        read = []
+
+        def items():
+            for item in ["a", "b", "c"]:
+                read.append(item)
+                yield item
+
+        taken = []
+        for item in stop_on_shutdown(items()):
+            taken.append(item)
+            request_shutdown()
+
+        self.assertEqual(taken, ["a"])
+        self.assertEqual(read, ["a"])
+
+    def test_retries_are_not_waited_for_on_shutdown(self):
+        scheduler = RetryScheduler(
+            1,
+            base_delay=60,
+            max_delay=60,
+            key=lambda item: item,
+            is_permanent=lambda error: False,
+            give_up=lambda item, error, attempts: None,
+        )
+        scheduler.failed("a", RuntimeError("timeout"))
+        threading.Timer(0.05, request_shutdown).start()
+
+        self.assertEqual(list(scheduler.drain(stop=get_shutdown_event())), [])
+        self.assertEqual(scheduler.pending(), 1)
+
+    def test_grace_period_does_not_run_out_during_flush(self):
+        def expire(signum, frame):
+            raise ShutdownTimeout("Shutdown grace period expired")
+
+        previous = signal.signal(signal.SIGALRM, expire)
+        self.addCleanup(signal.signal, signal.SIGALRM, previous)
+        self.addCleanup(signal.setitimer, signal.ITIMER_REAL, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0.05)
+
+        flushed = False
+        with pause_shutdown_timeout():
+            time.sleep(0.1)
+            flushed = True
+
+        self.assertTrue(flushed)
+        # The time left is given back once the flush is done
+        with self.assertRaises(ShutdownTimeout):
+            time.sleep(1)
+
+
+class SpillingChannelTests(TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spill_dir.cleanup)
+
+    def test_items_past_capacity_are_spilled_in_order(self):
+        channel = SpillingChannel(2, spill_dir=self.spill_dir.name)
+        channel.put_many(str(number) for number in range(5))
+        channel.close()
+
+        batches = list(channel.batches(3, max_delay=60))
+
+        self.assertEqual(batches, [["0", "1", "2"], ["3", "4"]])
+        self.assertEqual(len(channel), 0)
+
+    def test_items_put_while_consuming_keep_their_order(self):
+        channel = SpillingChannel(2, spill_dir=self.spill_dir.name)
+        channel.put_many(["0", "1", "2"])
+        taken = []
+        for batch in channel.batches(1, max_delay=60):
+            taken.extend(batch)
+            if batch == ["0"]:
+                channel.put("3")
+            if batch == ["3"]:
+                channel.close()
+
+        self.assertEqual(taken, ["0", "1", "2", "3"])
+
+    def test_smaller_batch_is_yielded_after_max_delay(self):
+        channel = SpillingChannel(10)
+        channel.put("0")
+
+        batches = channel.batches(5, max_delay=0.05)
+
+        self.assertEqual(next(batches), ["0"])
+        channel.close()
+        self.assertEqual(list(batches), [])
+
+    def test_abort_drops_items_left(self):
+        channel = SpillingChannel(1, spill_dir=self.spill_dir.name)
+        channel.put_many(["0", "1"])
+        consumer = threading.Thread(target=lambda: list(channel.batches(5, 60)))
+        consumer.start()
+
+        channel.abort()
+
+        consumer.join(5)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(len(channel), 0)
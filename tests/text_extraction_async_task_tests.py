@@ -0,0 +1,131 @@
+import os
+from datetime import date, datetime
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from data_extraction import AsyncTextExtractorInterface
+from tasks.gazette_text_extraction_async import extract_text_from_gazettes_async
+
+
+@patch.dict(
+    "os.environ",
+    {
+        "QUERIDO_DIARIO_FILES_ENDPOINT": "http://test.com",
+        "EXTRACTION_CONCURRENCY": "3",
+    },
+)
+class AsyncTextExtractionTaskTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.database_mock = MagicMock()
+        self.storage_mock = AsyncMock()
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 1024,
+            "etag": "etag",
+            "content_type": "application/pdf",
+            "metadata": {},
+        }
+        self.index_mock = AsyncMock()
+        self.text_extractor_mock = MagicMock(spec=AsyncTextExtractorInterface)
+        self.text_extractor_mock.extract_text = AsyncMock(return_value="content")
+        self.text_extractor_mock.is_zip.return_value = False
+
+    def build_gazettes(self, count):
+        return [
+            {
+                "id": i,
+                "source_text": "",
+                "date": date(2020, 10, 18),
+                "edition_number": "1",
+                "is_extra_edition": False,
+                "power": "executive",
+                "file_checksum": f"checksum-{i}",
+                "file_path": f"sc_gaspar/2020-10-18/checksum-{i}.pdf",
+                "file_url": "www.querido-diario.org",
+                "scraped_at": datetime.now(),
+                "created_at": datetime.now(),
+                "territory_id": "3550308",
+                "processed": False,
+                "state_code": "SC",
+                "territory_name": "Gaspar",
+            }
+            for i in range(count)
+        ]
+
+    async def test_every_gazette_is_processed(self):
+        ids = await extract_text_from_gazettes_async(
+            self.build_gazettes(5),
+            [],
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extractor_mock,
+        )
+
+        self.assertEqual(sorted(ids), [f"checksum-{i}" for i in range(5)])
+        self.assertEqual(self.storage_mock.upload_content.await_count, 5)
+        self.assertEqual(self.index_mock.index_document.await_count, 5)
+        self.assertEqual(self.database_mock.update.call_count, 5)
+        for call in self.text_extractor_mock.extract_text.await_args_list:
+            self.assertFalse(os.path.exists(call.args[0]))
+
+    @patch.dict("os.environ", {"EXTRACTION_REUSE_EXISTING": "true"})
+    async def test_reuse_marks_gazette_already_indexed_as_processed(self):
+        self.index_mock.document_exists.return_value = True
+
+        ids = await extract_text_from_gazettes_async(
+            self.build_gazettes(1),
+            [],
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extractor_mock,
+        )
+
+        self.assertEqual(ids, ["checksum-0"])
+        self.text_extractor_mock.extract_text.assert_not_awaited()
+        self.database_mock.update.assert_called_once()
+
+    async def test_preflight_rejects_large_files_without_downloading(self):
+        self.storage_mock.get_file_metadata.side_effect = lambda key: {
+            "size": 2 * 1024 * 1024 * 1024 if key.endswith("-1.pdf") else 1024,
+            "etag": "etag",
+            "content_type": "application/pdf",
+            "metadata": {},
+        }
+
+        ids = await extract_text_from_gazettes_async(
+            self.build_gazettes(3),
+            [],
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extractor_mock,
+        )
+
+        self.assertEqual(sorted(ids), ["checksum-0", "checksum-2"])
+        self.assertEqual(self.storage_mock.get_file.await_count, 2)
+
+    async def test_missing_and_failed_gazettes_are_skipped(self):
+        self.storage_mock.get_file.side_effect = [
+            ClientError({"Error": {"Code": "404"}}, "GetObject"),
+            None,
+            None,
+        ]
+        self.text_extractor_mock.extract_text.side_effect = [
+            Exception("Tika failure"),
+            "content",
+        ]
+
+        ids = await extract_text_from_gazettes_async(
+            self.build_gazettes(3),
+            [],
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extractor_mock,
+        )
+
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(self.database_mock.update.call_count, 1)
@@ -1,14 +1,29 @@
+import io
 import os
+import signal
 import tempfile
+import threading
+import time
 from datetime import date, datetime
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
-from data_extraction import TextExtractorInterface
+from data_extraction import ProbingWriter, TextExtractorInterface
 from tasks import (
     extract_text_pending_gazettes,
     upload_gazette_raw_text,
 )
+from tasks.gazette_text_extraction import (
+    extract_text_from_gazettes,
+    mark_gazette_as_slow,
+)
+from tasks.list_gazettes_to_be_processed import format_gazette_data
+from tasks.utils import (
+    CheckpointJournal,
+    ShutdownTimeout,
+    clear_shutdown_request,
+    request_shutdown,
+)
 
 
 @patch.dict(
@@ -45,6 +60,12 @@ class TextExtractionTaskTests(TestCase):
         self.storage_mock = MagicMock()
         self.storage_mock.get_file = MagicMock()
         self.storage_mock.upload_content = MagicMock()
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 1024,
+            "etag": "etag",
+            "content_type": "application/pdf",
+            "metadata": {},
+        }
         with tempfile.NamedTemporaryFile(delete=False) as tmpfile:
             self.tmpfile_returned_by_text_extraction_function_mock = tmpfile.name
         self.text_extraction_function = MagicMock(spec=TextExtractorInterface)
@@ -81,10 +102,26 @@ class TextExtractionTaskTests(TestCase):
             self.storage_mock.get_file.call_args.args[0],
             "sc_gaspar/2020-10-18/972aca2e-1174-11eb-b2d5-a86daaca905e.pdf",
         )
+        # The temporary file is wrapped to identify the file type while downloading
         self.assertIsInstance(
-            self.storage_mock.get_file.call_args.args[1], tempfile._TemporaryFileWrapper
+            self.storage_mock.get_file.call_args.args[1], ProbingWriter
+        )
+
+    def test_content_type_read_before_download_is_used_as_hint(self):
+        hints = []
+        self.storage_mock.get_file.side_effect = lambda key, destination: hints.append(
+            destination.content_type_hint
+        )
+
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
         )
 
+        self.assertEqual(hints, ["application/pdf"])
+
     def test_text_extraction_function_call(self):
         extract_text_pending_gazettes(
             self.database_mock,
@@ -302,3 +339,878 @@ class TextExtractionTaskTests(TestCase):
         self.storage_mock.upload_content.return_value = "http://test.com/some_file.txt"
         upload_gazette_raw_text(self.storage_mock, gazette_id, content, file_key)
         self.storage_mock.upload_content.assert_called_once_with(content, file_key)
+
+    @patch.dict("os.environ", {"EXTRACTION_CONCURRENCY": "3"})
+    def test_concurrent_extraction_processes_every_gazette(self):
+        gazettes = []
+        for i in range(5):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazettes.append(gazette)
+        self.database_mock.get_pending_gazettes = MagicMock(return_value=gazettes)
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(sorted(ids), [f"checksum-{i}" for i in range(5)])
+        self.assertEqual(self.storage_mock.get_file.call_count, 5)
+        self.assertEqual(self.database_mock.update.call_count, 5)
+
+    @patch.dict("os.environ", {"EXTRACTION_CONCURRENCY": "2"})
+    def test_concurrent_extraction_keeps_failed_gazettes_isolated(self):
+        gazettes = []
+        for i in range(4):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazettes.append(gazette)
+        self.database_mock.get_pending_gazettes = MagicMock(return_value=gazettes)
+        self.text_extraction_function.extract_text.side_effect = [
+            Exception("Tika failure"),
+            "",
+            "",
+            "",
+        ]
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(self.database_mock.update.call_count, 3)
+
+    @patch.dict(
+        "os.environ",
+        {"EXTRACTION_ENGINE": "staged", "EXTRACTION_STAGE_QUEUE_SIZE": "1"},
+    )
+    def test_staged_extraction_processes_every_gazette(self):
+        gazettes = []
+        for i in range(5):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazettes.append(gazette)
+        self.database_mock.get_pending_gazettes = MagicMock(return_value=gazettes)
+        self.text_extraction_function.extract_text.side_effect = [
+            "",
+            Exception("Tika failure"),
+            "",
+            "",
+            "",
+        ]
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(self.storage_mock.get_file.call_count, 5)
+        self.assertEqual(self.database_mock.update.call_count, 4)
+        for call in self.text_extraction_function.extract_text.call_args_list:
+            self.file_should_not_exist(call.args[0])
+
+    @patch.dict("os.environ", {"EXTRACTION_REUSE_EXISTING": "true"})
+    def test_reuse_skips_gazette_already_indexed(self):
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 10,
+            "etag": "etag",
+            "content_type": "text/plain",
+            "metadata": {"file-checksum": "972aca2e-1174-11eb-b2d5-a86daaca905e"},
+        }
+        self.index_mock.document_exists.return_value = True
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.storage_mock.get_file.assert_not_called()
+        self.text_extraction_function.extract_text.assert_not_called()
+        self.index_mock.index_document.assert_not_called()
+        # Otherwise UNPROCESSED and CLAIM list the gazette again on every run
+        self.database_mock.update.assert_called_once()
+        self.assertIn(
+            "SET processed = True", self.database_mock.update.call_args.args[0]
+        )
+
+    @patch.dict(
+        "os.environ",
+        {"EXTRACTION_REUSE_EXISTING": "true", "EXTRACTION_ENGINE": "staged"},
+    )
+    def test_staged_reuse_marks_gazette_already_indexed_as_processed(self):
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 10,
+            "etag": "etag",
+            "content_type": "text/plain",
+            "metadata": {"file-checksum": "972aca2e-1174-11eb-b2d5-a86daaca905e"},
+        }
+        self.index_mock.document_exists.return_value = True
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.index_mock.index_document.assert_not_called()
+        self.database_mock.update.assert_called_once()
+
+    @patch.dict("os.environ", {"EXTRACTION_REUSE_EXISTING": "true"})
+    def test_reuse_indexes_stored_text_without_extracting(self):
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 10,
+            "etag": "etag",
+            "content_type": "text/plain",
+            "metadata": {},
+        }
+        self.storage_mock.get_content.return_value = "stored text"
+        self.index_mock.document_exists.return_value = False
+
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.storage_mock.get_file.assert_not_called()
+        self.text_extraction_function.extract_text.assert_not_called()
+        self.storage_mock.upload_content.assert_not_called()
+        self.storage_mock.get_content.assert_called_once_with(
+            "sc_gaspar/2020-10-18/972aca2e-1174-11eb-b2d5-a86daaca905e.txt"
+        )
+        indexed = self.index_mock.index_document.call_args.args[0]
+        self.assertEqual(indexed["source_text"], "stored text")
+        self.database_mock.update.assert_called_once()
+
+    @patch.dict("os.environ", {"EXTRACTION_REUSE_EXISTING": "true"})
+    def test_reuse_extracts_again_when_checksum_differs(self):
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 10,
+            "etag": "etag",
+            "content_type": "text/plain",
+            "metadata": {"file-checksum": "other"},
+        }
+
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.storage_mock.get_file.assert_called_once()
+        self.text_extraction_function.extract_text.assert_called_once()
+        self.index_mock.document_exists.assert_not_called()
+
+    def test_preflight_rejects_large_file_without_downloading(self):
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 2 * 1024 * 1024 * 1024,
+            "etag": "etag",
+            "content_type": "application/pdf",
+            "metadata": {},
+        }
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        self.storage_mock.get_file_metadata.assert_called_once_with(
+            "sc_gaspar/2020-10-18/972aca2e-1174-11eb-b2d5-a86daaca905e.pdf"
+        )
+        self.storage_mock.get_file.assert_not_called()
+        self.database_mock.update.assert_not_called()
+
+    def test_preflight_rejects_zip_without_downloading(self):
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 1024,
+            "etag": "etag",
+            "content_type": "application/zip",
+            "metadata": {},
+        }
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        self.storage_mock.get_file.assert_not_called()
+
+    def test_grace_period_expiring_does_not_interrupt_the_flush(self):
+        def expire(signum, frame):
+            raise ShutdownTimeout("Shutdown grace period expired")
+
+        flushed = []
+
+        def close_processed_writer(database):
+            time.sleep(0.4)
+            flushed.append(database)
+
+        previous = signal.signal(signal.SIGALRM, expire)
+        self.addCleanup(signal.signal, signal.SIGALRM, previous)
+        self.addCleanup(signal.setitimer, signal.ITIMER_REAL, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0.2)
+
+        with patch(
+            "tasks.gazette_text_extraction.close_processed_writer",
+            side_effect=close_processed_writer,
+        ):
+            with self.assertRaises(ShutdownTimeout):
+                extract_text_from_gazettes(
+                    [],
+                    [],
+                    self.database_mock,
+                    self.storage_mock,
+                    self.index_mock,
+                    self.text_extraction_function,
+                )
+                time.sleep(1)
+
+        self.assertEqual(flushed, [self.database_mock])
+
+    def test_preflight_skips_missing_file(self):
+        self.storage_mock.get_file_metadata.return_value = None
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        self.storage_mock.get_file.assert_not_called()
+        self.text_extraction_function.extract_text.assert_not_called()
+
+    @patch.dict("os.environ", {"EXTRACTION_PREFLIGHT": "false"})
+    def test_disabled_preflight_downloads_without_head(self):
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.storage_mock.get_file_metadata.assert_not_called()
+        self.storage_mock.get_file.assert_called_once()
+
+    def test_indexed_ids_are_handed_over_instead_of_returned(self):
+        indexed = []
+
+        ids = extract_text_from_gazettes(
+            self.database_mock.get_pending_gazettes(),
+            [],
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+            on_indexed=indexed.append,
+        )
+
+        self.assertEqual(ids, [])
+        self.assertEqual(indexed, [["972aca2e-1174-11eb-b2d5-a86daaca905e"]])
+
+    def test_no_gazette_is_taken_after_shutdown(self):
+        self.addCleanup(clear_shutdown_request)
+        request_shutdown()
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        self.storage_mock.get_file.assert_not_called()
+
+    @patch.dict(
+        "os.environ",
+        {
+            "EXTRACTION_RETRY_ATTEMPTS": "1",
+            "EXTRACTION_RETRY_DELAY": "60",
+            "EXTRACTION_DEAD_LETTERS": "true",
+        },
+    )
+    def test_retries_are_left_for_the_next_run_on_shutdown(self):
+        self.addCleanup(clear_shutdown_request)
+
+        def extract_text(path, **kwargs):
+            request_shutdown()
+            raise Exception("Tika failure")
+
+        self.text_extraction_function.extract_text.side_effect = extract_text
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        self.assertEqual(self.text_extraction_function.extract_text.call_count, 1)
+        self.database_mock.insert.assert_not_called()
+
+    def slow_first_extraction(self, seconds):
+        calls = []
+
+        def extract_text(path, **kwargs):
+            calls.append(path)
+            if len(calls) == 1:
+                threading.Event().wait(seconds)
+            return ""
+
+        self.text_extraction_function.extract_text.side_effect = extract_text
+
+    @patch("tasks.gazette_text_extraction._slow_gazettes", set())
+    @patch.dict(
+        "os.environ",
+        {
+            "EXTRACTION_GAZETTE_DEADLINE": "0.1",
+            "EXTRACTION_RETRY_ATTEMPTS": "1",
+            "EXTRACTION_RETRY_DELAY": "0",
+        },
+    )
+    def test_gazette_past_deadline_is_abandoned_and_retried_as_slow(self):
+        self.slow_first_extraction(0.5)
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        # The retry runs without a deadline (EXTRACTION_SLOW_GAZETTE_DEADLINE)
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.assertEqual(self.text_extraction_function.extract_text.call_count, 2)
+
+    @patch.dict("os.environ", {"EXTRACTION_GAZETTE_DEADLINE": "0.1"})
+    def test_slow_gazettes_are_forgotten_after_the_extraction(self):
+        self.slow_first_extraction(0.5)
+        slow_gazettes = set()
+
+        with patch("tasks.gazette_text_extraction._slow_gazettes", slow_gazettes):
+            with patch(
+                "tasks.gazette_text_extraction.mark_gazette_as_slow",
+                wraps=mark_gazette_as_slow,
+            ) as mark_mock:
+                extract_text_pending_gazettes(
+                    self.database_mock,
+                    self.storage_mock,
+                    self.index_mock,
+                    self.text_extraction_function,
+                )
+
+        mark_mock.assert_called_once()
+        self.assertEqual(slow_gazettes, set())
+
+    @patch("tasks.gazette_text_extraction._slow_gazettes", set())
+    @patch.dict(
+        "os.environ",
+        {
+            "EXTRACTION_ENGINE": "staged",
+            "EXTRACTION_GAZETTE_DEADLINE": "0.1",
+            "EXTRACTION_DEAD_LETTERS": "true",
+        },
+    )
+    def test_staged_gazette_past_deadline_is_dropped(self):
+        self.slow_first_extraction(0.5)
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        command, data = self.database_mock.insert.call_args.args
+        self.assertIn("gazette_dead_letters", command)
+        self.assertTrue(data["error"].startswith("DeadlineExceeded"))
+        self.index_mock.index_document.assert_not_called()
+
+    @patch.dict(
+        "os.environ",
+        {"EXTRACTION_RETRY_ATTEMPTS": "2", "EXTRACTION_RETRY_DELAY": "0"},
+    )
+    def test_failed_gazette_is_retried_later(self):
+        self.text_extraction_function.extract_text.side_effect = [
+            Exception("Tika failure"),
+            "",
+        ]
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.assertEqual(self.text_extraction_function.extract_text.call_count, 2)
+        self.database_mock.insert.assert_not_called()
+
+    @patch.dict(
+        "os.environ",
+        {
+            "EXTRACTION_ENGINE": "staged",
+            "EXTRACTION_RETRY_ATTEMPTS": "1",
+            "EXTRACTION_RETRY_DELAY": "0",
+            "EXTRACTION_DEAD_LETTERS": "true",
+        },
+    )
+    def test_gazette_failing_every_retry_goes_to_dead_letters(self):
+        self.text_extraction_function.extract_text.side_effect = Exception(
+            "Tika failure"
+        )
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        self.assertEqual(self.text_extraction_function.extract_text.call_count, 2)
+        self.database_mock.insert.assert_called_once()
+        command, data = self.database_mock.insert.call_args.args
+        self.assertIn("gazette_dead_letters", command)
+        self.assertEqual(data["gazette_id"], 1)
+        self.assertEqual(data["attempts"], 2)
+        self.assertEqual(data["error"], "Exception: Tika failure")
+
+    @patch.dict(
+        "os.environ",
+        {"EXTRACTION_RETRY_ATTEMPTS": "3", "EXTRACTION_DEAD_LETTERS": "true"},
+    )
+    def test_unsupported_file_goes_to_dead_letters_without_retries(self):
+        self.storage_mock.get_file_metadata.return_value = {
+            "size": 1024,
+            "etag": "etag",
+            "content_type": "application/zip",
+            "metadata": {},
+        }
+
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(self.storage_mock.get_file_metadata.call_count, 1)
+        self.assertEqual(self.database_mock.insert.call_args.args[1]["attempts"], 1)
+
+    @patch.dict("os.environ", {"EXTRACTION_DEAD_LETTERS": "true"})
+    def test_failed_dead_letter_insert_does_not_stop_the_run(self):
+        zip_gazette = self.data[0].copy()
+        zip_gazette["file_path"] = "sc_gaspar/2020-10-18/archive.zip"
+        gazette = self.data[0].copy()
+        gazette["id"] = 2
+        self.database_mock.get_pending_gazettes = MagicMock(
+            return_value=[zip_gazette, gazette]
+        )
+        self.storage_mock.get_file_metadata.side_effect = lambda key: {
+            "size": 1024,
+            "etag": "etag",
+            "content_type": "application/zip"
+            if key.endswith(".zip")
+            else "application/pdf",
+            "metadata": {},
+        }
+        self.database_mock.insert.side_effect = Exception(
+            "current transaction is aborted"
+        )
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.database_mock.insert.assert_called_once()
+        command, data = self.database_mock.update.call_args.args
+        self.assertIn("SET processed = True", command)
+        self.assertEqual(data["id"], 2)
+
+    @patch.dict("os.environ", {"EXTRACTION_DEAD_LETTERS": "true"})
+    def test_processed_gazettes_leave_dead_letters(self):
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        command, data = self.database_mock.delete.call_args.args
+        self.assertIn("gazette_dead_letters", command)
+        self.assertEqual(data, {"ids": [1]})
+
+    def stream_mock(self, path):
+        with open(path, "rb") as f:
+            content = f.read()
+        self.storage_mock.get_file_stream.side_effect = lambda key: (
+            io.BytesIO(content),
+            {
+                "size": len(content),
+                "etag": "etag",
+                "content_type": "binary/octet-stream",
+                "metadata": {},
+            },
+        )
+        return content
+
+    @patch.dict("os.environ", {"EXTRACTION_STREAMING": "true"})
+    def test_streaming_reads_small_file_in_memory(self):
+        content = self.stream_mock("tests/data/fake_gazette.pdf")
+        sent = []
+
+        def extract(open_chunks, probe, source):
+            sent.append(b"".join(open_chunks()))
+            self.assertTrue(probe.is_pdf())
+            self.assertIsNone(probe.path)
+            return "text"
+
+        self.text_extraction_function.extract_text_from_stream.side_effect = extract
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.assertEqual(sent, [content])
+        self.storage_mock.get_file.assert_not_called()
+        self.text_extraction_function.extract_text.assert_not_called()
+        self.database_mock.update.assert_called_once()
+
+    @patch.dict(
+        "os.environ",
+        {"EXTRACTION_STREAMING": "true", "EXTRACTION_STREAM_MEMORY_LIMIT_MB": "0.001"},
+    )
+    def test_streaming_reopens_large_file_when_retried(self):
+        content = self.stream_mock("tests/data/fake_gazette.pdf")
+        sent = []
+
+        def extract(open_chunks, probe, source):
+            sent.append(b"".join(open_chunks()))
+            sent.append(b"".join(open_chunks()))
+            self.assertEqual(probe.size, len(content))
+            return "text"
+
+        self.text_extraction_function.extract_text_from_stream.side_effect = extract
+
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(sent, [content, content])
+        self.assertEqual(self.storage_mock.get_file_stream.call_count, 2)
+        self.storage_mock.get_file.assert_not_called()
+
+    @patch.dict(
+        "os.environ",
+        {
+            "EXTRACTION_STREAMING": "true",
+            "EXTRACTION_ENGINE": "staged",
+        },
+    )
+    def test_staged_streaming_processes_gazette(self):
+        self.stream_mock("tests/data/fake_gazette.txt")
+        self.text_extraction_function.extract_text_from_stream.return_value = "text"
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.text_extraction_function.extract_text_from_stream.assert_called_once()
+        self.storage_mock.get_file.assert_not_called()
+
+    @patch.dict(
+        "os.environ",
+        {"EXTRACTION_CONCURRENCY": "2", "PROCESSED_FLAG_BATCH_SIZE": "3"},
+    )
+    def test_processed_flags_are_written_in_batches(self):
+        gazettes = []
+        for i in range(5):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazettes.append(gazette)
+        self.database_mock.get_pending_gazettes = MagicMock(return_value=gazettes)
+
+        extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.database_mock.update.assert_not_called()
+        rows = [
+            row
+            for call in self.database_mock.update_many.call_args_list
+            for row in call.args[1]
+        ]
+        self.assertEqual(sorted(rows), [(i, f"checksum-{i}") for i in range(5)])
+        self.assertEqual(self.database_mock.update_many.call_count, 2)
+
+    @patch.dict("os.environ", {"PROCESSED_FLAG_BATCH_SIZE": "10"})
+    def test_gazettes_are_journaled_once_marked_as_processed(self):
+        gazettes = []
+        for i in range(3):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazettes.append(gazette)
+        self.database_mock.update_many.side_effect = Exception("database unavailable")
+
+        with tempfile.TemporaryDirectory() as directory:
+            journal = CheckpointJournal(os.path.join(directory, "extraction.jsonl"))
+
+            with self.assertRaises(Exception):
+                extract_text_from_gazettes(
+                    [gazette.copy() for gazette in gazettes],
+                    [],
+                    self.database_mock,
+                    self.storage_mock,
+                    self.index_mock,
+                    self.text_extraction_function,
+                    journal=journal,
+                )
+            # The flags were not written, so a resumed run must process them again
+            self.assertEqual(journal.load(), {})
+
+            self.database_mock.update_many.side_effect = None
+            extract_text_from_gazettes(
+                gazettes,
+                [],
+                self.database_mock,
+                self.storage_mock,
+                self.index_mock,
+                self.text_extraction_function,
+                journal=journal,
+            )
+
+            self.assertEqual(
+                sorted(journal.load()),
+                [(0, "checksum-0"), (1, "checksum-1"), (2, "checksum-2")],
+            )
+
+    def test_resumed_extraction_skips_gazettes_in_journal(self):
+        gazettes = []
+        for i in range(3):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazettes.append(gazette)
+
+        with tempfile.TemporaryDirectory() as directory:
+            journal = CheckpointJournal(os.path.join(directory, "extraction.jsonl"))
+            journal.record(0, "checksum-0", ["checksum-0"])
+            journal.close()
+
+            ids = extract_text_from_gazettes(
+                gazettes,
+                [],
+                self.database_mock,
+                self.storage_mock,
+                self.index_mock,
+                self.text_extraction_function,
+                journal=journal,
+            )
+
+            self.assertEqual(sorted(ids), ["checksum-0", "checksum-1", "checksum-2"])
+            self.assertEqual(self.storage_mock.get_file.call_count, 2)
+            self.assertEqual(
+                sorted(journal.load()),
+                [(0, "checksum-0"), (1, "checksum-1"), (2, "checksum-2")],
+            )
+
+    def test_listed_gazette_record_is_extracted_and_indexed(self):
+        row = (
+            1,
+            date(2020, 10, 18),
+            "1",
+            False,
+            "executive",
+            "972aca2e-1174-11eb-b2d5-a86daaca905e",
+            "sc_gaspar/2020-10-18/972aca2e-1174-11eb-b2d5-a86daaca905e.pdf",
+            "www.querido-diario.org",
+            datetime.now(),
+            datetime.now(),
+            "3550308",
+            False,
+            "Gaspar",
+            "SC",
+        )
+        self.text_extraction_function.extract_text.return_value = "gazette content"
+
+        ids = extract_text_from_gazettes(
+            [format_gazette_data(row)],
+            [],
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        document = self.index_mock.index_document.call_args.args[0]
+        self.assertIsInstance(document, dict)
+        self.assertEqual(document["source_text"], "gazette content")
+        self.assertEqual(document["territory_name"], "Gaspar")
+        self.assertEqual(
+            document["file_raw_txt"],
+            "http://test.com/sc_gaspar/2020-10-18/972aca2e-1174-11eb-b2d5-a86daaca905e.txt",
+        )
+
+    @patch.dict(
+        "os.environ",
+        {
+            "EXTRACTION_ENGINE": "lanes",
+            "EXTRACTION_LARGE_FILE_MB": "1",
+            "EXTRACTION_SMALL_TIMEOUT": "60",
+            "EXTRACTION_LARGE_TIMEOUT": "900",
+        },
+    )
+    def test_lanes_extract_large_files_with_large_timeout(self):
+        gazettes = []
+        for i in range(4):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazette["file_path"] = f"sc_gaspar/2020-10-18/checksum-{i}.pdf"
+            gazettes.append(gazette)
+        self.database_mock.get_pending_gazettes = MagicMock(return_value=gazettes)
+        # Odd gazettes have files of 2MB
+        self.storage_mock.get_file_metadata.side_effect = lambda key: {
+            "size": 2 * 1024 * 1024 if key[-5] in "13" else 1024,
+            "etag": "etag",
+            "content_type": "application/pdf",
+            "metadata": {},
+        }
+        lane_extractors = {}
+
+        def with_read_timeout(seconds):
+            extractor = MagicMock(spec=TextExtractorInterface)
+            extractor.extract_text.return_value = ""
+            extractor.is_zip.return_value = False
+            lane_extractors[seconds] = extractor
+            return extractor
+
+        self.text_extraction_function.with_read_timeout.side_effect = with_read_timeout
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(sorted(ids), [f"checksum-{i}" for i in range(4)])
+        self.assertEqual(set(lane_extractors), {60.0, 900.0})
+        self.assertEqual(lane_extractors[60.0].extract_text.call_count, 2)
+        self.assertEqual(lane_extractors[900.0].extract_text.call_count, 2)
+        # The metadata read for routing is reused before each download
+        self.assertEqual(self.storage_mock.get_file_metadata.call_count, 4)
+        self.text_extraction_function.extract_text.assert_not_called()
+
+    @patch.dict(
+        "os.environ", {"EXTRACTION_ENGINE": "lanes", "EXTRACTION_PREFLIGHT": "false"}
+    )
+    def test_lanes_do_not_read_metadata_without_preflight(self):
+        self.text_extraction_function.with_read_timeout.return_value = (
+            self.text_extraction_function
+        )
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, ["972aca2e-1174-11eb-b2d5-a86daaca905e"])
+        self.storage_mock.get_file_metadata.assert_not_called()
+
+    @patch.dict("os.environ", {"EXTRACTION_ENGINE": "lanes"})
+    def test_lanes_do_not_read_metadata_of_missing_file_twice(self):
+        self.storage_mock.get_file_metadata.return_value = None
+        self.text_extraction_function.with_read_timeout.return_value = (
+            self.text_extraction_function
+        )
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [])
+        self.storage_mock.get_file_metadata.assert_called_once()
+        self.storage_mock.get_file.assert_not_called()
+
+    @patch.dict(
+        "os.environ",
+        {"EXTRACTION_PREFETCH_FILES": "2", "EXTRACTION_PREFETCH_GAZETTES": "3"},
+    )
+    def test_prefetched_files_are_extracted_and_removed(self):
+        gazettes = []
+        for i in range(5):
+            gazette = self.data[0].copy()
+            gazette["id"] = i
+            gazette["file_checksum"] = f"checksum-{i}"
+            gazettes.append(gazette)
+        self.database_mock.get_pending_gazettes = MagicMock(return_value=gazettes)
+
+        ids = extract_text_pending_gazettes(
+            self.database_mock,
+            self.storage_mock,
+            self.index_mock,
+            self.text_extraction_function,
+        )
+
+        self.assertEqual(ids, [f"checksum-{i}" for i in range(5)])
+        self.assertEqual(self.storage_mock.get_file.call_count, 5)
+        self.assertEqual(self.text_extraction_function.extract_text.call_count, 5)
+        for call in self.text_extraction_function.extract_text.call_args_list:
+            self.file_should_not_exist(call.args[0])
@@ -2,8 +2,11 @@ import types
 from unittest import TestCase
 from unittest.mock import MagicMock, mock_open, patch
 
+import requests
+
 from data_extraction import (
     ApacheTikaTextExtractor,
+    FileProbe,
     TextExtractorInterface,
     create_apache_tika_text_extraction,
 )
@@ -127,6 +130,37 @@ class ApacheTikaTextExtractorTest(TestCase):
         gen = extractor._chunk_file_generator(filepath)
         self.assertIsInstance(gen, types.GeneratorType)
 
+    @patch("data_extraction.text_extraction.requests.Session")
+    def test_stream_is_sent_again_when_request_is_retried(self, session_mock):
+        mock_response = MagicMock(status_code=200, text="Fake gazette content")
+        mock_session_instance = MagicMock()
+        sent = []
+
+        def put(url, data, **kwargs):
+            sent.append(b"".join(data))
+            if len(sent) == 1:
+                raise requests.exceptions.ConnectionError()
+            return mock_response
+
+        mock_session_instance.put = MagicMock(side_effect=put)
+        session_mock.return_value = mock_session_instance
+        extractor = ApacheTikaTextExtractor(self.url, retry_base_delay=0)
+        probe = FileProbe(None, "application/pdf", 6)
+
+        text = extractor.extract_text_from_stream(
+            lambda: [b"abc", b"def"], probe, source="a/b.pdf"
+        )
+
+        self.assertEqual(text, "Fake gazette content")
+        self.assertEqual(sent, [b"abcdef", b"abcdef"])
+        headers = mock_session_instance.put.call_args.kwargs["headers"]
+        self.assertEqual(headers["Content-Type"], "application/pdf")
+
+    def test_unsupported_stream_should_fail(self):
+        probe = FileProbe(None, "image/jpeg", 10)
+        with self.assertRaisesRegex(Exception, "Unsupported file type"):
+            self.extractor.extract_text_from_stream(lambda: [b""], probe)
+
     def check_if_text_has_the_fake_text(self, text):
         self.assertIsNotNone(text, msg="Extracted text should not be None")
         self.assertNotEqual(0, len(text), msg="Extracted text should not be empty")